@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+ACK / NAK handling: receive side range building, send side in flight bookkeeping, and the datagram codec
+"""
+from __future__ import unicode_literals
+
+from rakpy.connection.ack import ReceiveTracker
+from rakpy.connection.reliability import RttEstimator, SendWindow
+from rakpy.connection.timer import TimerWheel
+from rakpy.protocol import packets
+from rakpy.protocol.const.reliability import RELIABLE_ORDERED
+from rakpy.protocol.datagram import Datagram
+from rakpy.protocol.fields import Range
+
+from runner import benchmark
+
+DATAGRAMS = 256
+
+
+@benchmark("receive_tracker", "in_order_{}".format(DATAGRAMS))
+def in_order():
+    def run():
+        tracker = ReceiveTracker()
+        add = tracker.add
+        for number in range(DATAGRAMS):
+            add(number)
+        return tracker.tick()
+    return run
+
+
+@benchmark("receive_tracker", "one_loss_in_8_{}".format(DATAGRAMS))
+def with_losses():
+    numbers = [number for number in range(DATAGRAMS) if number % 8 != 3]
+
+    def run():
+        tracker = ReceiveTracker()
+        add = tracker.add
+        for number in numbers:
+            add(number)
+        return tracker.tick()
+    return run
+
+
+@benchmark("send_window", "send_ack_{}".format(DATAGRAMS))
+def send_and_ack():
+    payload = b"\x00" * 100
+    ack = [Range(0, DATAGRAMS - 1)]
+
+    def run():
+        window = SendWindow(rtt=RttEstimator(), wheel=TimerWheel(now=0.0))
+        for _ in range(DATAGRAMS):
+            window.send([window.make_frame(payload, RELIABLE_ORDERED)], now=0.0)
+        window.on_ack(ack, now=0.05)
+    return run
+
+
+@benchmark("send_window", "send_nak_{}".format(DATAGRAMS))
+def send_and_nak():
+    payload = b"\x00" * 100
+    nak = [Range(number, number) for number in range(0, DATAGRAMS, 8)]
+
+    def run():
+        window = SendWindow(rtt=RttEstimator(), wheel=TimerWheel(now=0.0))
+        for _ in range(DATAGRAMS):
+            window.send([window.make_frame(payload, RELIABLE_ORDERED)], now=0.0)
+        window.on_nak(nak)
+    return run
+
+
+@benchmark("ack_packet", "decode_64_ranges")
+def decode_ack():
+    data = bytes(packets.Acknowledge(packet_ranges=[Range(i * 4, i * 4 + 2) for i in range(64)]).encode())
+    return lambda: packets.Acknowledge(data)
+
+
+def _datagram():
+    window = SendWindow(rtt=RttEstimator(), wheel=TimerWheel(now=0.0))
+    frames = [window.make_frame(b"\x00" * 40, RELIABLE_ORDERED) for _ in range(30)]
+    return window.send(frames, now=0.0)
+
+
+@benchmark("datagram", "decode_30_frames")
+def decode_datagram():
+    data = bytes(_datagram().encode())
+    return lambda: Datagram.decode(data)
+
+
+@benchmark("datagram", "encode_30_frames")
+def encode_datagram():
+    datagram = _datagram()
+    buffer = bytearray(datagram.encoded_size())
+    return lambda: datagram.encode_into(buffer, 0)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Field codecs of rakpy/protocol/fields.py
+"""
+from __future__ import unicode_literals
+
+from rakpy.protocol import fields
+from rakpy.protocol.fields import Address, Range
+
+from runner import add
+
+VALUES = [
+    ("RangeListField", "1_range", fields.RangeListField(), [Range(1, 5)]),
+    ("RangeListField", "1000_ranges", fields.RangeListField(),
+        [Range(min_index=i * 10, max_index=i * 10 + (i % 2) * 5) for i in range(1000)]),
+    ("AddressField", "ipv4", fields.AddressField(), Address(ip="192.168.0.42", port=19132)),
+    ("AddressField", "ipv6", fields.AddressField(), Address(ip="2001:db8::42", port=19132, version=6)),
+    ("CompactAddressField", "ipv4", fields.CompactAddressField(), fields.CompactAddress("192.168.0.42", 19132)),
+    ("StringField", "ascii", fields.StringField(), "MCPE;rakpy;70;0.14.0;0;20"),
+    ("StringField", "utf8", fields.StringField(), "ボールト" * 16),
+    ("TimestampField", "u64", fields.TimestampField(), 193351),
+]
+
+
+def _decode(field, value):
+    def setup():
+        data = bytes(field.encode(value))
+        decode_from = field.decode_from
+        return lambda: decode_from(data, 0)
+    return setup
+
+
+def _encode(field, value):
+    def setup():
+        buffer = bytearray(field.encoded_size(value))
+        encode_into = field.encode_into
+        return lambda: encode_into(value, buffer, 0)
+    return setup
+
+
+for field_name, case, field, value in VALUES:
+    add("decode_field", "{}[{}]".format(field_name, case), _decode(field, value))
+    add("encode_field", "{}[{}]".format(field_name, case), _encode(field, value))
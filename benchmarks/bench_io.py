@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+rakpy.io primitives: ByteStream (legacy streaming API), ByteReader and BufferPool
+"""
+from __future__ import unicode_literals
+
+import os
+
+from rakpy.io import BufferPool, ByteReader, ByteStream
+
+from runner import benchmark
+
+DATA = bytes(bytearray(range(256))) * 6
+
+
+@benchmark("bytestream")
+def create():
+    return lambda: ByteStream(DATA)
+
+
+@benchmark("bytestream")
+def read_8_bytes():
+    stream = ByteStream(DATA)
+
+    def read():
+        stream.seek(0)
+        return stream.read(8)
+    return read
+
+
+@benchmark("bytestream")
+def read_all():
+    stream = ByteStream(DATA)
+
+    def read():
+        stream.seek(0)
+        return stream.readall()
+    return read
+
+
+@benchmark("bytestream")
+def seek_and_len():
+    stream = ByteStream(DATA)
+
+    def seek():
+        stream.seek(100)
+        stream.seek(-8, os.SEEK_END)
+        return len(stream)
+    return seek
+
+
+@benchmark("bytereader")
+def read_u64():
+    reader = ByteReader(DATA)
+
+    def read():
+        reader.offset = 0
+        return reader.read_u64()
+    return read
+
+
+@benchmark("bytereader")
+def read_view():
+    reader = ByteReader(DATA)
+
+    def read():
+        reader.offset = 0
+        return reader.read_view(1024)
+    return read
+
+
+@benchmark("buffer_pool")
+def acquire_release():
+    pool = BufferPool()
+
+    def cycle():
+        pool.release(pool.acquire())
+    return cycle
+
+
+@benchmark("buffer_pool")
+def allocate_bytearray():
+    # what acquire_release replaces
+    return lambda: bytearray(1492)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Decoding one UnconnectedPing with the legacy ByteStream based path (convert_to_stream + ByteStream.read + unpack
+per field) and with the current (buffer, offset) path: compare ns_per_op and peak_bytes.
+"""
+from __future__ import unicode_literals
+
+from struct import unpack
+
+from rakpy.io import convert_to_stream
+from rakpy.protocol import decode_packet
+from rakpy.protocol.const import MAGIC
+
+from runner import benchmark
+
+DATA = (
+    b"\x01\x00\x00\x00\x00\x00\x02\xf3\x47\x00\xff\xff\x00\xfe\xfe\xfe\xfe"
+    b"\xfd\xfd\xfd\xfd\x12\x34\x56\x78\x00\x05\x27\x00\xaa\x0a\x23\xa3"
+)
+
+
+@convert_to_stream("data")
+def legacy_read(data, pack_format, length):
+    return unpack(pack_format, data.read(length))[0]
+
+
+@convert_to_stream("data")
+def legacy_read_magic(data):
+    if data.read(len(MAGIC)) != MAGIC:
+        raise ValueError()
+
+
+@convert_to_stream("data")
+def legacy_decode(data):
+    """
+    Decoding steps performed by Packet._decode before compiled codecs
+    """
+    values = {}
+    if legacy_read(data, "!B", 1) != 0x01:
+        raise ValueError()
+    values["time"] = legacy_read(data, "!Q", 8)
+    legacy_read_magic(data)
+    values["client_guid"] = legacy_read(data, "!q", 8)
+    if len(data):
+        raise ValueError()
+    return values
+
+
+@benchmark("unconnected_ping", "legacy_bytestream_decode")
+def legacy():
+    return lambda: legacy_decode(DATA)
+
+
+@benchmark("unconnected_ping", "decode_packet")
+def current():
+    return lambda: decode_packet(DATA)
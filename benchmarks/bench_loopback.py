@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end UnconnectedPing / UnconnectedPong throughput against a server on the loopback interface
+"""
+from __future__ import unicode_literals
+
+import asyncio
+import time
+
+from rakpy.protocol import packets
+from rakpy.server import create_server
+from rakpy.udp import HAS_MMSG
+
+from runner import throughput
+
+PINGS = 20000
+# pings in flight: enough to keep the server busy without overflowing the socket buffers
+WINDOW = 64
+
+
+async def ping_pong(batched, pings=PINGS, window=WINDOW):
+    loop = asyncio.get_event_loop()
+    transport, _ = await create_server("127.0.0.1", 0, server_guid=42, server_name="MCPE;benchmark", batched=batched)
+    done = loop.create_future()
+    ping = bytes(packets.UnconnectedPing(time=1, client_guid=7).encode())
+    state = {"sent": 0, "received": 0}
+
+    class Client(asyncio.DatagramProtocol):
+        def connection_made(self, client):
+            self.client = client
+
+        def send(self, count):
+            count = min(count, pings - state["sent"])
+            for _ in range(count):
+                self.client.sendto(ping)
+            state["sent"] += count
+
+        def datagram_received(self, data, addr):
+            state["received"] += 1
+            if state["received"] == pings and not done.done():
+                done.set_result(None)
+            else:
+                self.send(1)
+
+    client, protocol = await loop.create_datagram_endpoint(Client, remote_addr=transport.get_extra_info("sockname"))
+    try:
+        start = time.perf_counter()
+        protocol.send(window)
+        try:
+            await asyncio.wait_for(done, 30)
+        except asyncio.TimeoutError:
+            pass
+        seconds = time.perf_counter() - start
+    finally:
+        client.close()
+        transport.close()
+    # lost datagrams are not retried: count the pongs actually received
+    return state["received"], seconds
+
+
+@throughput("loopback", "ping_pong")
+def loopback():
+    return asyncio.run(ping_pong(batched=False))
+
+
+@throughput("loopback", "ping_pong_batched_mmsg" if HAS_MMSG else "ping_pong_batched")
+def loopback_batched():
+    return asyncio.run(ping_pong(batched=True))
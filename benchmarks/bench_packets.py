@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+decode_packet / encode for every packet class of rakpy/protocol/packets.py
+"""
+from __future__ import unicode_literals
+
+from rakpy.protocol import decode_packet, packets, registry
+from rakpy.protocol.fields import Address, Range
+
+from runner import add
+
+SAMPLES = [
+    packets.Acknowledge(packet_ranges=[Range(1, 1), Range(3, 40)]),
+    packets.Unacknowledge(packet_ranges=[Range(2, 2)]),
+    packets.AdvertiseSystem(ping_time=193351, server_guid=1450258689827742, server_name="MCPE;rakpy;70;0.14.0;0;20"),
+    packets.ConnectionRequest(client_guid=1450258689827747, time=193351, use_security=False),
+    packets.DisconnectionNotification(),
+    packets.NewIncomingConnection(ping_time=193351, pong_time=193352, **dict(
+        [("address", Address(ip="192.168.0.42", port=19132))] +
+        [("system_address_{}".format(i), Address(ip="10.0.0.{}".format(i), port=19132 + i)) for i in range(10)]
+    )),
+    packets.OpenConnectionReply1(server_guid=1450258689827742, use_security=False, mtu_size=1492),
+    packets.OpenConnectionReply2(server_guid=1450258689827742, address=Address(ip="192.168.0.42", port=54321),
+                                 mtu_size=1492, use_security=False),
+    packets.OpenConnectionRequest1(protocol=7, mtu_size=1492),
+    packets.OpenConnectionRequest2(server_address=Address(ip="192.168.0.1", port=19132), mtu_size=1492,
+                                   client_guid=1450258689827747),
+    packets.ConnectedPing(time=193351),
+    packets.ConnectedPong(ping_time=193351),
+    packets.UnconnectedPing(time=193351, client_guid=1450258689827747),
+    packets.UnconnectedPingOpenConnections(time=193351, client_guid=1450258689827747),
+    packets.UnconnectedPong(ping_time=193351, server_guid=1450258689827742, server_name="MCPE;rakpy;70;0.14.0;0;20"),
+]
+assert set(type(packet) for packet in SAMPLES) == set(registry.values()), "a packet class has no sample"
+
+
+def _decode(packet):
+    def setup():
+        data = bytes(packet.encode())
+        return lambda: decode_packet(data)
+    return setup
+
+
+def _decode_lazy(packet):
+    def setup():
+        data = bytes(packet.encode())
+        return lambda: decode_packet(data, lazy=True)
+    return setup
+
+
+def _encode(packet):
+    def setup():
+        return packet.encode
+    return setup
+
+
+for packet in SAMPLES:
+    name = type(packet).__name__
+    add("decode_packet", name, _decode(packet))
+    add("decode_packet_lazy", name, _decode_lazy(packet))
+    add("encode_packet", name, _encode(packet))
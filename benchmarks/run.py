@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Run the benchmark suite and write the results as JSON, optionally compared with an earlier run.
+
+Usage: PYTHONPATH=. python benchmarks/run.py [-k FILTER] [--repeat N] [-o results.json] [--compare baseline.json]
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import datetime
+import json
+import platform
+import sys
+
+import bench_ack  # noqa
+import bench_fields  # noqa
+import bench_io  # noqa
+import bench_legacy  # noqa
+import bench_loopback  # noqa
+import bench_packets  # noqa
+from runner import BENCHMARKS
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "date": datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z",
+    }
+
+
+def compare(results, baseline):
+    """
+    Add the ratio to the baseline timing (> 1.0 is slower) to every result found in baseline
+    """
+    previous = dict(((result["group"], result["name"]), result) for result in baseline["results"])
+    for result in results:
+        old = previous.get((result["group"], result["name"]))
+        if old is not None:
+            result["baseline_ns_per_op"] = old["ns_per_op"]
+            result["ratio"] = result["ns_per_op"] / old["ns_per_op"]
+
+
+def report(result, stream):
+    line = "{:<52} {:>14.1f} ns {:>14.0f} op/s".format(
+        "{}.{}".format(result["group"], result["name"]), result["ns_per_op"], result["ops_per_sec"])
+    if "peak_bytes" in result:
+        line += " {:>8} B".format(result["peak_bytes"])
+    if "ratio" in result:
+        line += " {:>7.2f}x".format(result["ratio"])
+    print(line, file=stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="rakpy benchmarks")
+    parser.add_argument("-k", "--filter", help="only run benchmarks whose group.name contains this string")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per benchmark (best is kept)")
+    parser.add_argument("-o", "--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    selected = [bench for bench in BENCHMARKS if not args.filter or args.filter in bench.full_name]
+    if args.list:
+        for bench in selected:
+            print(bench.full_name)
+        return 0
+
+    results = []
+    for bench in selected:
+        results.append(bench.run(repeat=args.repeat))
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+    for result in results:
+        report(result, sys.stderr)
+
+    document = json.dumps({"environment": environment(), "results": results}, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(document + "\n")
+    else:
+        print(document)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal benchmark runner (no dependency besides the standard library).
+
+Benchmark modules register setup functions with @benchmark: a setup function builds its data and returns the
+callable to time, so only the operation itself is measured. @throughput registers functions that time themselves
+and return (operations, seconds), for end-to-end runs.
+"""
+from __future__ import print_function, unicode_literals
+
+import gc
+import timeit
+import tracemalloc
+
+BENCHMARKS = []
+
+
+class Benchmark(object):
+    def __init__(self, group, name, setup, allocations=True, throughput=False):
+        self.group = group
+        self.name = name
+        self.setup = setup
+        self.allocations = allocations
+        self.throughput = throughput
+
+    @property
+    def full_name(self):
+        return "{}.{}".format(self.group, self.name)
+
+    def run(self, repeat=5):
+        if self.throughput:
+            return self._run_throughput(repeat)
+        function = self.setup()
+        timer = timeit.Timer(function)
+        number, _ = timer.autorange()
+        seconds = min(timer.repeat(repeat=repeat, number=number)) / number
+        result = self._result(number=number, repeat=repeat, seconds=seconds)
+        if self.allocations:
+            result["peak_bytes"] = peak_allocated(function)
+        return result
+
+    def _run_throughput(self, repeat):
+        best = None
+        for _ in range(repeat):
+            operations, seconds = self.setup()
+            rate = operations / seconds
+            if best is None or rate > best[0]:
+                best = rate, operations
+        rate, operations = best
+        return self._result(number=operations, repeat=repeat, seconds=1.0 / rate)
+
+    def _result(self, number, repeat, seconds):
+        return {
+            "group": self.group,
+            "name": self.name,
+            "ns_per_op": seconds * 1e9,
+            "ops_per_sec": 1.0 / seconds,
+            "number": number,
+            "repeat": repeat,
+        }
+
+
+def benchmark(group, name=None, allocations=True):
+    """
+    Register a setup function returning the callable to time
+    """
+    def decorator(setup):
+        add(group, name or setup.__name__, setup, allocations=allocations)
+        return setup
+    return decorator
+
+
+def throughput(group, name=None):
+    """
+    Register a function running a whole scenario and returning (operations, seconds)
+    """
+    def decorator(function):
+        add(group, name or function.__name__, function, allocations=False, throughput=True)
+        return function
+    return decorator
+
+
+def add(group, name, setup, **options):
+    BENCHMARKS.append(Benchmark(group, name, setup, **options))
+
+
+def peak_allocated(function, repeat=200):
+    """
+    Smallest peak of memory allocated (in bytes) while running function once
+    """
+    function()  # warm up caches
+    gc.collect()
+    tracemalloc.start()
+    best = None
+    try:
+        for _ in range(repeat):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            function()
+            peak = tracemalloc.get_traced_memory()[1] - current
+            best = peak if best is None else min(best, peak)
+    finally:
+        tracemalloc.stop()
+    return best
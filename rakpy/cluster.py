@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-process server.
+
+Cluster binds N UDP sockets to the same port with SO_REUSEPORT and forks one worker process per socket: the kernel
+hashes every client address to a stable socket, so each client always talks to the same worker.
+Workers share an anonymous mmap (SharedArea) holding the shutdown flag, the server name (MOTD) and per worker
+statistics counters. The server GUID is drawn once by the parent, before forking.
+"""
+from __future__ import unicode_literals
+
+import asyncio
+import errno
+import mmap
+import os
+import random
+import signal
+import socket
+import struct
+import time
+import traceback
+
+from rakpy.server import DEFAULT_PORT, ServerProtocol, create_server
+
+STATS = ("datagrams_received", "replies_sent", "decode_errors", "offline_dropped", "sessions")
+MAX_SERVER_NAME_LENGTH = 1024
+# reads of the server name while it is being written, before giving up (the writer may have died)
+MAX_SEQLOCK_RETRIES = 10000
+
+_U64 = struct.Struct(str("=Q"))
+# header: shutdown flag, server name version, server name length (one u64 each), then the server name
+SHUTDOWN_OFFSET = 0
+VERSION_OFFSET = 8
+LENGTH_OFFSET = 16
+SERVER_NAME_OFFSET = 24
+
+
+class SharedArea(object):
+    """
+    Fixed layout anonymous shared memory, created before forking so every worker maps the same pages.
+
+    Each worker only writes its own counters, so they need no locking; totals are summed by the reader.
+    The server name is guarded by a version number (odd while it is being written, like a seqlock). Readers retry
+    at most MAX_SEQLOCK_RETRIES times, then fall back to the last name they read.
+    """
+    def __init__(self, workers, names=STATS):
+        self.workers = workers
+        self.names = tuple(names)
+        self._indexes = dict((name, index) for index, name in enumerate(self.names))
+        self._stats_offset = SERVER_NAME_OFFSET + MAX_SERVER_NAME_LENGTH
+        self.size = self._stats_offset + workers * len(self.names) * _U64.size
+        self.map = mmap.mmap(-1, self.size)
+        # last consistent server name read by this process
+        self._server_name = None
+
+    def close(self):
+        self.map.close()
+
+    @property
+    def shutdown(self):
+        return bool(_U64.unpack_from(self.map, SHUTDOWN_OFFSET)[0])
+
+    @shutdown.setter
+    def shutdown(self, value):
+        _U64.pack_into(self.map, SHUTDOWN_OFFSET, 1 if value else 0)
+
+    @property
+    def server_name_version(self):
+        return _U64.unpack_from(self.map, VERSION_OFFSET)[0]
+
+    def get_server_name(self, retries=MAX_SEQLOCK_RETRIES):
+        data = b""
+        for _ in range(retries):
+            version = self.server_name_version
+            length = _U64.unpack_from(self.map, LENGTH_OFFSET)[0]
+            data = self.map[SERVER_NAME_OFFSET:SERVER_NAME_OFFSET + min(length, MAX_SERVER_NAME_LENGTH)]
+            if not version & 1 and version == self.server_name_version:
+                self._server_name = data.decode("utf-8")
+                return self._server_name
+        # a writer died while updating the name, or never stops updating it
+        if self._server_name is not None:
+            return self._server_name
+        return data.decode("utf-8", "replace")
+
+    def set_server_name(self, server_name):
+        data = server_name.encode("utf-8")
+        if len(data) > MAX_SERVER_NAME_LENGTH:
+            raise ValueError("server name is longer than {} bytes".format(MAX_SERVER_NAME_LENGTH))
+        version = self.server_name_version
+        _U64.pack_into(self.map, VERSION_OFFSET, version + 1)
+        _U64.pack_into(self.map, LENGTH_OFFSET, len(data))
+        self.map[SERVER_NAME_OFFSET:SERVER_NAME_OFFSET + len(data)] = data
+        _U64.pack_into(self.map, VERSION_OFFSET, version + 2)
+
+    def _offset(self, worker, name):
+        return self._stats_offset + (worker * len(self.names) + self._indexes[name]) * _U64.size
+
+    def set(self, worker, name, value):
+        _U64.pack_into(self.map, self._offset(worker, name), value)
+
+    def get(self, worker, name):
+        return _U64.unpack_from(self.map, self._offset(worker, name))[0]
+
+    def total(self, name):
+        return sum(self.get(worker, name) for worker in range(self.workers))
+
+    def snapshot(self):
+        """
+        Totals of every counter, as a dict
+        """
+        return dict((name, self.total(name)) for name in self.names)
+
+
+def reuseport_socket(host, port, family=socket.AF_INET):
+    """
+    UDP socket bound to (host, port) with SO_REUSEPORT
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise OSError("SO_REUSEPORT is not supported on this platform")
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
+class Cluster(object):
+    """
+    Forks `workers` server processes sharing one UDP port.
+
+    Every worker runs create_server(protocol_class=..., **options) on its own SO_REUSEPORT socket, with the same
+    server_guid and server_name. Workers publish their protocol counters to the shared area every stats_interval
+    seconds, and pick up server name changes at the same time.
+    """
+    def __init__(self, host="0.0.0.0", port=DEFAULT_PORT, workers=None, protocol_class=ServerProtocol,
+                 server_guid=None, server_name="", stats_interval=1.0, **options):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.protocol_class = protocol_class
+        self.server_guid = random.getrandbits(63) if server_guid is None else server_guid
+        self.stats_interval = stats_interval
+        self.options = options
+        self.shared = SharedArea(self.workers)
+        self.shared.set_server_name(server_name)
+        self.pids = []
+
+    @property
+    def address(self):
+        return self.host, self.port
+
+    @property
+    def server_name(self):
+        return self.shared.get_server_name()
+
+    @server_name.setter
+    def server_name(self, server_name):
+        self.shared.set_server_name(server_name)
+
+    def stats(self):
+        return self.shared.snapshot()
+
+    def start(self):
+        """
+        Bind every socket (the first one resolves port 0) then fork the workers
+        """
+        sockets = []
+        try:
+            for _ in range(self.workers):
+                sockets.append(reuseport_socket(self.host, self.port))
+                self.port = sockets[0].getsockname()[1]
+            for worker, sock in enumerate(sockets):
+                pid = os.fork()
+                if pid == 0:
+                    status = 1
+                    try:
+                        for other in sockets:
+                            if other is not sock:
+                                other.close()
+                        status = self._run_worker(worker, sock)
+                    except BaseException:
+                        traceback.print_exc()
+                    finally:
+                        os._exit(status)
+                self.pids.append(pid)
+        except Exception:
+            self.stop()
+            raise
+        finally:
+            for sock in sockets:
+                sock.close()
+
+    def _run_worker(self, worker, sock):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        # until the event loop handles it, an early SIGTERM is covered by the shutdown flag
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        asyncio.set_event_loop(None)
+        asyncio.run(self._serve(worker, sock))
+        return 0
+
+    async def _serve(self, worker, sock):
+        loop = asyncio.get_event_loop()
+        stopping = asyncio.Event()
+        loop.add_signal_handler(signal.SIGTERM, stopping.set)
+        shared = self.shared
+        version = shared.server_name_version
+        transport, protocol = await create_server(sock=sock, protocol_class=self.protocol_class,
+                                                  server_guid=self.server_guid,
+                                                  server_name=shared.get_server_name(), **self.options)
+        parent = os.getppid()
+        try:
+            while not stopping.is_set() and not shared.shutdown and os.getppid() == parent:
+                if shared.server_name_version != version:
+                    version = shared.server_name_version
+                    protocol.server_name = shared.get_server_name()
+                protocol.expire()
+                self._publish(worker, protocol)
+                try:
+                    await asyncio.wait_for(stopping.wait(), self.stats_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            transport.close()
+            self._publish(worker, protocol)
+
+    def _publish(self, worker, protocol):
+        shared = self.shared
+        shared.set(worker, "datagrams_received", protocol.datagrams_received)
+        shared.set(worker, "replies_sent", protocol.replies_sent)
+        shared.set(worker, "decode_errors", protocol.decode_errors)
+        shared.set(worker, "offline_dropped", protocol.offline_filter.dropped)
+        shared.set(worker, "sessions", len(protocol.sessions))
+
+    def stop(self, timeout=5.0):
+        """
+        Ask every worker to shut down, wait up to timeout seconds then kill the remaining ones.
+        Return the exit statuses by pid.
+        """
+        self.shared.shutdown = True
+        for pid in self.pids:
+            self._signal(pid, signal.SIGTERM)
+        return self.wait(timeout)
+
+    def wait(self, timeout=None):
+        """
+        Wait for the workers to exit (forever when timeout is None), kill the ones still running after timeout
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        statuses = {}
+        while self.pids:
+            for pid in list(self.pids):
+                try:
+                    done, status = os.waitpid(pid, 0 if deadline is None else os.WNOHANG)
+                except ChildProcessError:
+                    done, status = pid, 0
+                if done:
+                    statuses[pid] = os.waitstatus_to_exitcode(status)
+                    self.pids.remove(pid)
+            if self.pids:
+                if time.time() >= deadline:
+                    for pid in self.pids:
+                        self._signal(pid, signal.SIGKILL)
+                    deadline = None
+                else:
+                    time.sleep(0.01)
+        return statuses
+
+    def _signal(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except OSError as exc:
+            if exc.errno != errno.ESRCH:
+                raise
+
+    def run(self):
+        """
+        Start the workers and wait for them, SIGINT / SIGTERM on the parent shut the whole cluster down
+        """
+        self.start()
+        previous = {}
+
+        def shutdown(signum, frame):
+            self.shared.shutdown = True
+            for pid in self.pids:
+                self._signal(pid, signal.SIGTERM)
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            previous[signum] = signal.signal(signum, shutdown)
+        try:
+            return self.wait()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            self.shared.close()
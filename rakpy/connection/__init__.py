@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import time
+
+# monotonic when available, timeouts must not jump with the wall clock
+clock = getattr(time, "monotonic", time.time)
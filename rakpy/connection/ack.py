@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from bisect import bisect_left, bisect_right
+
+from rakpy.protocol.fields import Range
+from rakpy.protocol.packets import Acknowledge, Unacknowledge
+
+# datagram sequence numbers are 24 bits (triads) and wrap around
+SEQUENCE_MASK = 0xffffff
+SEQUENCE_MODULO = SEQUENCE_MASK + 1
+SEQUENCE_HALF = SEQUENCE_MODULO >> 1
+
+
+def unwrap(sequence_number, reference):
+    """
+    Map a 24 bits sequence number to the (unbounded) counter value closest to reference
+    """
+    delta = (sequence_number - reference) & SEQUENCE_MASK
+    if delta >= SEQUENCE_HALF:
+        delta -= SEQUENCE_MODULO
+    return reference + delta
+
+
+def merge_intervals(intervals):
+    """
+    Sort and coalesce [min, max] intervals of counter values (overlapping or adjacent ones are merged)
+    """
+    intervals.sort()
+    merged = []
+    for low, high in intervals:
+        if merged and low <= merged[-1][1] + 1:
+            if high > merged[-1][1]:
+                merged[-1][1] = high
+        else:
+            merged.append([low, high])
+    return merged
+
+
+def to_ranges(intervals):
+    """
+    Convert intervals of counter values to wire Ranges, splitting the ones crossing the 24 bits boundary
+    """
+    ranges = []
+    for low, high in intervals:
+        low &= SEQUENCE_MASK
+        high &= SEQUENCE_MASK
+        if low <= high:
+            ranges.append(Range(min_index=low, max_index=high))
+        else:
+            ranges.append(Range(min_index=low, max_index=SEQUENCE_MASK))
+            ranges.append(Range(min_index=0, max_index=high))
+    return ranges
+
+
+class ReceiveTracker(object):
+    """
+    Received datagram sequence numbers, turned into minimal ACK and NAK range lists on each tick.
+
+    In order arrivals extend the last pending interval in O(1), gaps become NAK intervals when they are detected and
+    are split if a late datagram fills them. Duplicates are detected with a bitmap over the last `window` sequence
+    numbers; anything older than the window is considered a duplicate.
+    """
+    def __init__(self, window=4096):
+        self.window = window
+        self.highest = -1
+        self.duplicates = 0
+        self._received = bytearray(window)
+        self._acks = []
+        self._naks = []
+
+    def add(self, sequence_number):
+        """
+        Record a received datagram, return False if it is a duplicate
+        """
+        window = self.window
+        highest = self.highest
+        number = unwrap(sequence_number, highest)
+
+        if number > highest:
+            start = max(highest + 1, number - window + 1)
+            for cleared in range(start, number):
+                self._received[cleared % window] = 0
+            if number > highest + 1:
+                self._naks.append([start, number - 1])
+            self.highest = number
+        elif number <= highest - window or self._received[number % window]:
+            self.duplicates += 1
+            return False
+        else:
+            self._fill_nak(number)
+        self._received[number % window] = 1
+
+        acks = self._acks
+        if acks and acks[-1][1] + 1 == number:
+            acks[-1][1] = number
+        else:
+            acks.append([number, number])
+        return True
+
+    def _fill_nak(self, number):
+        naks = self._naks
+        for index, (low, high) in enumerate(naks):
+            if low <= number <= high:
+                if low == high:
+                    del naks[index]
+                elif number == low:
+                    naks[index][0] = number + 1
+                elif number == high:
+                    naks[index][1] = number - 1
+                else:
+                    naks[index][1] = number - 1
+                    naks.insert(index + 1, [number + 1, high])
+                return
+
+    def pop_acks(self):
+        acks, self._acks = self._acks, []
+        return to_ranges(merge_intervals(acks))
+
+    def pop_naks(self):
+        naks, self._naks = self._naks, []
+        return to_ranges(merge_intervals(naks))
+
+    def tick(self):
+        """
+        Return the Acknowledge / Unacknowledge packets to send (if any) for what was received since the last tick
+        """
+        packets = []
+        acks = self.pop_acks()
+        if acks:
+            packets.append(Acknowledge(packet_ranges=acks))
+        naks = self.pop_naks()
+        if naks:
+            packets.append(Unacknowledge(packet_ranges=naks))
+        return packets
+
+
+class InFlightTable(object):
+    """
+    Sent datagrams waiting for an ACK, indexed by sequence number.
+
+    Sequence numbers are assigned consecutively, so incoming ranges are clamped to the in flight span and merged
+    before being applied: neither a range covering the whole 24 bits space nor many overlapping ranges cost more
+    than the datagrams actually in flight.
+    """
+    def __init__(self):
+        self.oldest = 0
+        self.next_number = 0
+        self._entries = {}
+
+    def push(self, value):
+        """
+        Store value under the next sequence number, return that (24 bits) sequence number
+        """
+        number = self.next_number
+        self._entries[number] = value
+        self.next_number = number + 1
+        return number & SEQUENCE_MASK
+
+    def get(self, sequence_number, default=None):
+        return self._entries.get(unwrap(sequence_number, self.next_number), default)
+
+    def pop(self, sequence_number, default=None):
+        number = unwrap(sequence_number, self.next_number)
+        value = self._entries.pop(number, default)
+        self._advance_oldest()
+        return value
+
+    def pop_ranges(self, ranges):
+        """
+        Remove and return the (sequence number, value) pairs covered by ranges, in sequence order
+        """
+        entries = self._entries
+        popped = []
+        if not entries:
+            return popped
+        spans = self._merge(ranges)
+        # walk the spans, or look the in flight numbers up in them when that is cheaper (sparse table)
+        keys = None
+        if sum(high - low + 1 for low, high in spans) > len(entries):
+            keys = sorted(entries)
+        for low, high in spans:
+            if not entries:
+                break
+            if keys is None:
+                numbers = range(low, high + 1)
+            else:
+                numbers = keys[bisect_left(keys, low):bisect_right(keys, high)]
+            for number in numbers:
+                value = entries.pop(number, None)
+                if value is not None:
+                    popped.append((number & SEQUENCE_MASK, value))
+        self._advance_oldest()
+        return popped
+
+    def _merge(self, ranges):
+        # ranges clamped to the in flight span, sorted, with overlapping and adjacent ones merged
+        oldest, newest = self.oldest, self.next_number - 1
+        spans = []
+        for min_index, max_index in ranges:
+            low = unwrap(min_index, self.next_number)
+            high = low + ((max_index - min_index) & SEQUENCE_MASK)
+            low, high = max(low, oldest), min(high, newest)
+            if low <= high:
+                spans.append((low, high))
+        spans.sort()
+        merged = []
+        for low, high in spans:
+            if merged and low <= merged[-1][1] + 1:
+                if high > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], high)
+            else:
+                merged.append((low, high))
+        return merged
+
+    def _advance_oldest(self):
+        entries = self._entries
+        while self.oldest < self.next_number and self.oldest not in entries:
+            self.oldest += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        for number, value in self._entries.items():
+            yield number & SEQUENCE_MASK, value
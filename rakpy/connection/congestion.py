@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+class CongestionControl(object):
+    """
+    Interface of the congestion controllers gating an OutgoingScheduler.
+
+    The scheduler asks can_send() before sending each datagram, and reports every datagram sent, every ACKed
+    datagram (with its size and RTT sample), NAKs and retransmission timeouts.
+    """
+    def can_send(self, bytes_in_flight, size, now):
+        return True
+
+    def on_sent(self, size, now):
+        pass
+
+    def on_ack(self, size, rtt, now):
+        pass
+
+    def on_nak(self, now):
+        pass
+
+    def on_timeout(self, now):
+        pass
+
+
+class SlidingWindow(CongestionControl):
+    """
+    RakNet style congestion window (CCRakNetSlidingWindow), in bytes.
+
+    Slow start grows the window by one MTU per ACKed datagram until ssthresh, then congestion avoidance grows it by
+    about one MTU per window (AIMD). A NAK halves it, at most once per round trip so one burst of losses counts as
+    one congestion event; a retransmission timeout restarts slow start from one MTU.
+    """
+    def __init__(self, mtu_size, initial_window=None, max_window=None):
+        self.mtu_size = mtu_size
+        self.window = initial_window or mtu_size
+        self.max_window = max_window
+        self.ssthresh = None
+        self.srtt = None
+        self._recovery_until = None
+
+    @property
+    def slow_start(self):
+        return self.ssthresh is None or self.window < self.ssthresh
+
+    def can_send(self, bytes_in_flight, size, now):
+        # one datagram is always allowed when nothing is in flight
+        return bytes_in_flight == 0 or bytes_in_flight + size <= self.window
+
+    def on_ack(self, size, rtt, now):
+        if rtt is not None:
+            self.srtt = rtt if self.srtt is None else self.srtt + (rtt - self.srtt) / 8.0
+        if self.slow_start:
+            self.window += self.mtu_size
+        else:
+            self.window += self.mtu_size * self.mtu_size / float(self.window)
+        if self.max_window is not None:
+            self.window = min(self.window, self.max_window)
+
+    def on_nak(self, now):
+        if self._recovery_until is not None and now < self._recovery_until:
+            return
+        self.ssthresh = max(self.window / 2.0, self.mtu_size)
+        self.window = self.ssthresh
+        self._recovery_until = now + (self.srtt or 0.0)
+
+    def on_timeout(self, now):
+        self.ssthresh = max(self.window / 2.0, self.mtu_size)
+        self.window = self.mtu_size
+        self._recovery_until = now + (self.srtt or 0.0)
+
+    def __repr__(self):
+        return "SlidingWindow(window={}, ssthresh={})".format(self.window, self.ssthresh)
+
+
+class RateLimit(CongestionControl):
+    """
+    Rate based variant: a token bucket whose rate (bytes per second) grows additively on each ACK and is halved on
+    NAK or timeout, between min_rate and max_rate. burst caps the tokens saved while idle.
+    """
+    def __init__(self, rate, min_rate=None, max_rate=None, increase=None, burst=None):
+        self.rate = float(rate)
+        self.min_rate = min_rate if min_rate is not None else self.rate / 16
+        self.max_rate = max_rate
+        self.increase = increase if increase is not None else self.rate / 64
+        self.burst = burst if burst is not None else self.rate / 10
+        self.tokens = self.burst
+        self._updated = None
+
+    def _refill(self, now):
+        if self._updated is not None:
+            self.tokens = min(self.tokens + (now - self._updated) * self.rate, self.burst)
+        self._updated = now
+
+    def can_send(self, bytes_in_flight, size, now):
+        self._refill(now)
+        # datagrams larger than the burst go out once the bucket is full, leaving it in debt
+        return self.tokens >= min(size, self.burst)
+
+    def on_sent(self, size, now):
+        self._refill(now)
+        self.tokens -= size
+
+    def on_ack(self, size, rtt, now):
+        self.rate += self.increase
+        if self.max_rate is not None:
+            self.rate = min(self.rate, self.max_rate)
+
+    def on_nak(self, now):
+        self.rate = max(self.rate / 2, self.min_rate)
+
+    on_timeout = on_nak
+
+    def __repr__(self):
+        return "RateLimit(rate={})".format(self.rate)
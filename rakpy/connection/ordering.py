@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from rakpy.connection.ack import unwrap
+from rakpy.connection.reliability import ORDER_CHANNELS
+from rakpy.protocol.const.reliability import is_ordered, is_sequenced
+
+
+class OrderingChannel(object):
+    """
+    Receive side of one order channel.
+
+    Ordered frames are delivered as soon as every previous order index was delivered; early ones wait in a ring of
+    `window` slots indexed by order index, so at most `window` - 1 holes can be pending: frames further ahead are
+    rejected (the sender will retransmit them, reliable frames are only ACKed at the datagram level).
+    Sequenced frames are delivered immediately unless a newer one (or a newer ordered frame) was already delivered.
+    """
+    __slots__ = ("window", "expected", "highest_sequence", "pending", "stale", "rejected", "_ring")
+
+    def __init__(self, window=1024):
+        self.window = window
+        # unbounded counters, wire indexes (24 bits) are unwrapped against them
+        self.expected = 0
+        self.highest_sequence = 0
+        self.pending = 0
+        self.stale = 0
+        self.rejected = 0
+        self._ring = [None] * window
+
+    def add_ordered(self, order_index, payload):
+        """
+        Return the list of payloads now deliverable (empty if the frame is held, stale or rejected)
+        """
+        number = unwrap(order_index, self.expected)
+        expected = self.expected
+        if number == expected:
+            delivered = [payload]
+            self._advance()
+            self._drain(delivered)
+            return delivered
+        if number - expected >= self.window:
+            self.rejected += 1
+            return []
+        slot = number % self.window
+        if number < expected or self._ring[slot] is not None:
+            self.stale += 1
+            return []
+        # held payloads must outlive the datagram buffer (see Frame)
+        self._ring[slot] = bytes(payload)
+        self.pending += 1
+        return []
+
+    def add_sequenced(self, order_index, sequence_index, payload):
+        """
+        Return True if the frame is to be delivered, False if it is stale
+        """
+        if unwrap(order_index, self.expected) < self.expected:
+            self.stale += 1
+            return False
+        number = unwrap(sequence_index, self.highest_sequence)
+        if number < self.highest_sequence:
+            self.stale += 1
+            return False
+        self.highest_sequence = number + 1
+        return True
+
+    def _advance(self):
+        self.expected += 1
+        # the sender restarts sequence indexes after each ordered frame
+        self.highest_sequence = 0
+
+    def _drain(self, delivered):
+        ring, window = self._ring, self.window
+        while self.pending:
+            slot = self.expected % window
+            payload = ring[slot]
+            if payload is None:
+                break
+            ring[slot] = None
+            self.pending -= 1
+            delivered.append(payload)
+            self._advance()
+
+
+class OrderingBuffers(object):
+    """
+    Receive side ordering and sequencing for the 32 order channels of a connection.
+
+    receive() returns the payloads to hand to the application, in order. Channels are allocated on first use.
+    """
+    def __init__(self, window=1024):
+        self.window = window
+        self.channels = [None] * ORDER_CHANNELS
+        self.invalid = 0
+
+    def channel(self, index):
+        channel = self.channels[index]
+        if channel is None:
+            channel = self.channels[index] = OrderingChannel(self.window)
+        return channel
+
+    def receive(self, frame):
+        reliability = frame.reliability
+        if not is_ordered(reliability):
+            return [frame.payload]
+        if frame.order_channel is None or not 0 <= frame.order_channel < ORDER_CHANNELS:
+            self.invalid += 1
+            return []
+        channel = self.channel(frame.order_channel)
+        if is_sequenced(reliability):
+            if channel.add_sequenced(frame.order_index, frame.sequence_index, frame.payload):
+                return [frame.payload]
+            return []
+        return channel.add_ordered(frame.order_index, frame.payload)
+
+    def _total(self, name):
+        return sum(getattr(channel, name) for channel in self.channels if channel is not None)
+
+    @property
+    def pending(self):
+        return self._total("pending")
+
+    @property
+    def stale(self):
+        return self._total("stale")
+
+    @property
+    def rejected(self):
+        return self._total("rejected")
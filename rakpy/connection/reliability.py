@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from rakpy.connection import clock
+from rakpy.connection.ack import InFlightTable
+from rakpy.connection.timer import TimerWheel
+from rakpy.protocol.const.reliability import (RELIABLE, RELIABLE_SEQUENCED, UNRELIABLE, UNRELIABLE_SEQUENCED,
+                                              is_ordered, is_reliable, is_sequenced)
+from rakpy.protocol.datagram import DEFAULT_FLAGS, Datagram, Frame
+
+# reliable, sequence and order indexes are 24 bits (triads) and wrap around
+INDEX_MASK = 0xffffff
+ORDER_CHANNELS = 32
+SPLIT_ID_MASK = 0xffff
+
+# fragments of a split packet are always sent reliably
+SPLIT_RELIABILITY = {
+    UNRELIABLE: RELIABLE,
+    UNRELIABLE_SEQUENCED: RELIABLE_SEQUENCED,
+}
+
+
+class RttEstimator(object):
+    """
+    Smoothed round trip time and variance (RFC 6298), giving the retransmission timeout
+    """
+    ALPHA = 0.125
+    BETA = 0.25
+
+    def __init__(self, initial_rto=1.0, min_rto=0.1, max_rto=10.0):
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial_rto
+        self.samples = 0
+
+    def update(self, sample):
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2.0
+        else:
+            self.rttvar += self.BETA * (abs(self.srtt - sample) - self.rttvar)
+            self.srtt += self.ALPHA * (sample - self.srtt)
+        self.samples += 1
+        self.rto = min(max(self.srtt + 4 * self.rttvar, self.min_rto), self.max_rto)
+
+    def backoff(self):
+        self.rto = min(self.rto * 2, self.max_rto)
+
+    def __repr__(self):
+        return "RttEstimator(srtt={}, rttvar={}, rto={})".format(self.srtt, self.rttvar, self.rto)
+
+
+class SentDatagram(object):
+    """
+    In flight datagram: the frames to send again if it is lost, and when it was sent
+    """
+    __slots__ = ("number", "datagram", "size", "sent_time")
+
+    def __init__(self, number, datagram, size, sent_time):
+        self.number = number
+        self.datagram = datagram
+        self.size = size
+        self.sent_time = sent_time
+
+    def reliable_frames(self):
+        return [frame for frame in self.datagram.frames if is_reliable(frame.reliability)]
+
+
+class SendWindow(object):
+    """
+    Send side of a connection's reliability layer.
+
+    make_frame() assigns reliable, sequence and order indexes, send() wraps frames in a Datagram with the next
+    sequence number and keeps it in flight until it is ACKed. A NAK or a retransmission timeout (RTO, from the RTT
+    estimator) removes a datagram and returns its reliable frames, to be sent again in new datagrams; unreliable
+    frames are simply dropped. Timeouts come from a timer wheel, so tick() does not scan the datagrams in flight.
+    """
+    def __init__(self, rtt=None, wheel=None):
+        self.rtt = rtt if rtt is not None else RttEstimator()
+        self.wheel = wheel if wheel is not None else TimerWheel(now=clock())
+        self.in_flight = InFlightTable()
+        self.bytes_in_flight = 0
+        self.reliable_index = 0
+        self.order_indexes = [0] * ORDER_CHANNELS
+        self.sequence_indexes = [0] * ORDER_CHANNELS
+        self.split_id = 0
+        self.acked = 0
+        self.naked = 0
+        self.timeouts = 0
+        self.retransmitted = 0
+
+    def make_frame(self, payload, reliability=RELIABLE, channel=0):
+        frame = Frame(payload, reliability)
+        if is_reliable(reliability):
+            frame.reliable_index = self.reliable_index
+            self.reliable_index = (self.reliable_index + 1) & INDEX_MASK
+        if is_sequenced(reliability):
+            # sequenced frames share the current order index and get their own sequence index
+            frame.order_channel = channel
+            frame.order_index = self.order_indexes[channel]
+            frame.sequence_index = self.sequence_indexes[channel]
+            self.sequence_indexes[channel] = (frame.sequence_index + 1) & INDEX_MASK
+        elif is_ordered(reliability):
+            frame.order_channel = channel
+            frame.order_index = self.order_indexes[channel]
+            self.order_indexes[channel] = (frame.order_index + 1) & INDEX_MASK
+            self.sequence_indexes[channel] = 0
+        return frame
+
+    def make_frames(self, payload, reliability=RELIABLE, channel=0, max_payload=None):
+        """
+        Like make_frame, but split payloads longer than max_payload into fragments sharing one split id (and one
+        order / sequence index)
+        """
+        if max_payload is None or len(payload) <= max_payload:
+            return [self.make_frame(payload, reliability, channel)]
+        reliability = SPLIT_RELIABILITY.get(reliability, reliability)
+        count = -(-len(payload) // max_payload)
+        split_id = self.split_id
+        self.split_id = (split_id + 1) & SPLIT_ID_MASK
+        view = memoryview(payload)
+        first = self.make_frame(view[:max_payload], reliability, channel)
+        frames = [first]
+        for index in range(1, count):
+            frame = Frame(view[index * max_payload:(index + 1) * max_payload], reliability,
+                          order_index=first.order_index, order_channel=first.order_channel,
+                          sequence_index=first.sequence_index)
+            frame.reliable_index = self.reliable_index
+            self.reliable_index = (self.reliable_index + 1) & INDEX_MASK
+            frames.append(frame)
+        for index, frame in enumerate(frames):
+            frame.split_count, frame.split_id, frame.split_index = count, split_id, index
+        return frames
+
+    def send(self, frames, now=None, flags=DEFAULT_FLAGS):
+        """
+        Wrap frames in a new datagram and keep it in flight, return the datagram
+        """
+        if now is None:
+            now = clock()
+        datagram = Datagram(frames=frames, flags=flags)
+        number = self.in_flight.next_number
+        datagram.sequence_number = number & INDEX_MASK
+        sent = SentDatagram(number, datagram, datagram.encoded_size(), now)
+        self.in_flight.push(sent)
+        self.bytes_in_flight += sent.size
+        self.wheel.schedule(number, now + self.rtt.rto)
+        return datagram
+
+    def on_ack(self, ranges, now=None):
+        """
+        Remove ACKed datagrams and feed the RTT estimator, return the SentDatagrams
+        """
+        if now is None:
+            now = clock()
+        acked = [sent for _, sent in self.in_flight.pop_ranges(ranges)]
+        for sent in acked:
+            self._forget(sent)
+        if acked:
+            # the most recent datagram gives the freshest sample, older ones may have waited for an ACK tick
+            self.rtt.update(now - max(sent.sent_time for sent in acked))
+        self.acked += len(acked)
+        return acked
+
+    def on_nak(self, ranges):
+        """
+        Remove NAKed datagrams, return their reliable frames (to send again)
+        """
+        frames = []
+        for _, sent in self.in_flight.pop_ranges(ranges):
+            self._forget(sent)
+            self.naked += 1
+            frames.extend(sent.reliable_frames())
+        self.retransmitted += len(frames)
+        return frames
+
+    def tick(self, now=None):
+        """
+        Remove the datagrams that timed out, return their reliable frames (to send again)
+        """
+        if now is None:
+            now = clock()
+        frames = []
+        expired = self.wheel.advance(now)
+        for number in expired:
+            sent = self.in_flight.pop(number)
+            if sent is not None:
+                self.bytes_in_flight -= sent.size
+                frames.extend(sent.reliable_frames())
+        if expired:
+            self.timeouts += len(expired)
+            self.rtt.backoff()
+        self.retransmitted += len(frames)
+        return frames
+
+    def _forget(self, sent):
+        self.wheel.cancel(sent.number)
+        self.bytes_in_flight -= sent.size
+
+    def __len__(self):
+        return len(self.in_flight)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import deque
+
+from rakpy.connection import clock
+from rakpy.connection.congestion import CongestionControl
+from rakpy.protocol.const.priority import IMMEDIATE_PRIORITY, HIGH_PRIORITY, MEDIUM_PRIORITY, LOW_PRIORITY
+from rakpy.protocol.const.reliability import RELIABLE
+from rakpy.protocol.datagram import HEADER_LENGTH, MAX_FRAME_HEADER_LENGTH
+
+PRIORITIES = (IMMEDIATE_PRIORITY, HIGH_PRIORITY, MEDIUM_PRIORITY, LOW_PRIORITY)
+# buffered priorities are sent in groups at this interval (seconds), see const/priority.py
+AGGREGATION_INTERVAL = 0.01
+# IPv4 (20) + UDP (8) headers, counted in the MTU negotiated by the offline handshake
+UDP_HEADER_LENGTH = 28
+
+
+class OutgoingScheduler(object):
+    """
+    Per connection outgoing queues, one per priority, packed into MTU sized datagrams.
+
+    Priorities are served by stride scheduling: each level is picked twice as often as the next one, as documented
+    in const/priority.py. IMMEDIATE_PRIORITY messages are sent at once (along with anything retransmitted), the
+    other ones wait for tick(), which the connection calls every AGGREGATION_INTERVAL.
+    Frames are taken from window (a SendWindow) and every encoded datagram is passed to send().
+
+    Sending is gated by congestion (a CongestionControl, see rakpy.connection.congestion), fed through
+    on_acknowledge / on_unacknowledge with the ACK / NAK packets of the peer.
+
+    bytes_packed / bytes_capacity tells how much of each datagram was filled.
+
+    With a pool (a rakpy.io.BufferPool), datagrams are encoded into pooled buffers and send() gets a memoryview that
+    is only valid until it returns (transports copy what they do not send right away).
+    """
+    def __init__(self, window, send, mtu_size, congestion=None, pool=None):
+        self.window = window
+        self.send = send
+        self.pool = pool
+        self.congestion = congestion if congestion is not None else CongestionControl()
+        self.capacity = mtu_size - UDP_HEADER_LENGTH
+        self.max_payload = self.capacity - HEADER_LENGTH - MAX_FRAME_HEADER_LENGTH
+        self.queues = [deque() for _ in PRIORITIES]
+        self.retransmits = deque()
+        # stride scheduling state: next pass per priority, stride 2 ** priority
+        self._passes = [0] * len(PRIORITIES)
+        self.datagrams_sent = 0
+        self.bytes_packed = 0
+        self.bytes_capacity = 0
+        self.blocked = 0
+
+    @property
+    def fill_ratio(self):
+        if not self.bytes_capacity:
+            return 0.0
+        return self.bytes_packed / float(self.bytes_capacity)
+
+    def __len__(self):
+        return len(self.retransmits) + sum(len(queue) for queue in self.queues)
+
+    def queue(self, payload, reliability=RELIABLE, priority=MEDIUM_PRIORITY, channel=0, now=None):
+        """
+        Queue a message (split if it does not fit in one datagram), send it now if its priority is IMMEDIATE
+        """
+        queue = self.queues[priority]
+        if not queue:
+            # an idle level starts from the current pass, it does not get credit for the time it was empty
+            active = [self._passes[level] for level, other in enumerate(self.queues) if other]
+            if active:
+                self._passes[priority] = max(self._passes[priority], min(active))
+        queue.extend(self.window.make_frames(payload, reliability, channel, self.max_payload))
+        if priority == IMMEDIATE_PRIORITY:
+            self.flush(now, immediate_only=True)
+
+    def resend(self, frames):
+        """
+        Queue frames to retransmit (NAKed or timed out), they go before every other frame
+        """
+        self.retransmits.extend(frames)
+
+    def on_acknowledge(self, packet, now=None):
+        """
+        Apply an Acknowledge packet received from the peer
+        """
+        if now is None:
+            now = clock()
+        congestion = self.congestion
+        for sent in self.window.on_ack(packet.packet_ranges, now):
+            congestion.on_ack(sent.size, now - sent.sent_time, now)
+
+    def on_unacknowledge(self, packet, now=None):
+        """
+        Apply an Unacknowledge packet received from the peer: NAKed frames are queued for retransmission
+        """
+        if now is None:
+            now = clock()
+        frames = self.window.on_nak(packet.packet_ranges)
+        if frames:
+            self.congestion.on_nak(now)
+            self.resend(frames)
+
+    def tick(self, now=None):
+        """
+        Collect timed out frames then send everything queued (as far as congestion control allows)
+        """
+        if now is None:
+            now = clock()
+        frames = self.window.tick(now)
+        if frames:
+            self.congestion.on_timeout(now)
+            self.resend(frames)
+        self.flush(now)
+
+    def _next_frame(self, immediate_only):
+        if self.retransmits:
+            return self.retransmits
+        if immediate_only:
+            return self.queues[IMMEDIATE_PRIORITY] or None
+        best = None
+        passes = self._passes
+        for level, queue in enumerate(self.queues):
+            if queue and (best is None or passes[level] < passes[best]):
+                best = level
+        if best is None:
+            return None
+        passes[best] += 1 << best
+        return self.queues[best]
+
+    def flush(self, now=None, immediate_only=False):
+        """
+        Pack queued frames into datagrams and send them, return how many datagrams were sent
+        """
+        if now is None:
+            now = clock()
+        capacity = self.capacity
+        frames, size = [], HEADER_LENGTH
+        sent = 0
+        while True:
+            queue = self._next_frame(immediate_only)
+            if queue is None:
+                break
+            frame = queue[0]
+            frame_size = frame.encoded_size()
+            if frames and size + frame_size > capacity:
+                if not self._send(frames, size, now):
+                    return sent
+                sent += 1
+                frames, size = [], HEADER_LENGTH
+            queue.popleft()
+            frames.append(frame)
+            size += frame_size
+        if frames and self._send(frames, size, now):
+            sent += 1
+        return sent
+
+    def _send(self, frames, size, now):
+        if not self.congestion.can_send(self.window.bytes_in_flight, size, now):
+            # already picked: they go out first once the window opens
+            self.retransmits.extendleft(reversed(frames))
+            self.blocked += 1
+            return False
+        datagram = self.window.send(frames, now)
+        pool = self.pool
+        if pool is None:
+            self.send(datagram.encode())
+        else:
+            buffer = pool.acquire()
+            try:
+                self.send(memoryview(buffer)[:datagram.encode_into(buffer)])
+            finally:
+                pool.release(buffer)
+        self.congestion.on_sent(size, now)
+        self.datagrams_sent += 1
+        self.bytes_packed += size
+        self.bytes_capacity += self.capacity
+        return True
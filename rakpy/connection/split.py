@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from rakpy.connection import clock
+
+
+class SplitBudget(object):
+    """
+    Global caps on outstanding split packets, shared by the assemblers of every connection
+    """
+    def __init__(self, max_splits=4096, max_bytes=64 * 1024 * 1024):
+        self.max_splits = max_splits
+        self.max_bytes = max_bytes
+        self.splits = 0
+        self.bytes = 0
+
+    def acquire(self, size):
+        if self.splits >= self.max_splits or self.bytes + size > self.max_bytes:
+            return False
+        self.splits += 1
+        self.bytes += size
+        return True
+
+    def release(self, size):
+        self.splits -= 1
+        self.bytes -= size
+
+
+class PendingSplit(object):
+    """
+    Fragments of one split packet, copied in place into a single preallocated buffer.
+
+    RakNet cuts a split packet into fragments of the same length, except the last one, so fragment i lives at
+    i * fragment_length. Until a non-last fragment tells us that length, the last fragment is parked at the end of
+    the buffer.
+    """
+    __slots__ = ("count", "buffer", "received", "received_count", "fragment_length", "last_length",
+                 "last_position", "deadline")
+
+    def __init__(self, count, mtu, deadline):
+        self.count = count
+        self.buffer = bytearray(count * mtu)
+        self.received = bytearray(count)
+        self.received_count = 0
+        self.fragment_length = None
+        self.last_length = None
+        self.last_position = (count - 1) * mtu
+        self.deadline = deadline
+
+    @property
+    def size(self):
+        return len(self.buffer)
+
+    def add(self, index, payload):
+        """
+        Copy a fragment into place, return False if it is inconsistent with the fragments already received
+        """
+        length = len(payload)
+        last = self.count - 1
+        if index == last:
+            if self.fragment_length is not None:
+                if length > self.fragment_length:
+                    return False
+                self.last_position = index * self.fragment_length
+            position = self.last_position
+            self.last_length = length
+        else:
+            if self.fragment_length is None:
+                if length == 0 or (self.last_length is not None and self.last_length > length):
+                    return False
+                self.fragment_length = length
+                if self.last_length is not None:
+                    self._move_last(last * length)
+            elif length != self.fragment_length:
+                return False
+            position = index * length
+        self.buffer[position:position + length] = payload
+        self.received[index] = 1
+        self.received_count += 1
+        return True
+
+    def _move_last(self, position):
+        start, length = self.last_position, self.last_length
+        if start - position < length:
+            # overlapping regions, copy through a temporary slice
+            self.buffer[position:position + length] = self.buffer[start:start + length]
+        else:
+            self.buffer[position:position + length] = memoryview(self.buffer)[start:start + length]
+        self.last_position = position
+
+    def is_complete(self):
+        return self.received_count == self.count
+
+    def payload(self):
+        return memoryview(self.buffer)[:self.last_position + self.last_length]
+
+
+class SplitAssembler(object):
+    """
+    Per connection split packet reassembly.
+
+    Each split id gets one buffer of split count * MTU bytes, allocated when its first fragment arrives.
+    Outstanding splits are capped per connection (max_splits) and globally (budget), and expire after timeout
+    seconds without completing. Rejected fragments are counted, never raised.
+    """
+    def __init__(self, mtu, budget=None, max_splits=32, max_split_count=1024, timeout=10.0):
+        self.mtu = mtu
+        self.budget = budget if budget is not None else SplitBudget()
+        self.max_splits = max_splits
+        self.max_split_count = max_split_count
+        self.timeout = timeout
+        self.pending = {}
+        self.completed = 0
+        self.expired = 0
+        self.rejected = 0
+
+    def add(self, frame, now=None):
+        """
+        Add a split frame, return a memoryview over the reassembled payload once every fragment arrived, None
+        otherwise
+        """
+        count, index = frame.split_count, frame.split_index
+        if not 0 <= index < count or len(frame.payload) > self.mtu:
+            self.rejected += 1
+            return None
+
+        pending = self.pending.get(frame.split_id)
+        if pending is None:
+            if count > self.max_split_count or len(self.pending) >= self.max_splits:
+                self.rejected += 1
+                return None
+            if not self.budget.acquire(count * self.mtu):
+                self.rejected += 1
+                return None
+            if now is None:
+                now = clock()
+            pending = self.pending[frame.split_id] = PendingSplit(count, self.mtu, now + self.timeout)
+        elif count != pending.count or pending.received[index]:
+            self.rejected += 1
+            return None
+
+        if not pending.add(index, frame.payload):
+            self._discard(frame.split_id)
+            self.rejected += 1
+            return None
+        if not pending.is_complete():
+            return None
+
+        self._discard(frame.split_id)
+        self.completed += 1
+        return pending.payload()
+
+    def expire(self, now=None):
+        """
+        Drop splits older than timeout, return how many were dropped
+        """
+        if now is None:
+            now = clock()
+        stale = [split_id for split_id, pending in self.pending.items() if pending.deadline <= now]
+        for split_id in stale:
+            self._discard(split_id)
+        self.expired += len(stale)
+        return len(stale)
+
+    def clear(self):
+        for split_id in list(self.pending):
+            self._discard(split_id)
+
+    def _discard(self, split_id):
+        pending = self.pending.pop(split_id)
+        self.budget.release(pending.size)
+
+    def __len__(self):
+        return len(self.pending)
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import math
+
+
+class TimerWheel(object):
+    """
+    Hashed timer wheel: deadlines are rounded up to `resolution` seconds ticks and stored in one of `slots` buckets.
+
+    schedule() and cancel() are O(1), advance() only visits the buckets of the ticks elapsed since the previous call,
+    so its cost depends on the number of expiring timers, not on the number of pending ones. Timers further away
+    than one turn of the wheel stay in their bucket until their turn comes.
+    """
+    def __init__(self, resolution=0.01, slots=256, now=0.0):
+        self.resolution = resolution
+        self.slots = slots
+        self.tick = self._tick(now)
+        self._buckets = [{} for _ in range(slots)]
+        self._ticks = {}
+
+    def _tick(self, time):
+        # the epsilon absorbs float noise, a deadline on a tick boundary must not move to the next tick
+        return int(math.floor(time / self.resolution + 1e-9))
+
+    def schedule(self, key, deadline):
+        """
+        Schedule (or reschedule) key to expire at deadline
+        """
+        if key in self._ticks:
+            self.cancel(key)
+        # never in the past: the current tick is being (or was) processed
+        tick = max(int(math.ceil(deadline / self.resolution - 1e-9)), self.tick + 1)
+        self._ticks[key] = tick
+        self._buckets[tick % self.slots][key] = tick
+
+    def cancel(self, key):
+        """
+        Remove key, return False if it was not scheduled
+        """
+        tick = self._ticks.pop(key, None)
+        if tick is None:
+            return False
+        del self._buckets[tick % self.slots][key]
+        return True
+
+    def advance(self, now):
+        """
+        Move the wheel to now, return the keys that expired (in deadline order)
+        """
+        target = self._tick(now)
+        expired = []
+        if target <= self.tick:
+            return expired
+        # past one full turn every bucket is visited once
+        start = max(self.tick + 1, target - self.slots + 1)
+        buckets, ticks = self._buckets, self._ticks
+        due = []
+        for tick in range(start, target + 1):
+            bucket = buckets[tick % self.slots]
+            if not bucket:
+                continue
+            ready = [(deadline, key) for key, deadline in bucket.items() if deadline <= target]
+            for _, key in ready:
+                del bucket[key]
+                del ticks[key]
+            due.extend(ready)
+        self.tick = target
+        due.sort(key=lambda item: item[0])
+        expired.extend(key for _, key in due)
+        return expired
+
+    def __len__(self):
+        return len(self._ticks)
+
+    def __contains__(self, key):
+        return key in self._ticks
@@ -2,6 +2,8 @@
 from __future__ import unicode_literals
 
 import os
+from contextlib import contextmanager
+from struct import Struct, error as StructError
 
 import six
 
@@ -10,6 +12,132 @@ class EndOfStreamException(Exception):
     pass
 
 
+_U8 = Struct(str("!B"))
+_U16 = Struct(str("!H"))
+_U32 = Struct(str("!I"))
+_TRIAD = Struct(str("!BH"))
+_TRIAD_LE = Struct(str("<HB"))
+_I64 = Struct(str("!q"))
+_U64 = Struct(str("!Q"))
+
+# room for the largest MTU plus headers
+DEFAULT_POOL_BUFFER_SIZE = 2048
+DEFAULT_POOL_SIZE = 64
+
+
+if six.PY2:
+    def byte_at(buffer, offset):
+        """
+        Byte of buffer (bytes, bytearray or memoryview) at offset, as an int. six.indexbytes only accepts str on
+        Python 2.
+        """
+        return _U8.unpack_from(buffer, offset)[0]
+else:
+    def byte_at(buffer, offset):
+        """
+        Byte of buffer (bytes, bytearray or memoryview) at offset, as an int
+        """
+        return buffer[offset]
+
+
+def read_struct(buffer, offset, struct):
+    """
+    Unpack struct from buffer at offset, return (values, new offset)
+    """
+    end = offset + struct.size
+    if end > len(buffer):
+        raise EndOfStreamException()
+    return struct.unpack_from(buffer, offset), end
+
+
+def write_bytes(buffer, offset, data):
+    """
+    Copy data into buffer at offset, return the new offset
+    """
+    end = offset + len(data)
+    if end > len(buffer):
+        raise EndOfStreamException()
+    buffer[offset:end] = data
+    return end
+
+
+def write_struct(buffer, offset, struct, *values):
+    """
+    Pack values into buffer at offset, return the new offset
+    """
+    end = offset + struct.size
+    if end > len(buffer):
+        raise EndOfStreamException()
+    try:
+        struct.pack_into(buffer, offset, *values)
+    except StructError as e:
+        raise OverflowError(str(e))
+    return end
+
+
+class ByteReader(object):
+    """
+    Cursor over a bytes-like object: values are unpacked in place at an integer offset, nothing is copied.
+    """
+    __slots__ = ("buffer", "offset", "end")
+
+    def __init__(self, data, offset=0, end=None):
+        self.buffer = data
+        self.offset = offset
+        self.end = len(data) if end is None else end
+
+    def unpack(self, struct):
+        offset = self.offset
+        end = offset + struct.size
+        if end > self.end:
+            raise EndOfStreamException()
+        self.offset = end
+        return struct.unpack_from(self.buffer, offset)
+
+    def read_u8(self):
+        return self.unpack(_U8)[0]
+
+    def read_u16(self):
+        return self.unpack(_U16)[0]
+
+    def read_u32(self):
+        return self.unpack(_U32)[0]
+
+    def read_triad(self):
+        high, low = self.unpack(_TRIAD)
+        return (high << 16) | low
+
+    def read_triad_le(self):
+        low, high = self.unpack(_TRIAD_LE)
+        return (high << 16) | low
+
+    def read_i64(self):
+        return self.unpack(_I64)[0]
+
+    def read_u64(self):
+        return self.unpack(_U64)[0]
+
+    def read_view(self, size):
+        """
+        Return a memoryview over the next size bytes
+        """
+        offset = self.offset
+        end = offset + size
+        if size < 0 or end > self.end:
+            raise EndOfStreamException()
+        self.offset = end
+        return memoryview(self.buffer)[offset:end]
+
+    def skip(self, size):
+        end = self.offset + size
+        if end > self.end:
+            raise EndOfStreamException()
+        self.offset = end
+
+    def remaining(self):
+        return self.end - self.offset
+
+
 class ByteStream(object):
 
     def __init__(self, data):
@@ -57,6 +185,18 @@ class ByteStream(object):
         return len(self._buffer[self._offset:])
 
 
+def decode_from_stream(decode_from, data):
+    """
+    Adapt a decode_from(buffer, offset) -> (value, offset) function to a ByteStream or a bytes-like object.
+    The stream position is moved past the decoded value.
+    """
+    if isinstance(data, ByteStream):
+        value, offset = decode_from(data._buffer, data.tell())
+        data.seek(offset)
+        return value
+    return decode_from(data, 0)[0]
+
+
 def convert_to_stream(argument_name):
     def actual_decorator(function):
         try:
@@ -72,3 +212,55 @@ def convert_to_stream(argument_name):
             return function(*args, **kwargs)
         return wrapper
     return actual_decorator
+
+
+class BufferPool(object):
+    """
+    Free list of bytearrays of buffer_size bytes, reused for encoding (and receiving) datagrams.
+
+    acquire() pops a free buffer, or allocates one when none is left (counted in misses); release() gives it back,
+    buffers beyond size are left to the garbage collector. high_water is the highest number of buffers in use at
+    once: a pool of that size would never miss. Buffers are handed out dirty.
+    """
+    def __init__(self, buffer_size=DEFAULT_POOL_BUFFER_SIZE, size=DEFAULT_POOL_SIZE):
+        self.buffer_size = buffer_size
+        self.size = size
+        self._free = [bytearray(buffer_size) for _ in range(size)]
+        self.in_use = 0
+        self.high_water = 0
+        self.misses = 0
+
+    def acquire(self):
+        free = self._free
+        if free:
+            buffer = free.pop()
+        else:
+            self.misses += 1
+            buffer = bytearray(self.buffer_size)
+        self.in_use += 1
+        if self.in_use > self.high_water:
+            self.high_water = self.in_use
+        return buffer
+
+    def release(self, buffer):
+        self.in_use -= 1
+        if len(self._free) < self.size and len(buffer) == self.buffer_size:
+            self._free.append(buffer)
+
+    @contextmanager
+    def buffer(self):
+        """
+        with pool.buffer() as buffer: acquire a buffer, released at the end of the block
+        """
+        buffer = self.acquire()
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+    def __len__(self):
+        return len(self._free)
+
+    def __repr__(self):
+        return "BufferPool(buffer_size={}, free={}, in_use={}, high_water={}, misses={})".format(
+            self.buffer_size, len(self._free), self.in_use, self.high_water, self.misses)
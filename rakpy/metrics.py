@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+Counters and HDR style histograms for the hot paths (packet decoding, server traffic, retransmissions).
+
+Nothing is measured until enable() is called, at startup: it wraps the instrumented methods in place, so when
+metrics are disabled the hot paths run the plain methods, without any extra branch or call. disable() restores them.
+
+    from rakpy import metrics
+    metrics.enable()
+    ...
+    text = metrics.export_prometheus()   # or metrics.REGISTRY.snapshot()
+"""
+from __future__ import unicode_literals
+
+import functools
+import time
+from collections import OrderedDict
+
+# nanoseconds, for decode latencies
+clock_ns = getattr(time, "perf_counter_ns", None) or (lambda: int(time.perf_counter() * 1e9))
+
+
+class Counter(object):
+    """
+    Monotonic counter, optionally split by the values of one label
+    """
+    type = "counter"
+
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = {}
+
+    def inc(self, amount=1, label=None):
+        values = self.values
+        values[label] = values.get(label, 0) + amount
+
+    def get(self, label=None):
+        return self.values.get(label, 0)
+
+    def reset(self):
+        self.values.clear()
+
+    def snapshot(self):
+        return dict(self.values)
+
+
+class Histogram(object):
+    """
+    HDR style histogram of non negative integers, in constant memory.
+
+    Each power of two is split in 2 ** (SUB_BUCKET_BITS - 1) linear buckets, so any recorded value is known within
+    1 / 2 ** (SUB_BUCKET_BITS - 1) of its magnitude (6.25%). Values above max_value are counted in the last bucket.
+    """
+    SUB_BUCKET_BITS = 5
+    HALF = 1 << (SUB_BUCKET_BITS - 1)
+
+    def __init__(self, max_value=1 << 36):
+        self.max_value = max_value
+        self.counts = [0] * (self.index(max_value) + 1)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def index(cls, value):
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS
+        if shift <= 0:
+            return value
+        return shift * cls.HALF + (value >> shift)
+
+    @classmethod
+    def bucket_range(cls, index):
+        """
+        Return the (lowest, highest) values counted in bucket index
+        """
+        if index < 2 * cls.HALF:
+            return index, index
+        shift = index // cls.HALF - 1
+        mantissa = index - shift * cls.HALF
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, value):
+        index = self.index(value)
+        if index >= len(self.counts):
+            index = len(self.counts) - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """
+        Highest value equivalent (same bucket) to the given percentile, None if nothing was recorded
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(round(self.count * percent / 100.0)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bucket_range(index)[1], self.max)
+        return self.max
+
+    def cumulative_buckets(self):
+        """
+        Cumulative counts at each power of two, as [(upper bound, count of values <= upper bound)]
+        """
+        buckets = []
+        seen = 0
+        bound = 1
+        for index, count in enumerate(self.counts):
+            seen += count
+            if self.bucket_range(index)[1] == bound:
+                buckets.append((bound, seen))
+                bound = 2 * bound + 1
+        return buckets
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts[:len(self.counts)]):
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p999": self.percentile(99.9),
+        }
+
+
+class HistogramFamily(object):
+    """
+    One Histogram per value of a label. scale converts recorded values to the exported unit (ns to seconds).
+    """
+    type = "histogram"
+
+    def __init__(self, name, help, label=None, scale=1.0, max_value=1 << 36):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.scale = scale
+        self.max_value = max_value
+        self.histograms = {}
+
+    def histogram(self, label=None):
+        histogram = self.histograms.get(label)
+        if histogram is None:
+            histogram = self.histograms[label] = Histogram(self.max_value)
+        return histogram
+
+    def record(self, value, label=None):
+        self.histogram(label).record(value)
+
+    def reset(self):
+        self.histograms.clear()
+
+    def snapshot(self):
+        return dict((label, histogram.snapshot()) for label, histogram in self.histograms.items())
+
+
+class Registry(object):
+    """
+    Named counters and histograms. snapshot() returns plain data, export_prometheus() renders it as text.
+    """
+    def __init__(self):
+        self.metrics = OrderedDict()
+
+    def _get(self, metric_class, name, *args, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = metric_class(name, *args, **kwargs)
+        elif not isinstance(metric, metric_class):
+            raise ValueError("{} is already registered as a {}".format(name, metric.type))
+        return metric
+
+    def counter(self, name, help, label=None):
+        return self._get(Counter, name, help, label)
+
+    def histogram(self, name, help, label=None, scale=1.0, max_value=1 << 36):
+        return self._get(HistogramFamily, name, help, label, scale=scale, max_value=max_value)
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def snapshot(self):
+        return dict((name, metric.snapshot()) for name, metric in self.metrics.items())
+
+
+REGISTRY = Registry()
+
+PACKETS_DECODED = REGISTRY.counter("rakpy_packets_decoded_total", "Packets and datagrams decoded", "packet")
+DECODE_FAILURES = REGISTRY.counter("rakpy_decode_failures_total", "Decoding failures", "exception")
+DECODE_SECONDS = REGISTRY.histogram("rakpy_decode_seconds", "Time spent decoding a packet", "packet", scale=1e-9)
+BYTES_RECEIVED = REGISTRY.counter("rakpy_bytes_received_total", "UDP payload bytes received by servers")
+BYTES_SENT = REGISTRY.counter("rakpy_bytes_sent_total", "UDP payload bytes sent by servers")
+DATAGRAMS_RECEIVED = REGISTRY.counter("rakpy_datagrams_received_total", "UDP datagrams received by servers")
+DATAGRAMS_SENT = REGISTRY.counter("rakpy_datagrams_sent_total", "UDP datagrams sent by servers")
+FRAMES_RESENT = REGISTRY.counter("rakpy_frames_resent_total", "Reliable frames queued for retransmission", "reason")
+
+
+def _escape(value):
+    return ("{}".format(value)).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    pairs = [(name, value) for name, value in pairs if name is not None]
+    if not pairs:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(name, _escape(value)) for name, value in pairs) + "}"
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return "{}".format(value)
+
+
+def export_prometheus(registry=REGISTRY):
+    """
+    Render the registry in the Prometheus text exposition format (version 0.0.4)
+    """
+    lines = []
+    for name, metric in registry.metrics.items():
+        lines.append("# HELP {} {}".format(name, metric.help))
+        lines.append("# TYPE {} {}".format(name, metric.type))
+        if metric.type == "counter":
+            for label, value in sorted(metric.values.items(), key=lambda item: "{}".format(item[0])):
+                lines.append("{}{} {}".format(name, _labels([(metric.label, label)]), value))
+            continue
+        for label, histogram in sorted(metric.histograms.items(), key=lambda item: "{}".format(item[0])):
+            for bound, count in histogram.cumulative_buckets():
+                bucket_labels = _labels([(metric.label, label), ("le", _number(bound * metric.scale))])
+                lines.append("{}_bucket{} {}".format(name, bucket_labels, count))
+            labels = _labels([(metric.label, label)])
+            lines.append("{}_bucket{} {}".format(name, _labels([(metric.label, label), ("le", "+Inf")]),
+                                                 histogram.count))
+            lines.append("{}_sum{} {}".format(name, labels, _number(histogram.sum * metric.scale)))
+            lines.append("{}_count{} {}".format(name, labels, histogram.count))
+    return "\n".join(lines) + "\n"
+
+
+# (owner, attribute name, original value or _MISSING) of every installed hook
+_installed = []
+_MISSING = object()
+
+
+def _install(owner, name, value):
+    _installed.append((owner, name, owner.__dict__.get(name, _MISSING)))
+    setattr(owner, name, value)
+
+
+def is_enabled():
+    return bool(_installed)
+
+
+def _timed_init(init_from_buffer):
+    @functools.wraps(init_from_buffer)
+    def wrapper(self, data):
+        name = type(self).__name__
+        start = clock_ns()
+        try:
+            init_from_buffer(self, data)
+        except Exception as e:
+            DECODE_FAILURES.inc(label=type(e).__name__)
+            raise
+        DECODE_SECONDS.record(clock_ns() - start, name)
+        PACKETS_DECODED.inc(label=name)
+    return wrapper
+
+
+def _timed_decode(decode):
+    # classmethods (Datagram.decode, Packet.decode_lazy): decode is the underlying function
+    @functools.wraps(decode)
+    def wrapper(cls, data):
+        start = clock_ns()
+        try:
+            value = decode(cls, data)
+        except Exception as e:
+            DECODE_FAILURES.inc(label=type(e).__name__)
+            raise
+        name = cls.__name__
+        DECODE_SECONDS.record(clock_ns() - start, name)
+        PACKETS_DECODED.inc(label=name)
+        return value
+    return classmethod(wrapper)
+
+
+def _unknown_packet(self, packet_id):
+    # PacketRegistry.__missing__: only called for unknown ids, decode_packet turns the KeyError into an
+    # UnknownPacketException
+    DECODE_FAILURES.inc(label="UnknownPacketException")
+    raise KeyError(packet_id)
+
+
+def _counted_received(datagram_received):
+    @functools.wraps(datagram_received)
+    def wrapper(self, data, addr):
+        DATAGRAMS_RECEIVED.inc()
+        BYTES_RECEIVED.inc(len(data))
+        return datagram_received(self, data, addr)
+    return wrapper
+
+
+class CountingTransport(object):
+    """
+    Transport proxy counting what is sent through sendto
+    """
+    def __init__(self, transport):
+        self._transport = transport
+
+    def sendto(self, data, addr=None):
+        DATAGRAMS_SENT.inc()
+        BYTES_SENT.inc(len(data))
+        self._transport.sendto(data, addr)
+
+    def __getattr__(self, name):
+        return getattr(self._transport, name)
+
+
+def _counted_connection_made(connection_made):
+    @functools.wraps(connection_made)
+    def wrapper(self, transport):
+        return connection_made(self, CountingTransport(transport))
+    return wrapper
+
+
+def _counted_resend(method, reason):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        frames = method(*args, **kwargs)
+        if frames:
+            FRAMES_RESENT.inc(len(frames), reason)
+        return frames
+    return wrapper
+
+
+def enable():
+    """
+    Install the instrumentation hooks, call it at startup (before any traffic). Instances created before the call
+    (server protocols in particular) are only partly instrumented.
+    """
+    if _installed:
+        return
+    from rakpy.connection.reliability import SendWindow
+    from rakpy.protocol import Packet, PacketRegistry
+    from rakpy.protocol.datagram import Datagram
+    from rakpy.server import ServerProtocol
+
+    _install(Packet, "_init_from_buffer", _timed_init(Packet._init_from_buffer))
+    _install(Packet, "decode_lazy", _timed_decode(Packet.__dict__["decode_lazy"].__func__))
+    _install(Datagram, "decode", _timed_decode(Datagram.__dict__["decode"].__func__))
+    _install(PacketRegistry, "__missing__", _unknown_packet)
+    _install(ServerProtocol, "datagram_received", _counted_received(ServerProtocol.datagram_received))
+    _install(ServerProtocol, "connection_made", _counted_connection_made(ServerProtocol.connection_made))
+    _install(SendWindow, "on_nak", _counted_resend(SendWindow.on_nak, "nak"))
+    _install(SendWindow, "tick", _counted_resend(SendWindow.tick, "timeout"))
+
+
+def disable():
+    """
+    Remove the instrumentation hooks (recorded values are kept, see Registry.reset)
+    """
+    while _installed:
+        owner, name, original = _installed.pop()
+        if original is _MISSING:
+            delattr(owner, name)
+        else:
+            setattr(owner, name, original)
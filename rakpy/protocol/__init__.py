@@ -5,8 +5,10 @@ import inspect
 
 import six
 
-from rakpy.io import convert_to_stream
+from rakpy.io import ByteStream, EndOfStreamException, byte_at, write_bytes
+from rakpy.protocol.codec import PacketCodec, LazyLayout, MAGIC_NAME
 from rakpy.protocol.const import MAGIC
+from rakpy.protocol.datagram import Datagram, is_datagram
 from rakpy.protocol.exceptions import UnknownPacketException, RemainingDataException
 from rakpy.protocol import fields
 
@@ -28,14 +30,23 @@ class PacketRegistry(dict):
 registry = PacketRegistry()
 
 
-@convert_to_stream("data")
-def decode_packet(data):
-    packet_id = six.indexbytes(data, 0)
+def decode_packet(data, lazy=False):
+    """
+    Decode any packet or datagram. With lazy=True, packets only decode their fields when accessed (see
+    Packet.decode_lazy).
+    """
+    if not len(data):
+        raise EndOfStreamException()
+    packet_id = byte_at(data, 0)
+    if is_datagram(packet_id):
+        return Datagram.decode(data)
 
     try:
         packet_class = registry[packet_id]
     except KeyError:
         raise UnknownPacketException(hex(packet_id))
+    if lazy:
+        return packet_class.decode_lazy(data)
     return packet_class(data)
 
 
@@ -44,6 +55,8 @@ class Options(object):
         self.id = meta.id
         self.structure = meta.structure
         self.fields = dict()
+        self.codec = None
+        self.lazy = None
 
     def add_field(self, field, name):
         self.fields[name] = field
@@ -60,7 +73,18 @@ class PacketBase(type):
             return super_new(mcs, name, bases, attributes)
 
         module = attributes.pop('__module__')
-        new_class = super_new(mcs, name, bases, {'__module__': module})
+        # one slot per field (no instance __dict__), unless a parent packet class already has it
+        inherited = set()
+        for parent in parents:
+            for klass in parent.__mro__:
+                inherited.update(klass.__dict__.get('__slots__', ()))
+        # (list comprehension variables leak on Python 2: they must not shadow the class name)
+        field_names = [field_name for field_name in attributes['Meta'].structure if field_name != MAGIC_NAME]
+        field_names += [field_name for field_name, value in attributes.items()
+                        if not inspect.isclass(value) and hasattr(value, 'contribute_to_class')
+                        and field_name not in field_names]
+        slots = tuple(field_name for field_name in field_names if field_name not in inherited)
+        new_class = super_new(mcs, name, bases, {'__module__': module, '__slots__': slots})
 
         # Add meta
         meta = attributes.pop('Meta')
@@ -70,6 +94,10 @@ class PacketBase(type):
         for obj_name, obj in attributes.items():
             new_class.add_to_class(obj_name, obj)
 
+        # Compile the decoding plan once fields are known
+        new_class._meta.codec = PacketCodec(new_class._meta)
+        new_class._meta.lazy = LazyLayout(new_class._meta)
+
         return new_class
 
     def add_to_class(cls, name, value):
@@ -81,16 +109,128 @@ class PacketBase(type):
 
 
 class Packet(six.with_metaclass(PacketBase)):
+    # subclasses get one slot per field from PacketBase
+    __slots__ = ("_lazy_buffer", "_lazy_offsets")
 
     def __init__(self, *args, **kwargs):
         if len(args) == 1:
             self._init_from_buffer(args[0])
+        else:
+            self._init_from_values(**kwargs)
         super(Packet, self).__init__()
 
-    @convert_to_stream("data")
+    def _init_from_values(self, **values):
+        for name in self._meta.fields:
+            setattr(self, name, values.pop(name, None))
+        if values:
+            raise TypeError("Unexpected field(s) for {}: {}".format(type(self).__name__, ", ".join(sorted(values))))
+
     def _init_from_buffer(self, data):
-        self._data = data
-        self._decode()
+        if isinstance(data, ByteStream):
+            buffer, offset = data._buffer, data.tell()
+        else:
+            buffer, offset = data, 0
+        offset = self._meta.codec.decode_from(self, buffer, offset)
+        if offset != len(buffer):
+            raise RemainingDataException(buffer[offset:])
+
+    @classmethod
+    def decode_lazy(cls, data):
+        """
+        Check the packet id (and MAGIC, and the length of fixed length packets) then keep data: each field is
+        decoded and cached on first access. data must not change until then, validate() decodes everything left.
+        """
+        layout = cls._meta.lazy
+        if not len(data):
+            raise EndOfStreamException()
+        if byte_at(data, 0) != cls._meta.id:
+            raise ValueError()
+        if layout.size is not None:
+            if len(data) < layout.size:
+                raise EndOfStreamException()
+            if len(data) > layout.size:
+                raise RemainingDataException(data[layout.size:])
+        if layout.check_magic:
+            for offset in layout.magic_offsets:
+                end = offset + len(MAGIC)
+                if end > len(data):
+                    raise EndOfStreamException()
+                if data[offset:end] != MAGIC:
+                    raise ValueError()
+        packet = cls.__new__(cls)
+        packet._lazy_buffer = data
+        # offsets of the fields located so far, then of the end of the packet
+        packet._lazy_offsets = list(layout.offsets)
+        return packet
+
+    def __getattr__(self, name):
+        # only called for unset slots: decode the field if the packet was decoded lazily
+        layout = self._meta.lazy
+        if name not in layout.indexes or getattr(self, "_lazy_buffer", None) is None:
+            raise AttributeError(name)
+        return self._decode_lazy_field(name)
+
+    def _is_set(self, name):
+        try:
+            object.__getattribute__(self, name)
+        except AttributeError:
+            return False
+        return True
+
+    def _decode_lazy_field(self, name):
+        layout = self._meta.lazy
+        index = layout.indexes[name]
+        offset = self._lazy_offsets[index]
+        if offset is None:
+            offset = self._locate(index)
+        value, end = layout.fields[index].decode_from(self._lazy_buffer, offset)
+        self._lazy_offsets[index + 1] = end + layout.skips[index + 1]
+        setattr(self, name, value)
+        return value
+
+    def _locate(self, index):
+        # locate the fields between the last located one and index
+        layout = self._meta.lazy
+        offsets = self._lazy_offsets
+        known = index
+        while offsets[known] is None:
+            known -= 1
+        for position in range(known, index):
+            if offsets[position + 1] is not None:
+                continue
+            # fields in between are only skipped, they get decoded if accessed
+            end = layout.fields[position].skip(self._lazy_buffer, offsets[position])
+            offsets[position + 1] = end + layout.skips[position + 1]
+        return offsets[index]
+
+    def validate(self):
+        """
+        Decode the fields of a lazily decoded packet that were not accessed yet, and check there is no remaining
+        data
+        """
+        buffer = getattr(self, "_lazy_buffer", None)
+        if buffer is None:
+            return
+        for name in self._meta.lazy.names:
+            if not self._is_set(name):
+                self._decode_lazy_field(name)
+        end = self._locate(len(self._meta.lazy.names))
+        if end > len(buffer):
+            raise EndOfStreamException()
+        if end != len(buffer):
+            raise RemainingDataException(buffer[end:])
+        if not self._meta.lazy.check_magic:
+            self._meta.codec.decode_from(type(self).__new__(type(self)), buffer, 0)
+        self._lazy_buffer = self._lazy_offsets = None
+
+    @classmethod
+    def decode_from(cls, buffer, offset=0):
+        """
+        Decode a packet from buffer at offset without checking for remaining data, return (packet, new offset)
+        """
+        packet = cls.__new__(cls)
+        offset = cls._meta.codec.decode_from(packet, buffer, offset)
+        return packet, offset
 
     def _get_id(self):
         return self._meta.id
@@ -104,19 +244,20 @@ class Packet(six.with_metaclass(PacketBase)):
         for field_name in self._meta.structure:
             yield field_name
 
-    def _decode(self):
-        for name in self._get_structure():
-            if name == "__id__":
-                packet_id = fields.UnsignedByteField.decode(self._data)
-                if not self._check_id(packet_id):
-                    raise ValueError()
-            elif name == "__magic__":
-                MagicField.decode(self._data)
-            else:
-                field = self._meta.fields[name]
-                setattr(self, name, field.decode(self._data))
-        if len(self._data):
-            raise RemainingDataException(self._data)
+    def encoded_size(self):
+        return self._meta.codec.encoded_size(self)
+
+    def encode(self):
+        """
+        Encode the packet into a freshly allocated bytearray
+        """
+        return self._meta.codec.encode(self)
+
+    def encode_into(self, buffer, offset=0):
+        """
+        Encode the packet into an existing bytearray or writable memoryview, return the new offset
+        """
+        return self._meta.codec.encode_into(self, buffer, offset)
 
     def __repr__(self):
         values = ("=".join([field_name, str(getattr(self, field_name))])
@@ -125,18 +266,25 @@ class Packet(six.with_metaclass(PacketBase)):
 
 
 class MagicField(fields.Field):
+    LENGTH = len(MAGIC)
 
     @classmethod
-    @convert_to_stream("data")
-    def decode(cls, data):
-        value = data.read(len(MAGIC))
-        if value != MAGIC:
+    def decode_from(cls, buffer, offset):
+        end = offset + len(MAGIC)
+        if end > len(buffer):
+            raise EndOfStreamException()
+        if buffer[offset:end] != MAGIC:
             raise ValueError()
-        return b""
+        return b"", end
 
     @classmethod
     def encode(cls, value):
         return MAGIC
 
+    @classmethod
+    def encode_into(cls, value, buffer, offset):
+        return write_bytes(buffer, offset, MAGIC)
+
 
 from rakpy.protocol.packets import *
+from rakpy.protocol.batch import decode_packets, decode_batch
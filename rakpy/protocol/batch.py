@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from struct import calcsize
+
+import six
+
+from rakpy.io import byte_at
+from rakpy.protocol import registry, decode_packet
+from rakpy.protocol.codec import StructStep, MAGIC_NAME, ID_FORMAT
+from rakpy.protocol.const import MAGIC
+from rakpy.protocol.exceptions import DECODE_ERRORS
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+# struct format character -> numpy dtype (network byte order)
+STRUCT_DTYPES = {
+    "b": "i1",
+    "B": "u1",
+    "?": "?",
+    "H": ">u2",
+    "i": ">i4",
+    "q": ">i8",
+    "Q": ">u8",
+    "f": ">f4",
+    "d": ">f8",
+}
+
+
+def decode_packets(buffers, ignore_errors=False):
+    """
+    Decode many packets, return them as a list in input order.
+    With ignore_errors, packets that fail to decode are returned as None.
+    """
+    packets = []
+    for data in buffers:
+        try:
+            packets.append(decode_packet(data))
+        except DECODE_ERRORS:
+            if not ignore_errors:
+                raise
+            packets.append(None)
+    return packets
+
+
+class PacketBatch(object):
+    """
+    Packets of one class, decoded column-wise: columns maps every field name to a numpy array (fixed layout packets,
+    when numpy is installed) or a list, indexes holds the position of each row in the input.
+    Input positions of packets that failed to decode are listed in rejected.
+    """
+    def __init__(self, packet_class, indexes, columns, rejected):
+        self.packet_class = packet_class
+        self.indexes = indexes
+        self.columns = columns
+        self.rejected = rejected
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def packets(self):
+        """
+        Build one packet instance per row
+        """
+        names = list(self.columns)
+        if not names:
+            # packets without fields: zip() of no column would yield no row
+            for _ in range(len(self.indexes)):
+                yield self.packet_class()
+            return
+        for row in six.moves.zip(*(self.columns[name] for name in names)):
+            yield self.packet_class(**dict(zip(names, row)))
+
+    def __repr__(self):
+        return "PacketBatch({}, rows={}, rejected={})".format(self.packet_class.__name__, len(self), len(self.rejected))
+
+
+class DecodedBatch(dict):
+    """
+    PacketBatch by packet class, input positions of unknown packet ids are listed in unknown
+    """
+    def __init__(self):
+        super(DecodedBatch, self).__init__()
+        self.unknown = []
+
+
+def get_dtype(packet_class):
+    """
+    numpy structured dtype mirroring the layout of a fixed layout packet class, None for variable layouts
+    """
+    steps = packet_class._meta.codec.steps
+    if numpy is None or len(steps) != 1 or not isinstance(steps[0], StructStep):
+        return None
+    step = steps[0]
+    names, formats, offsets = [], [], []
+    offset = 0
+    fields = iter(step.names)
+    for struct_format in step.formats:
+        if struct_format != ID_FORMAT:
+            name = next(fields)
+            names.append(name)
+            if name == MAGIC_NAME:
+                formats.append("S{}".format(len(MAGIC)))
+            else:
+                formats.append(STRUCT_DTYPES[struct_format])
+            offsets.append(offset)
+        offset += calcsize(str("!" + struct_format))
+    return numpy.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": offset})
+
+
+def _decode_vectorized(packet_class, dtype, buffers, group):
+    size = dtype.itemsize
+    rows = [index for index in group if len(buffers[index]) == size]
+    rejected = [index for index in group if len(buffers[index]) != size]
+
+    array = numpy.frombuffer(b"".join(buffers[index] for index in rows), dtype=dtype)
+    indexes = numpy.array(rows, dtype=numpy.intp)
+    if MAGIC_NAME in dtype.names:
+        valid = array[MAGIC_NAME] == MAGIC
+        if not valid.all():
+            rejected.extend(indexes[~valid].tolist())
+            array, indexes = array[valid], indexes[valid]
+
+    columns = {}
+    for name in dtype.names:
+        if name != MAGIC_NAME:
+            column = array[name]
+            columns[name] = numpy.ascontiguousarray(column, dtype=column.dtype.newbyteorder("="))
+    return PacketBatch(packet_class, indexes, columns, sorted(rejected))
+
+
+def _decode_rows(packet_class, buffers, group):
+    names = list(packet_class._meta.fields)
+    columns = dict((name, []) for name in names)
+    indexes, rejected = [], []
+    for index in group:
+        try:
+            packet = packet_class(buffers[index])
+        except DECODE_ERRORS:
+            rejected.append(index)
+            continue
+        indexes.append(index)
+        for name in names:
+            columns[name].append(getattr(packet, name))
+    return PacketBatch(packet_class, indexes, columns, rejected)
+
+
+def decode_batch(buffers, use_numpy=None):
+    """
+    Group packets by id and decode each group in a single pass.
+
+    Fixed layout packets (like UnconnectedPing) are decoded with one numpy.frombuffer call per class when numpy is
+    installed (use_numpy=None) or required (use_numpy=True); other packets are decoded one by one into lists.
+    """
+    if use_numpy and numpy is None:
+        raise ImportError("numpy is required")
+    if use_numpy is None:
+        use_numpy = numpy is not None
+
+    if not isinstance(buffers, (list, tuple)):
+        buffers = list(buffers)
+
+    result = DecodedBatch()
+    groups = {}
+    for index, data in enumerate(buffers):
+        if not len(data):
+            result.unknown.append(index)
+            continue
+        groups.setdefault(byte_at(data, 0), []).append(index)
+
+    for packet_id, group in groups.items():
+        packet_class = registry.get(packet_id)
+        if packet_class is None:
+            result.unknown.extend(group)
+            continue
+        dtype = get_dtype(packet_class) if use_numpy else None
+        if dtype is not None:
+            result[packet_class] = _decode_vectorized(packet_class, dtype, buffers, group)
+        else:
+            result[packet_class] = _decode_rows(packet_class, buffers, group)
+    result.unknown.sort()
+    return result
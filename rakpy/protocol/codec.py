@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from struct import Struct
+
+from rakpy.io import EndOfStreamException, byte_at, write_struct
+from rakpy.protocol.const import MAGIC
+
+MAGIC_NAME = "__magic__"
+MAGIC_FORMAT = "{}s".format(len(MAGIC))
+# the packet id is checked before unpacking, the struct only skips it
+ID_FORMAT = "x"
+_ID_STRUCT = Struct(str("!B"))
+
+
+class StructStep(object):
+    """
+    Run of consecutive fixed-width fields, decoded with a single unpack call.
+
+    Encoding checks every value against the range of its field (get_min_value/get_max_value of numeric fields), like
+    Field.encode does, and rejects unset (None) values, naming the field.
+    """
+    def __init__(self, names, formats, fields=None):
+        self.struct = Struct(str("!" + "".join(formats)))
+        self.formats = tuple(formats)
+        self.names = tuple(names)
+        self.magic_indexes = tuple(index for index, name in enumerate(names) if name == MAGIC_NAME)
+        self.targets = tuple((index, name) for index, name in enumerate(names) if name != MAGIC_NAME)
+        self.size = self.struct.size
+        # (index, name, min value, max value) of the fields to check before packing
+        fields = fields or [None] * len(names)
+        self.checks = tuple((index, name) + _bounds(field) for index, (name, field) in enumerate(zip(names, fields))
+                            if name != MAGIC_NAME)
+
+    def decode_from(self, packet, buffer, offset):
+        end = offset + self.size
+        if end > len(buffer):
+            raise EndOfStreamException()
+        values = self.struct.unpack_from(buffer, offset)
+        for index in self.magic_indexes:
+            if values[index] != MAGIC:
+                raise ValueError()
+        for index, name in self.targets:
+            setattr(packet, name, values[index])
+        return end
+
+    def encoded_size(self, packet):
+        return self.size
+
+    def encode_into(self, packet, buffer, offset):
+        values = [MAGIC if name == MAGIC_NAME else getattr(packet, name) for name in self.names]
+        for index, name, min_value, max_value in self.checks:
+            value = values[index]
+            if value is None:
+                raise TypeError("{} is not set".format(name))
+            if min_value is not None and (value < min_value or value > max_value):
+                raise OverflowError("{}={} out of range".format(name, value))
+        return write_struct(buffer, offset, self.struct, *values)
+
+
+def _bounds(field):
+    if field is None or not hasattr(field, "get_min_value"):
+        return None, None
+    return field.get_min_value(), field.get_max_value()
+
+
+class FieldStep(object):
+    """
+    Variable-length field, decoded by the field itself
+    """
+    def __init__(self, name, field):
+        self.name = name
+        self.field = field
+
+    def decode_from(self, packet, buffer, offset):
+        value, offset = self.field.decode_from(buffer, offset)
+        setattr(packet, self.name, value)
+        return offset
+
+    def encoded_size(self, packet):
+        return self.field.encoded_size(getattr(packet, self.name))
+
+    def encode_into(self, packet, buffer, offset):
+        return self.field.encode_into(getattr(packet, self.name), buffer, offset)
+
+
+class PacketCodec(object):
+    """
+    Encoding/decoding plan compiled once per packet class from Meta.structure.
+
+    Consecutive fixed-width fields (including the packet id and MAGIC) are merged into a single struct.Struct,
+    variable-length fields fall back to their own decode/encode methods.
+    """
+    def __init__(self, meta):
+        self.id = meta.id
+        self.steps = []
+
+        names, formats, fields = [], [ID_FORMAT], []
+        for name in meta.structure:
+            if name == MAGIC_NAME:
+                struct_format = MAGIC_FORMAT
+            else:
+                struct_format = meta.fields[name].STRUCT_FORMAT
+            if struct_format is None:
+                if formats:
+                    self.steps.append(StructStep(names, formats, fields))
+                    names, formats, fields = [], [], []
+                self.steps.append(FieldStep(name, meta.fields[name]))
+            else:
+                names.append(name)
+                formats.append(struct_format)
+                fields.append(meta.fields.get(name))
+        if formats:
+            self.steps.append(StructStep(names, formats, fields))
+
+        self.fixed_size = sum(step.size for step in self.steps if isinstance(step, StructStep))
+        self.field_steps = tuple(step for step in self.steps if isinstance(step, FieldStep))
+
+    def decode_from(self, packet, buffer, offset):
+        if offset >= len(buffer):
+            raise EndOfStreamException()
+        if byte_at(buffer, offset) != self.id:
+            raise ValueError()
+        for step in self.steps:
+            offset = step.decode_from(packet, buffer, offset)
+        return offset
+
+    def encoded_size(self, packet):
+        size = self.fixed_size
+        for step in self.field_steps:
+            size += step.encoded_size(packet)
+        return size
+
+    def encode_into(self, packet, buffer, offset):
+        start = offset
+        for step in self.steps:
+            offset = step.encode_into(packet, buffer, offset)
+        # not buffer[start] = self.id: Python 2 memoryviews only take str items
+        _ID_STRUCT.pack_into(buffer, start, self.id)
+        return offset
+
+    def encode(self, packet):
+        buffer = bytearray(self.encoded_size(packet))
+        self.encode_into(packet, buffer, 0)
+        return buffer
+
+
+class LazyLayout(object):
+    """
+    Offsets of the fields of a packet class, for lazy decoding.
+
+    Fields preceded only by fixed length fields (including the packet id and MAGIC) get a static offset, the others
+    are located by decoding the fields before them the first time one of them is accessed.
+    """
+    def __init__(self, meta):
+        self.names = []
+        self.fields = []
+        self.indexes = {}
+        # offsets[i] is the static offset of field i (None if unknown), offsets[-1] the length of the packet
+        self.offsets = []
+        # skips[i] is the number of MAGIC bytes right before field i (skips[-1]: at the end of the packet)
+        self.skips = [0]
+        self.magic_offsets = []
+        magic_count = 0
+        offset = 1
+        for name in meta.structure:
+            if name == MAGIC_NAME:
+                magic_count += 1
+                self.skips[-1] += len(MAGIC)
+                if offset is not None:
+                    self.magic_offsets.append(offset)
+                    offset += len(MAGIC)
+                continue
+            field = meta.fields[name]
+            self.indexes[name] = len(self.names)
+            self.names.append(name)
+            self.fields.append(field)
+            self.offsets.append(offset)
+            self.skips.append(0)
+            if offset is not None:
+                offset = None if field.LENGTH is None else offset + field.LENGTH
+        self.offsets.append(offset)
+        # total length when every field has a fixed length
+        self.size = offset
+        # every MAGIC can be checked up front only if their offsets are all static
+        self.check_magic = len(self.magic_offsets) == magic_count
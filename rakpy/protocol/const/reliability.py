@@ -51,3 +51,7 @@ def is_reliable(reliability):
 
 def is_ordered(reliability):
     return reliability not in (UNRELIABLE, RELIABLE) and reliability <= RELIABLE_SEQUENCED
+
+
+def is_sequenced(reliability):
+    return reliability in (UNRELIABLE_SEQUENCED, RELIABLE_SEQUENCED)
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from struct import Struct
+
+from rakpy.io import ByteReader, write_bytes, write_struct
+from rakpy.protocol.const.reliability import UNRELIABLE, is_reliable, is_ordered, is_sequenced
+
+# DatagramHeaderFormat bits
+FLAG_VALID = 0x80
+FLAG_ACK = 0x40
+FLAG_NAK = 0x20
+FLAG_PACKET_PAIR = 0x10
+FLAG_CONTINUOUS_SEND = 0x08
+FLAG_NEEDS_B_AND_AS = 0x04
+
+# data datagrams are valid, and neither ACK, NAK nor packet pair
+MIN_ID = 0x80
+MAX_ID = 0x8f
+
+DEFAULT_FLAGS = FLAG_VALID | FLAG_NEEDS_B_AND_AS
+
+# flags(1) + sequence number(3)
+HEADER_LENGTH = 4
+# flags(1) + bit length(2) + reliable index(3) + sequence index(3) + order index and channel(4) + split header(10)
+MAX_FRAME_HEADER_LENGTH = 23
+
+_HEADER_STRUCT = Struct(str("<BHB"))
+_FRAME_STRUCT = Struct(str("!BH"))
+_TRIAD_LE_STRUCT = Struct(str("<HB"))
+_ORDER_STRUCT = Struct(str("<HBB"))
+_SPLIT_STRUCT = Struct(str("!IHI"))
+
+
+def is_datagram(packet_id):
+    return MIN_ID <= packet_id <= MAX_ID
+
+
+class Frame(object):
+    """
+    Encapsulated message of a datagram.
+
+    When decoded, payload is a memoryview over the datagram buffer: copy it (bytes(frame.payload)) if the message
+    needs to outlive the buffer.
+    """
+    __slots__ = ("reliability", "reliable_index", "sequence_index", "order_index", "order_channel",
+                 "split_count", "split_id", "split_index", "payload")
+
+    def __init__(self, payload=b"", reliability=UNRELIABLE, reliable_index=None, sequence_index=None,
+                 order_index=None, order_channel=None, split_count=0, split_id=None, split_index=None):
+        self.payload = payload
+        self.reliability = reliability
+        self.reliable_index = reliable_index
+        self.sequence_index = sequence_index
+        self.order_index = order_index
+        self.order_channel = order_channel
+        self.split_count = split_count
+        self.split_id = split_id
+        self.split_index = split_index
+
+    @property
+    def has_split(self):
+        return self.split_count > 0
+
+    @classmethod
+    def read(cls, reader):
+        frame = cls.__new__(cls)
+        flags, length = reader.unpack(_FRAME_STRUCT)
+        reliability = flags >> 5
+        frame.reliability = reliability
+        frame.reliable_index = reader.read_triad_le() if is_reliable(reliability) else None
+        frame.sequence_index = reader.read_triad_le() if is_sequenced(reliability) else None
+        if is_ordered(reliability):
+            low, high, frame.order_channel = reader.unpack(_ORDER_STRUCT)
+            frame.order_index = (high << 16) | low
+        else:
+            frame.order_index = frame.order_channel = None
+        if flags & 0x10:
+            frame.split_count, frame.split_id, frame.split_index = reader.unpack(_SPLIT_STRUCT)
+        else:
+            frame.split_count, frame.split_id, frame.split_index = 0, None, None
+        # length is given in bits
+        frame.payload = reader.read_view((length + 7) >> 3)
+        return frame
+
+    def encoded_size(self):
+        size = _FRAME_STRUCT.size + len(self.payload)
+        reliability = self.reliability
+        if is_reliable(reliability):
+            size += _TRIAD_LE_STRUCT.size
+        if is_sequenced(reliability):
+            size += _TRIAD_LE_STRUCT.size
+        if is_ordered(reliability):
+            size += _ORDER_STRUCT.size
+        if self.split_count:
+            size += _SPLIT_STRUCT.size
+        return size
+
+    def encode_into(self, buffer, offset):
+        reliability = self.reliability
+        flags = reliability << 5
+        if self.split_count:
+            flags |= 0x10
+        offset = write_struct(buffer, offset, _FRAME_STRUCT, flags, len(self.payload) << 3)
+        if is_reliable(reliability):
+            index = self.reliable_index
+            offset = write_struct(buffer, offset, _TRIAD_LE_STRUCT, index & 0xffff, index >> 16)
+        if is_sequenced(reliability):
+            index = self.sequence_index
+            offset = write_struct(buffer, offset, _TRIAD_LE_STRUCT, index & 0xffff, index >> 16)
+        if is_ordered(reliability):
+            index = self.order_index
+            offset = write_struct(buffer, offset, _ORDER_STRUCT, index & 0xffff, index >> 16, self.order_channel)
+        if self.split_count:
+            offset = write_struct(buffer, offset, _SPLIT_STRUCT, self.split_count, self.split_id, self.split_index)
+        return write_bytes(buffer, offset, self.payload)
+
+    def __repr__(self):
+        values = ("=".join([name, str(getattr(self, name))]) for name in self.__slots__ if name != "payload")
+        return "Frame({}, payload_length={})".format(", ".join(values), len(self.payload))
+
+
+class Datagram(object):
+    """
+    Data datagram (0x80-0x8f): sequence number followed by encapsulated frames
+    """
+    __slots__ = ("flags", "sequence_number", "frames")
+
+    def __init__(self, sequence_number=0, frames=None, flags=DEFAULT_FLAGS):
+        self.flags = flags
+        self.sequence_number = sequence_number
+        self.frames = [] if frames is None else frames
+
+    @classmethod
+    def decode_from(cls, buffer, offset=0, end=None):
+        """
+        Decode a datagram from buffer[offset:end], return (datagram, new offset)
+        """
+        reader = ByteReader(buffer, offset, end)
+        flags, low, high = reader.unpack(_HEADER_STRUCT)
+        if not is_datagram(flags):
+            raise ValueError(hex(flags))
+        datagram = cls.__new__(cls)
+        datagram.flags = flags
+        datagram.sequence_number = (high << 16) | low
+        frames = datagram.frames = []
+        while reader.offset < reader.end:
+            frames.append(Frame.read(reader))
+        return datagram, reader.offset
+
+    @classmethod
+    def decode(cls, data):
+        return cls.decode_from(memoryview(data))[0]
+
+    def encoded_size(self):
+        return HEADER_LENGTH + sum(frame.encoded_size() for frame in self.frames)
+
+    def encode_into(self, buffer, offset=0):
+        sequence_number = self.sequence_number
+        offset = write_struct(buffer, offset, _HEADER_STRUCT, self.flags, sequence_number & 0xffff,
+                              sequence_number >> 16)
+        for frame in self.frames:
+            offset = frame.encode_into(buffer, offset)
+        return offset
+
+    def encode(self):
+        buffer = bytearray(self.encoded_size())
+        self.encode_into(buffer)
+        return buffer
+
+    def __repr__(self):
+        return "Datagram(sequence_number={}, frames={})".format(self.sequence_number, self.frames)
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+from rakpy.io import EndOfStreamException
+
 
 class UnknownPacketException(Exception):
     pass
@@ -8,3 +10,7 @@ class UnknownPacketException(Exception):
 
 class RemainingDataException(Exception):
     pass
+
+
+# everything decoding an untrusted datagram may raise
+DECODE_ERRORS = (ValueError, EndOfStreamException, RemainingDataException, UnknownPacketException)
@@ -1,22 +1,83 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
-from struct import pack, unpack
+from struct import Struct, pack, unpack_from, pack_into
 from collections import namedtuple
 
 import datetime
+import socket
 import six
 
-from rakpy.io import convert_to_stream, EndOfStreamException
+from rakpy.io import EndOfStreamException, byte_at, decode_from_stream, read_struct, write_bytes, write_struct
 
-Address = namedtuple("Address", "ip port version")
-Address.__new__.__defaults__ = (None, None, 4)
+Address = namedtuple("Address", "ip port version flowinfo scope_id")
+Address.__new__.__defaults__ = (None, None, 4, 0, 0)
 
 Range = namedtuple("Range", "min_index max_index")
 
 
+class CompactAddress(int):
+    """
+    IPv4 address and port packed in a single int, (ip << 16) | port: hashing and comparing are plain int operations,
+    which makes it a cheap dict key. The dotted ip string is only built when asked for (ip, str()).
+    """
+    __slots__ = ()
+    version = 4
+
+    def __new__(cls, ip, port):
+        if not isinstance(ip, six.integer_types):
+            ip = _IPV4_STRUCT.unpack(socket.inet_aton(ip))[0]
+        if not 0 <= ip <= 0xffffffff or not 0 <= port <= 0xffff:
+            raise ValueError((ip, port))
+        return super(CompactAddress, cls).__new__(cls, (ip << 16) | port)
+
+    @classmethod
+    def from_address(cls, address):
+        return cls(address.ip, address.port)
+
+    @property
+    def ip_int(self):
+        return int(self) >> 16
+
+    @property
+    def port(self):
+        return int(self) & 0xffff
+
+    @property
+    def ip(self):
+        return socket.inet_ntoa(_IPV4_STRUCT.pack(int(self) >> 16))
+
+    def to_address(self):
+        return Address(ip=self.ip, port=self.port, version=4)
+
+    def __str__(self):
+        return "{}:{}".format(self.ip, self.port)
+
+    def __repr__(self):
+        return "CompactAddress(ip={!r}, port={})".format(self.ip, self.port)
+
+    def __reduce__(self):
+        return CompactAddress, (self.ip_int, self.port)
+
+
+# version, 4 octets, port
+_IPV4_ADDRESS_STRUCT = Struct(str("!B4sH"))
+_COMPACT_ADDRESS_STRUCT = Struct(str("!BIH"))
+# version, sockaddr_in6: family (little endian, as RakNet writes it), port, flowinfo, address, scope id
+_IPV6_ADDRESS_STRUCT = Struct(str("!B2sHI16sI"))
+# AF_INET6 family as RakNet writes it (Windows value, little endian)
+_AF_INET6_FAMILY = b"\x17\x00"
+_IPV4_STRUCT = Struct(str("!I"))
+# min_equals_max flag followed by one or two big endian triads (written as high byte + low short)
+_SINGLE_RANGE_STRUCT = Struct(str("!?BH"))
+_RANGE_STRUCT = Struct(str("!?BHBH"))
+_TRIAD_STRUCT = Struct(str("!BH"))
+
+
 class Field(object):
     LENGTH = None
+    # struct format character(s) for fixed-width fields, None for variable-length ones
+    STRUCT_FORMAT = None
 
     def __init__(self, **options):
         self._options = options
@@ -24,13 +85,47 @@ class Field(object):
     def contribute_to_class(self, cls, name):
         cls._meta.add_field(self, name)
 
+    @classmethod
+    def decode_from(cls, buffer, offset):
+        """
+        Read a value from buffer (any bytes-like object) at offset, return (value, new offset)
+        """
+        raise NotImplementedError()
+
+    @classmethod
+    def skip(cls, buffer, offset):
+        """
+        Return the offset right after the value at offset, without building it when the field can avoid it
+        """
+        return cls.decode_from(buffer, offset)[1]
+
     @classmethod
     def decode(cls, data):
+        return decode_from_stream(cls.decode_from, data)
+
+    @classmethod
+    def encoded_size(cls, value):
+        if cls.LENGTH is None:
+            raise NotImplementedError()
+        return cls.LENGTH
+
+    @classmethod
+    def encode_into(cls, value, buffer, offset):
+        """
+        Write value into buffer (bytearray or writable memoryview) at offset, return the new offset
+        """
         raise NotImplementedError()
 
     @classmethod
     def encode(cls, value):
-        raise NotImplementedError()
+        return _encode(cls, value)
+
+
+def _encode(field, value):
+    # field is a Field class, or an instance when its encoding depends on options
+    buffer = bytearray(field.encoded_size(value))
+    field.encode_into(value, buffer, 0)
+    return bytes(buffer)
 
 
 class NumericField(Field):
@@ -46,9 +141,11 @@ class NumericField(Field):
         raise NotImplementedError()
 
     @classmethod
-    @convert_to_stream("data")
-    def decode(cls, data):
-        return unpack(cls.PACK_FORMAT, data.read(cls.LENGTH))[0]
+    def decode_from(cls, buffer, offset):
+        end = offset + cls.LENGTH
+        if end > len(buffer):
+            raise EndOfStreamException()
+        return unpack_from(cls.PACK_FORMAT, buffer, offset)[0], end
 
     @classmethod
     def encode(cls, value):
@@ -56,6 +153,16 @@ class NumericField(Field):
             raise OverflowError()
         return pack(cls.PACK_FORMAT, value)
 
+    @classmethod
+    def encode_into(cls, value, buffer, offset):
+        if value < cls.get_min_value() or value > cls.get_max_value():
+            raise OverflowError()
+        end = offset + cls.LENGTH
+        if end > len(buffer):
+            raise EndOfStreamException()
+        pack_into(cls.PACK_FORMAT, buffer, offset, value)
+        return end
+
 
 class SignedNumericField(NumericField):
 
@@ -82,11 +189,13 @@ class UnsignedNumericField(NumericField):
 class ByteField(SignedNumericField):
     LENGTH = 1
     PACK_FORMAT = "!b"
+    STRUCT_FORMAT = "b"
 
 
 class UnsignedByteField(UnsignedNumericField):
     LENGTH = 1
     PACK_FORMAT = "!B"
+    STRUCT_FORMAT = "B"
 
 
 class TriadField(UnsignedNumericField):
@@ -94,38 +203,53 @@ class TriadField(UnsignedNumericField):
     PACK_FORMAT = "!I"
 
     @classmethod
-    @convert_to_stream("data")
-    def decode(cls, data):
-        return unpack(cls.PACK_FORMAT, b"\x00" + data.read(cls.LENGTH))[0]
+    def decode_from(cls, buffer, offset):
+        (high, low), offset = read_struct(buffer, offset, _TRIAD_STRUCT)
+        return (high << 16) | low, offset
 
     @classmethod
     def encode(cls, value):
         return super(TriadField, cls).encode(value)[1:]
 
+    @classmethod
+    def encode_into(cls, value, buffer, offset):
+        if value < cls.get_min_value() or value > cls.get_max_value():
+            raise OverflowError()
+        end = offset + cls.LENGTH
+        if end > len(buffer):
+            raise EndOfStreamException()
+        _TRIAD_STRUCT.pack_into(buffer, offset, value >> 16, value & 0xffff)
+        return end
+
 
 class UnsignedShortField(UnsignedNumericField):
     LENGTH = 2
     PACK_FORMAT = "!H"
+    STRUCT_FORMAT = "H"
 
 
 class IntField(SignedNumericField):
     LENGTH = 4
     PACK_FORMAT = "!i"
+    STRUCT_FORMAT = "i"
 
 
 class LongLongField(SignedNumericField):
     LENGTH = 8
     PACK_FORMAT = "!q"
+    STRUCT_FORMAT = "q"
 
 
 class UnsignedLongLongField(UnsignedNumericField):
     LENGTH = 8
     PACK_FORMAT = "!Q"
+    STRUCT_FORMAT = "Q"
 
 
 class FloatField(NumericField):
     LENGTH = 4
     PACK_FORMAT = "!f"
+    STRUCT_FORMAT = "f"
 
     @classmethod
     def get_min_value(cls):
@@ -140,147 +264,250 @@ class FloatField(NumericField):
         return super(FloatField, cls).encode(float(value))
 
     @classmethod
-    def decode(cls, data):
-        return float(super(FloatField, cls).decode(data))
+    def encode_into(cls, value, buffer, offset):
+        return super(FloatField, cls).encode_into(float(value), buffer, offset)
+
+    @classmethod
+    def decode_from(cls, buffer, offset):
+        value, offset = super(FloatField, cls).decode_from(buffer, offset)
+        return float(value), offset
 
 
 class DoubleField(FloatField):
     LENGTH = 8
     PACK_FORMAT = "!d"
+    STRUCT_FORMAT = "d"
 
 
 class BoolField(Field):
     LENGTH = 1
+    STRUCT_FORMAT = "?"
 
     @classmethod
-    def decode(cls, data):
-        return bool(ByteField.decode(data))
+    def decode_from(cls, buffer, offset):
+        value, offset = ByteField.decode_from(buffer, offset)
+        return bool(value), offset
 
     @classmethod
     def encode(cls, value):
         return ByteField.encode(bool(value))
 
+    @classmethod
+    def encode_into(cls, value, buffer, offset):
+        return ByteField.encode_into(bool(value), buffer, offset)
+
 
 class StringField(Field):
 
-    @convert_to_stream("data")
-    def decode(self, data):
+    def decode_from(self, buffer, offset):
         try:
-            length = UnsignedShortField.decode(data)
+            length, offset = UnsignedShortField.decode_from(buffer, offset)
         except EndOfStreamException:
             if self._options.get("required", True):
                 raise
-            return None
-        return data.read(length).decode("utf-8")
+            return None, offset
+        end = offset + length
+        if end > len(buffer):
+            raise EndOfStreamException()
+        return bytearray(buffer[offset:end]).decode("utf-8"), end
 
-    @classmethod
-    def encode(cls, value):
+    def decode(self, data):
+        return decode_from_stream(self.decode_from, data)
+
+    def encode(self, value):
+        if value is None and not self._options.get("required", True):
+            return b""
         value = value.encode("utf-8")
         return UnsignedShortField.encode(len(value)) + value
 
+    def encoded_size(self, value):
+        if value is None and not self._options.get("required", True):
+            return 0
+        return UnsignedShortField.LENGTH + len(value.encode("utf-8"))
+
+    def encode_into(self, value, buffer, offset):
+        if value is None and not self._options.get("required", True):
+            return offset
+        value = value.encode("utf-8")
+        offset = UnsignedShortField.encode_into(len(value), buffer, offset)
+        return write_bytes(buffer, offset, value)
+
 
 class OptionsField(Field):
     LENGTH = 1
 
     @classmethod
-    @convert_to_stream("data")
-    def decode(cls, data):
-        bits = ord(data.read(1))
+    def decode_from(cls, buffer, offset):
+        bits, offset = UnsignedByteField.decode_from(buffer, offset)
         return {
             "reliability": (bits & 0b11100000) >> 5,
             "has_split": bool(bits & 0b00010000)
-        }
+        }, offset
 
     @classmethod
-    def encode(cls, options):
+    def _to_bits(cls, options):
         data = 0b00000000
         if options.get("has_split", False):
             data |= 0b00010000
         reliability = options.get("reliability", 0x00) << 5
         data |= reliability
-        return six.int2byte(data)
+        return data
+
+    @classmethod
+    def encode(cls, options):
+        return six.int2byte(cls._to_bits(options))
+
+    @classmethod
+    def encode_into(cls, options, buffer, offset):
+        return UnsignedByteField.encode_into(cls._to_bits(options), buffer, offset)
 
 
 class AddressField(Field):
-    LENGTH = (1 + 4) * UnsignedByteField.LENGTH + 2 * UnsignedShortField.LENGTH
+    """
+    Version byte followed by an IPv4 address (4 octets, port) or a sockaddr_in6 (family, port, flowinfo, 16 bytes
+    address, scope id)
+    """
+    LENGTH = None
+    IPV4_LENGTH = _IPV4_ADDRESS_STRUCT.size
+    IPV6_LENGTH = _IPV6_ADDRESS_STRUCT.size
 
     @classmethod
-    @convert_to_stream("data")
-    def decode(cls, data):
-        # version
-        version = UnsignedByteField.decode(data)
-        # ip
-        ip = []
-        for part in range(4):
-            ip.append(UnsignedByteField.decode(data))
-        ip = ".".join(str(part) for part in ip)
-        # port
-        port = UnsignedShortField.decode(data)
-        return Address(version=version, ip=ip, port=port)
-
-    @classmethod
-    def encode(cls, address):
-        # version
-        data = UnsignedByteField.encode(address.version)
-        # ip
-        for part in address.ip.split("."):
-            data += UnsignedByteField.encode(int(part))
-        # port
-        data += UnsignedShortField.encode(address.port)
-        return data
+    def decode_from(cls, buffer, offset):
+        if offset >= len(buffer):
+            raise EndOfStreamException()
+        version = byte_at(buffer, offset)
+        if version == 4:
+            (_, packed, port), offset = read_struct(buffer, offset, _IPV4_ADDRESS_STRUCT)
+            return Address(ip=socket.inet_ntoa(packed), port=port, version=4), offset
+        if version == 6:
+            (_, _, port, flowinfo, packed, scope_id), offset = read_struct(buffer, offset, _IPV6_ADDRESS_STRUCT)
+            return Address(ip=socket.inet_ntop(socket.AF_INET6, packed), port=port, version=6, flowinfo=flowinfo,
+                           scope_id=scope_id), offset
+        raise ValueError(version)
+
+    @classmethod
+    def skip(cls, buffer, offset):
+        if offset >= len(buffer):
+            raise EndOfStreamException()
+        end = offset + (cls.IPV6_LENGTH if byte_at(buffer, offset) == 6 else cls.IPV4_LENGTH)
+        if end > len(buffer):
+            raise EndOfStreamException()
+        return end
+
+    @classmethod
+    def encoded_size(cls, address):
+        return cls.IPV6_LENGTH if address.version == 6 else cls.IPV4_LENGTH
+
+    @classmethod
+    def encode_into(cls, address, buffer, offset):
+        if isinstance(address, CompactAddress):
+            return write_struct(buffer, offset, _COMPACT_ADDRESS_STRUCT, 4, address >> 16, address & 0xffff)
+        try:
+            if address.version == 6:
+                return write_struct(buffer, offset, _IPV6_ADDRESS_STRUCT, 6, _AF_INET6_FAMILY, address.port,
+                                    address.flowinfo or 0, socket.inet_pton(socket.AF_INET6, address.ip),
+                                    address.scope_id or 0)
+            packed = socket.inet_aton(address.ip)
+        except (socket.error, TypeError, AttributeError):
+            raise ValueError(address)
+        if address.version != 4 or len(packed) != 4 or address.ip.count(".") != 3:
+            raise ValueError(address)
+        return write_struct(buffer, offset, _IPV4_ADDRESS_STRUCT, 4, packed, address.port)
+
+
+class CompactAddressField(AddressField):
+    """
+    AddressField decoding to CompactAddress (IPv4 only)
+    """
+    LENGTH = _COMPACT_ADDRESS_STRUCT.size
+
+    @classmethod
+    def decode_from(cls, buffer, offset):
+        (version, ip, port), offset = read_struct(buffer, offset, _COMPACT_ADDRESS_STRUCT)
+        if version != 4:
+            raise ValueError(version)
+        return CompactAddress(ip, port), offset
 
 
 class RangeListField(Field):
 
     @classmethod
-    @convert_to_stream("data")
-    def decode(cls, data):
+    def decode_from(cls, buffer, offset):
         range_list = []
-        length = UnsignedShortField.decode(data)
+        length, offset = UnsignedShortField.decode_from(buffer, offset)
         for i in range(length):
-            min_equals_max = BoolField.decode(data)
-            min_index = TriadField.decode(data)
-            max_index = min_index if min_equals_max else max(TriadField.decode(data), min_index + 512)
+            (min_equals_max, high, low), offset = read_struct(buffer, offset, _SINGLE_RANGE_STRUCT)
+            min_index = (high << 16) | low
+            if min_equals_max:
+                max_index = min_index
+            else:
+                (high, low), offset = read_struct(buffer, offset, _TRIAD_STRUCT)
+                max_index = (high << 16) | low
             range_list.append(Range(min_index=min_index, max_index=max_index))
-        return range_list
+        return range_list, offset
 
     @classmethod
-    def encode(cls, range_list):
-        data = UnsignedShortField.encode(len(range_list))
+    def encoded_size(cls, range_list):
+        size = UnsignedShortField.LENGTH
         for range_ in range_list:
-            min_equals_max = range_.min_index == range_.max_index
-            data += BoolField.encode(min_equals_max)
-            data += TriadField.encode(range_.min_index)
-            if not min_equals_max:
-                data += TriadField.encode(range_.max_index)
-        return data
+            if range_.min_index == range_.max_index:
+                size += BoolField.LENGTH + TriadField.LENGTH
+            else:
+                size += BoolField.LENGTH + 2 * TriadField.LENGTH
+        return size
+
+    @classmethod
+    def encode_into(cls, range_list, buffer, offset):
+        offset = UnsignedShortField.encode_into(len(range_list), buffer, offset)
+        for min_index, max_index in range_list:
+            if min_index == max_index:
+                offset = write_struct(buffer, offset, _SINGLE_RANGE_STRUCT, True, min_index >> 16, min_index & 0xffff)
+            else:
+                offset = write_struct(buffer, offset, _RANGE_STRUCT, False, min_index >> 16, min_index & 0xffff,
+                                      max_index >> 16, max_index & 0xffff)
+        return offset
 
 
 class PaddingField(Field):
 
-    @convert_to_stream("data")
+    def decode_from(self, buffer, offset):
+        return len(buffer) - offset + self._options.get('offset', 0), len(buffer)
+
     def decode(self, data):
-        offset = self._options.get('offset', 0)
-        return len(data.readall()) + offset
+        return decode_from_stream(self.decode_from, data)
 
     def encode(self, value):
-        offset = self._options.get('offset', 0)
-        return max(0, value - offset) * b"\x00"
+        return _encode(self, value)
+
+    def encoded_size(self, value):
+        return max(0, value - self._options.get('offset', 0))
+
+    def encode_into(self, value, buffer, offset):
+        size = self.encoded_size(value)
+        end = offset + size
+        if end > len(buffer):
+            raise EndOfStreamException()
+        # pad bytes are written as zeros, without allocating them first
+        pack_into(str("{}x".format(size)), buffer, offset)
+        return end
 
 
 class DateTimeField(Field):
     """
     Converts μs to datetime.datetime
     """
+    LENGTH = UnsignedLongLongField.LENGTH
+
     @classmethod
-    @convert_to_stream("data")
-    def decode(cls, data):
-        micro_seconds = UnsignedLongLongField.decode(data)
-        return datetime.datetime.fromtimestamp(0) + datetime.timedelta(microseconds=micro_seconds)
+    def decode_from(cls, buffer, offset):
+        micro_seconds, offset = UnsignedLongLongField.decode_from(buffer, offset)
+        return datetime.datetime.fromtimestamp(0) + datetime.timedelta(microseconds=micro_seconds), offset
 
-    def encode(self, value):
+    @classmethod
+    def encode_into(cls, value, buffer, offset):
         delta = value - datetime.datetime.fromtimestamp(0)
-        return UnsignedLongLongField.encode(delta.total_seconds() * 1000000)
+        micro_seconds = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+        return UnsignedLongLongField.encode_into(micro_seconds, buffer, offset)
 
 
 class TimestampField(UnsignedLongLongField):
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from rakpy.io import byte_at
+from rakpy.protocol import packets
+from rakpy.protocol.const import MAGIC
+from rakpy.protocol.fields import AddressField
+
+# Ethernet MTU: OpenConnectionRequest1 is padded up to the MTU probed by the client
+MAX_OFFLINE_LENGTH = 1500
+
+DROP_REASONS = ("unknown_id", "too_short", "too_long", "bad_magic")
+
+
+def _rule(packet_class, min_length=None, max_length=None):
+    # (MAGIC offset, min length, max length), fixed length packets default to their size
+    layout = packet_class._meta.lazy
+    return (layout.magic_offsets[0], min_length or layout.size, max_length or layout.size)
+
+
+# packet id -> (MAGIC offset, min length, max length) of the offline messages
+OFFLINE_RULES = dict((packet_class._meta.id, rule) for packet_class, rule in (
+    (packets.UnconnectedPing, _rule(packets.UnconnectedPing)),
+    (packets.UnconnectedPingOpenConnections, _rule(packets.UnconnectedPingOpenConnections)),
+    # id, MAGIC, protocol, padding
+    (packets.OpenConnectionRequest1, _rule(packets.OpenConnectionRequest1, 1 + len(MAGIC) + 1, MAX_OFFLINE_LENGTH)),
+    # id, MAGIC, IPv4 or IPv6 address, mtu size, client guid
+    (packets.OpenConnectionRequest2, _rule(packets.OpenConnectionRequest2,
+                                           1 + len(MAGIC) + AddressField.IPV4_LENGTH + 2 + 8,
+                                           1 + len(MAGIC) + AddressField.IPV6_LENGTH + 2 + 8)),
+    # id, ping time, server guid, MAGIC, server name (length prefixed)
+    (packets.UnconnectedPong, _rule(packets.UnconnectedPong, 1 + 8 + 8 + len(MAGIC) + 2, MAX_OFFLINE_LENGTH)),
+))
+
+
+class OfflineFilter(object):
+    """
+    Cheap checks in front of decode_packet for the offline messages reaching a public port: known id, length bounds
+    and MAGIC (one slice compare). Junk is dropped without raising, and counted by reason (see DROP_REASONS).
+
+    Passing the filter does not mean the packet decodes (a string length may still be wrong), only that it is worth
+    decoding.
+    """
+    def __init__(self, ids=None):
+        if ids is None:
+            ids = OFFLINE_RULES
+        self._rules = dict((id, OFFLINE_RULES[id]) for id in ids if id in OFFLINE_RULES)
+        self.accepted = 0
+        self.unknown_id = 0
+        self.too_short = 0
+        self.too_long = 0
+        self.bad_magic = 0
+
+    def accept(self, data):
+        """
+        Return True if data looks like one of the filtered offline messages, count the drop reason otherwise
+        """
+        length = len(data)
+        if not length:
+            self.too_short += 1
+            return False
+        rule = self._rules.get(byte_at(data, 0))
+        if rule is None:
+            self.unknown_id += 1
+            return False
+        magic_offset, min_length, max_length = rule
+        if length < min_length:
+            self.too_short += 1
+            return False
+        if length > max_length:
+            self.too_long += 1
+            return False
+        if data[magic_offset:magic_offset + len(MAGIC)] != MAGIC:
+            self.bad_magic += 1
+            return False
+        self.accepted += 1
+        return True
+
+    @property
+    def dropped(self):
+        return self.unknown_id + self.too_short + self.too_long + self.bad_magic
+
+    def drops(self):
+        return dict((reason, getattr(self, reason)) for reason in DROP_REASONS)
+
+    def __repr__(self):
+        return "OfflineFilter(accepted={}, dropped={})".format(self.accepted, self.dropped)
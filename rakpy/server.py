@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import asyncio
+import functools
+import random
+from struct import Struct
+
+from rakpy.connection import clock
+from rakpy.io import BufferPool, byte_at
+from rakpy.protocol import Packet, packets
+from rakpy.protocol.const import id as ids
+from rakpy.protocol.datagram import FLAG_VALID
+from rakpy.protocol.exceptions import DECODE_ERRORS
+from rakpy.protocol.fields import Address, CompactAddress
+from rakpy.protocol.offline import OfflineFilter
+from rakpy.udp import create_batched_endpoint
+
+DEFAULT_PORT = 19132
+DEFAULT_MTU_SIZE = 1492
+MIN_MTU_SIZE = 400
+DEFAULT_MAX_CONNECTIONS = 20
+# seconds between OpenConnectionRequest1 and OpenConnectionRequest2
+HANDSHAKE_TIMEOUT = 5.0
+# seconds without datagram before a session is expired
+SESSION_TIMEOUT = 10.0
+# OpenConnectionRequest1 remembered while waiting for OpenConnectionRequest2
+MAX_PENDING_HANDSHAKES = 1024
+
+_PING_TIME_STRUCT = Struct(str("!Q"))
+
+
+def to_address(addr):
+    """
+    Convert a socket address tuple to a session key: a CompactAddress for IPv4, an Address for IPv6
+    """
+    if len(addr) == 2:
+        return CompactAddress(addr[0], addr[1])
+    return Address(ip=addr[0], port=addr[1], version=6, flowinfo=addr[2], scope_id=addr[3])
+
+
+class Session(object):
+    """
+    Client that completed the offline handshake (OpenConnectionRequest2)
+    """
+    def __init__(self, address, client_guid, mtu_size):
+        self.address = address
+        self.client_guid = client_guid
+        self.mtu_size = mtu_size
+        self.last_seen = clock()
+
+    def __repr__(self):
+        return "Session(address={}, client_guid={}, mtu_size={})".format(self.address, self.client_guid, self.mtu_size)
+
+
+class PongTemplate(object):
+    """
+    Preencoded UnconnectedPong: only the ping time changes from one reply to the next, it is patched in place.
+
+    The returned bytearray is reused by the next render() call, transports copy what they do not send right away.
+    """
+    PING_TIME_OFFSET = packets.UnconnectedPong._meta.lazy.offsets[0]
+
+    def __init__(self, server_guid, server_name):
+        self.server_guid = server_guid
+        self.server_name = server_name
+        self.data = packets.UnconnectedPong(ping_time=0, server_guid=server_guid, server_name=server_name).encode()
+
+    def render(self, ping_time):
+        _PING_TIME_STRUCT.pack_into(self.data, self.PING_TIME_OFFSET, ping_time)
+        return self.data
+
+
+class ServerProtocol(asyncio.DatagramProtocol):
+    """
+    Answers offline messages (pings and the open connection handshake) and keeps a session table keyed by client
+    address (CompactAddress for IPv4, Address for IPv6).
+
+    Every datagram is handled synchronously in datagram_received: no coroutine or Task is created per datagram.
+    Connected traffic (ids with the 0x80 bit: data datagrams, ACK and NAK) of known sessions is passed to
+    session_datagram_received, the rest is ignored. Offline messages go through an OfflineFilter first, junk is
+    counted in offline_filter and dropped without decoding.
+
+    Pongs are rendered from a PongTemplate, rebuilt when server_guid or server_name (the MOTD, with the player
+    count) is set. Handlers return a Packet or already encoded data, packets are encoded into buffers of pool.
+    UnconnectedPingOpenConnections is only answered while there are less than max_connections sessions.
+
+    A session is only created by an OpenConnectionRequest2 coming from an address that sent an
+    OpenConnectionRequest1 less than handshake_timeout seconds before (at most max_pending addresses are
+    remembered), so spoofed requests cannot fill the table. Sessions idle for session_timeout seconds are dropped by
+    expire(), which is also called when the table is full.
+    """
+    def __init__(self, server_guid=None, server_name="", max_mtu_size=DEFAULT_MTU_SIZE,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, handshake_timeout=HANDSHAKE_TIMEOUT,
+                 session_timeout=SESSION_TIMEOUT, max_pending=MAX_PENDING_HANDSHAKES):
+        self._pong = None
+        self.server_guid = random.getrandbits(63) if server_guid is None else server_guid
+        self.server_name = server_name
+        self.max_mtu_size = max_mtu_size
+        self.max_connections = max_connections
+        self.handshake_timeout = handshake_timeout
+        self.session_timeout = session_timeout
+        self.max_pending = max_pending
+        self.transport = None
+        self.sessions = {}
+        # address -> time of its last OpenConnectionRequest1
+        self._pending = {}
+        self.datagrams_received = 0
+        self.replies_sent = 0
+        self.decode_errors = 0
+        self._handlers = {
+            ids.ID_UNCONNECTED_PING: self.handle_unconnected_ping,
+            ids.ID_UNCONNECTED_PING_OPEN_CONNECTIONS: self.handle_unconnected_ping_open_connections,
+            ids.ID_OPEN_CONNECTION_REQUEST_1: self.handle_open_connection_request_1,
+            ids.ID_OPEN_CONNECTION_REQUEST_2: self.handle_open_connection_request_2,
+        }
+        self.offline_filter = OfflineFilter(self._handlers)
+        self.pool = BufferPool(buffer_size=max_mtu_size)
+
+    @property
+    def server_guid(self):
+        return self._server_guid
+
+    @server_guid.setter
+    def server_guid(self, server_guid):
+        self._server_guid = server_guid
+        self._pong = None
+
+    @property
+    def server_name(self):
+        return self._server_name
+
+    @server_name.setter
+    def server_name(self, server_name):
+        self._server_name = server_name
+        self._pong = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.transport = None
+
+    def datagram_received(self, data, addr):
+        if not data:
+            return
+        self.datagrams_received += 1
+        packet_id = byte_at(data, 0)
+        if packet_id & FLAG_VALID:
+            # connected mode: data datagrams, ACK and NAK
+            session = self.sessions.get(to_address(addr))
+            if session is not None:
+                session.last_seen = clock()
+                self.session_datagram_received(session, data)
+            return
+
+        if not self.offline_filter.accept(data):
+            return
+        handler = self._handlers[packet_id]
+        try:
+            packet = packets.registry[packet_id](data)
+        except DECODE_ERRORS:
+            self.decode_errors += 1
+            return
+        reply = handler(packet, addr)
+        if reply is None:
+            return
+        if isinstance(reply, Packet):
+            # replies fit in the MTU, transports copy what they do not send right away
+            pool = self.pool
+            buffer = pool.acquire()
+            try:
+                self.transport.sendto(memoryview(buffer)[:reply.encode_into(buffer)], addr)
+            finally:
+                pool.release(buffer)
+        else:
+            self.transport.sendto(reply, addr)
+        self.replies_sent += 1
+
+    def expire(self, now=None):
+        """
+        Drop idle sessions and stale handshakes, return the number of sessions dropped
+        """
+        if now is None:
+            now = clock()
+        pending = self._pending
+        for address in [address for address, time in pending.items() if now - time > self.handshake_timeout]:
+            del pending[address]
+        sessions = self.sessions
+        expired = [address for address, session in sessions.items() if now - session.last_seen > self.session_timeout]
+        for address in expired:
+            del sessions[address]
+        return len(expired)
+
+    def session_datagram_received(self, session, data):
+        """
+        Called with every connected mode datagram (data, ACK or NAK) received from a known session
+        """
+        pass
+
+    def handle_unconnected_ping(self, packet, addr):
+        pong = self._pong
+        if pong is None:
+            pong = self._pong = PongTemplate(self._server_guid, self._server_name)
+        return pong.render(packet.time)
+
+    def handle_unconnected_ping_open_connections(self, packet, addr):
+        if len(self.sessions) < self.max_connections:
+            return self.handle_unconnected_ping(packet, addr)
+
+    def handle_open_connection_request_1(self, packet, addr):
+        mtu_size = min(packet.mtu_size, self.max_mtu_size)
+        if mtu_size < MIN_MTU_SIZE:
+            return None
+        address = to_address(addr)
+        pending = self._pending
+        if address not in pending and len(pending) >= self.max_pending:
+            self.expire()
+            if len(pending) >= self.max_pending:
+                return None
+        pending[address] = clock()
+        return packets.OpenConnectionReply1(server_guid=self.server_guid, use_security=False, mtu_size=mtu_size)
+
+    def handle_open_connection_request_2(self, packet, addr):
+        mtu_size = min(packet.mtu_size, self.max_mtu_size)
+        if mtu_size < MIN_MTU_SIZE:
+            return None
+        address = to_address(addr)
+        sessions = self.sessions
+        session = sessions.get(address)
+        if session is None or session.client_guid != packet.client_guid:
+            requested = self._pending.pop(address, None)
+            if requested is None or clock() - requested > self.handshake_timeout:
+                return None
+            if session is None and len(sessions) >= self.max_connections:
+                self.expire()
+                if len(sessions) >= self.max_connections:
+                    return None
+            session = sessions[address] = Session(address, packet.client_guid, mtu_size)
+        else:
+            # retransmitted request, the reply was lost
+            session.last_seen = clock()
+        return packets.OpenConnectionReply2(server_guid=self.server_guid, address=address, mtu_size=session.mtu_size,
+                                            use_security=False)
+
+
+async def create_server(host="0.0.0.0", port=DEFAULT_PORT, loop=None, protocol_class=ServerProtocol, batched=False,
+                        sock=None, **options):
+    """
+    Bind a ServerProtocol on (host, port), or serve on an already bound sock, return (transport, protocol).
+
+    With batched=True, datagrams are read and written in batches (recvmmsg/sendmmsg on Linux, see rakpy.udp) and
+    datagram_received gets memoryviews into a reused receive buffer.
+    """
+    loop = loop or asyncio.get_event_loop()
+    factory = functools.partial(protocol_class, **options)
+    local_addr = None if sock is not None else (host, port)
+    if batched:
+        return await create_batched_endpoint(factory, local_addr=local_addr, loop=loop, sock=sock)
+    return await loop.create_datagram_endpoint(factory, local_addr=local_addr, sock=sock)
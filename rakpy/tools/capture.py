@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Datagram capture files, to replay production traffic offline.
+
+A capture starts with a 16 bytes header (MAGIC, format version) followed by records appended one after the other:
+a 32 bytes record header (data length, timestamp, direction, address) then the datagram itself. Files are only
+ever appended to: a record cut short by a crash is ignored when reading, and cut off before appending.
+CaptureReader memory maps the file and hands out memoryview slices of it, so captures larger than RAM can be
+replayed.
+
+Usage: PYTHONPATH=. python -m rakpy.tools.capture {info,replay} FILE [--speed SPEED] [--server] [--lazy]
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import mmap
+import os
+import socket
+import sys
+import time
+from collections import namedtuple
+from struct import Struct
+
+from rakpy.connection import clock
+from rakpy.protocol import decode_packet
+from rakpy.protocol.exceptions import DECODE_ERRORS
+
+MAGIC = b"RAKPYCAP"
+VERSION = 1
+# magic, format version, flags (unused)
+_FILE_HEADER = Struct(str("!8sHH4x"))
+# data length, timestamp (seconds since the epoch), direction, ip version, port, ip (IPv4 in the first 4 bytes)
+_RECORD_HEADER = Struct(str("!IdBBH16s"))
+
+INCOMING = 0
+OUTGOING = 1
+
+CapturedDatagram = namedtuple("CapturedDatagram", "timestamp addr direction data")
+
+
+class CaptureFormatError(Exception):
+    pass
+
+
+class CaptureWriter(object):
+    """
+    Append datagrams to a capture file (created if needed). Writes are buffered, flush() or close() them.
+
+    An incomplete last record (left by a crash) is truncated first, so that new records follow the complete ones.
+    """
+    def __init__(self, path, buffer_size=1 << 20, now=time.time):
+        self.path = path
+        self.now = now
+        self.records = 0
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "r+b") as existing:
+                _check_header(existing.read(_FILE_HEADER.size))
+                end = _complete_length(existing)
+                if end != os.fstat(existing.fileno()).st_size:
+                    existing.truncate(end)
+        self._file = open(path, "ab", buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(_FILE_HEADER.pack(MAGIC, VERSION, 0))
+        self._header = bytearray(_RECORD_HEADER.size)
+
+    def record(self, data, addr, direction=INCOMING, timestamp=None):
+        if timestamp is None:
+            timestamp = self.now()
+        if len(addr) == 2 and ":" not in addr[0]:
+            version, packed = 4, socket.inet_aton(addr[0])
+        else:
+            version, packed = 6, socket.inet_pton(socket.AF_INET6, addr[0])
+        _RECORD_HEADER.pack_into(self._header, 0, len(data), timestamp, direction, version, addr[1], packed)
+        self._file.write(self._header)
+        self._file.write(data)
+        self.records += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _check_header(header):
+    if len(header) < _FILE_HEADER.size:
+        raise CaptureFormatError("truncated capture header")
+    magic, version, _ = _FILE_HEADER.unpack(header)
+    if magic != MAGIC:
+        raise CaptureFormatError("not a rakpy capture")
+    if version != VERSION:
+        raise CaptureFormatError("unsupported capture version {}".format(version))
+
+
+def _complete_length(capture):
+    # offset of the end of the last complete record, capture is positioned after the file header
+    size = os.fstat(capture.fileno()).st_size
+    header_size = _RECORD_HEADER.size
+    offset = _FILE_HEADER.size
+    while offset + header_size <= size:
+        capture.seek(offset)
+        end = offset + header_size + _RECORD_HEADER.unpack(capture.read(header_size))[0]
+        if end > size:
+            break
+        offset = end
+    return offset
+
+
+class CaptureReader(object):
+    """
+    Memory mapped capture file, iterating over CapturedDatagrams whose data are memoryviews into the mapping (the
+    file is unmapped on close(), or once the last of them is gone).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.truncated = False
+        with open(path, "rb") as capture:
+            _check_header(capture.read(_FILE_HEADER.size))
+            size = os.fstat(capture.fileno()).st_size
+            self._map = mmap.mmap(capture.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._view = memoryview(self._map) if self._map is not None else memoryview(b"")
+
+    def __iter__(self):
+        view = self._view
+        end = len(view)
+        offset = _FILE_HEADER.size
+        unpack_from = _RECORD_HEADER.unpack_from
+        header_size = _RECORD_HEADER.size
+        addresses = {}
+        while offset + header_size <= end:
+            length, timestamp, direction, version, port, packed = unpack_from(view, offset)
+            start = offset + header_size
+            offset = start + length
+            if offset > end:
+                break
+            # clients send many datagrams: the address strings are built once per ip
+            ip = addresses.get(packed)
+            if ip is None:
+                ip = addresses[packed] = (socket.inet_ntoa(packed[:4]) if version == 4
+                                          else socket.inet_ntop(socket.AF_INET6, packed))
+            addr = (ip, port) if version == 4 else (ip, port, 0, 0)
+            yield CapturedDatagram(timestamp, addr, direction, view[start:offset])
+        self.truncated = offset != end
+
+    def close(self):
+        self._view.release()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # datagrams still reference the mapping: it is unmapped with the last of them
+                pass
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def recording_protocol(protocol_class, writer):
+    """
+    Subclass of protocol_class recording every datagram received and sent into writer (a CaptureWriter)
+    """
+    class RecordingTransport(object):
+        def __init__(self, transport):
+            self._transport = transport
+
+        def sendto(self, data, addr=None):
+            writer.record(data, addr, OUTGOING)
+            self._transport.sendto(data, addr)
+
+        def __getattr__(self, name):
+            return getattr(self._transport, name)
+
+    class RecordingProtocol(protocol_class):
+        def connection_made(self, transport):
+            super(RecordingProtocol, self).connection_made(RecordingTransport(transport))
+
+        def datagram_received(self, data, addr):
+            writer.record(data, addr, INCOMING)
+            super(RecordingProtocol, self).datagram_received(data, addr)
+
+    RecordingProtocol.__name__ = str("Recording" + protocol_class.__name__)
+    return RecordingProtocol
+
+
+def replay(datagrams, datagram_received, speed=None, direction=INCOMING, now=clock, sleep=time.sleep):
+    """
+    Call datagram_received(data, addr) for the captured datagrams of the given direction, return how many.
+
+    With speed=None they are replayed as fast as possible, otherwise at the original pace divided by speed (1.0 is
+    the original timing, 2.0 twice as fast).
+    """
+    if speed is not None and not speed > 0:
+        raise ValueError("speed must be positive, not {}".format(speed))
+    count = 0
+    first = start = None
+    for datagram in datagrams:
+        if datagram.direction != direction:
+            continue
+        if speed is not None:
+            if first is None:
+                first, start = datagram.timestamp, now()
+            delay = start + (datagram.timestamp - first) / speed - now()
+            if delay > 0:
+                sleep(delay)
+        datagram_received(datagram.data, datagram.addr)
+        count += 1
+    return count
+
+
+class DecodeStats(object):
+    """
+    datagram_received target decoding every datagram with decode_packet, counting packets and errors by type
+    """
+    def __init__(self, lazy=False):
+        self.lazy = lazy
+        self.packets = {}
+        self.errors = {}
+
+    def datagram_received(self, data, addr):
+        try:
+            packet = decode_packet(data, lazy=self.lazy)
+        except DECODE_ERRORS as e:
+            name = type(e).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+            return
+        name = type(packet).__name__
+        self.packets[name] = self.packets.get(name, 0) + 1
+
+
+class NullTransport(object):
+    """
+    Transport dropping what is sent, for replaying into a server protocol
+    """
+    def __init__(self):
+        self.datagrams_sent = 0
+        self.bytes_sent = 0
+
+    def sendto(self, data, addr=None):
+        self.datagrams_sent += 1
+        self.bytes_sent += len(data)
+
+    def get_extra_info(self, name, default=None):
+        return default
+
+    def close(self):
+        pass
+
+
+def _speed(value):
+    speed = float(value)
+    if not speed > 0:
+        raise argparse.ArgumentTypeError("must be positive, not {}".format(value))
+    return speed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="rakpy capture files")
+    parser.add_argument("command", choices=("info", "replay"))
+    parser.add_argument("path")
+    parser.add_argument("--speed", type=_speed, help="replay at the original pace divided by SPEED (default: as "
+                                                    "fast as possible)")
+    parser.add_argument("--server", action="store_true", help="replay into a ServerProtocol instead of "
+                                                              "decode_packet")
+    parser.add_argument("--lazy", action="store_true", help="decode packets lazily")
+    args = parser.parse_args(argv)
+
+    with CaptureReader(args.path) as reader:
+        if args.command == "info":
+            counts = [0, 0]
+            size = 0
+            first = last = None
+            for datagram in reader:
+                counts[datagram.direction] += 1
+                size += len(datagram.data)
+                first = datagram.timestamp if first is None else first
+                last = datagram.timestamp
+            print("incoming: {}, outgoing: {}, bytes: {}, duration: {:.3f}s{}".format(
+                counts[INCOMING], counts[OUTGOING], size, (last - first) if first is not None else 0.0,
+                ", truncated" if reader.truncated else ""))
+            return 0
+
+        if args.server:
+            from rakpy.server import ServerProtocol
+            target = ServerProtocol()
+            target.connection_made(NullTransport())
+        else:
+            target = DecodeStats(lazy=args.lazy)
+        start = clock()
+        count = replay(reader, target.datagram_received, speed=args.speed)
+        seconds = clock() - start
+    print("replayed {} datagrams in {:.3f}s ({:.0f}/s)".format(count, seconds, count / seconds if seconds else 0.0))
+    if args.server:
+        print("replies: {}, decode errors: {}, offline drops: {}".format(
+            target.replies_sent, target.decode_errors, target.offline_filter.drops()))
+    else:
+        print("packets: {}".format(target.packets))
+        print("errors: {}".format(target.errors))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming pcap / pcapng reader extracting the UDP payloads of one port and decoding them with decode_packet.
+
+Files are memory mapped and walked record by record: payloads are memoryview slices of the mapping, so memory use
+does not grow with the capture size. Link layers: Ethernet (with VLAN tags), BSD loopback, raw IP, Linux cooked
+(SLL, SLL2). IP fragments are not reassembled (they are counted in PcapReader.fragments).
+
+Usage: PYTHONPATH=. python -m rakpy.tools.pcap FILE [--port PORT] [--stats]
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import mmap
+import socket
+import sys
+from struct import Struct
+
+import six
+
+from rakpy.protocol import decode_packet
+from rakpy.protocol.batch import decode_batch
+from rakpy.protocol.exceptions import DECODE_ERRORS
+
+DEFAULT_PORT = 19132
+
+PCAP_MAGIC_NS = 0xa1b23c4d
+PCAPNG_INTERFACE_DESCRIPTION = 1
+PCAPNG_OBSOLETE_PACKET = 2
+PCAPNG_SIMPLE_PACKET = 3
+PCAPNG_ENHANCED_PACKET = 6
+PCAPNG_OPTION_TSRESOL = 9
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86dd
+ETHERTYPE_VLAN = (0x8100, 0x88a8, 0x9100)
+IPPROTO_UDP = 17
+# IPv6 extension headers skipped to reach UDP (the fragment header, 44, is not)
+IPV6_EXTENSION_HEADERS = (0, 43, 60)
+
+_U16 = Struct(str("!H"))
+_UDP_PORTS = Struct(str("!HHH"))
+_IPV4_FLAGS = Struct(str("!H"))
+
+
+class PcapFormatError(Exception):
+    pass
+
+
+def _endian_structs(endian):
+    return dict(
+        pcap_header=Struct(str(endian + "IHHiIII")),
+        pcap_record=Struct(str(endian + "IIII")),
+        block=Struct(str(endian + "II")),
+        interface=Struct(str(endian + "HHI")),
+        enhanced=Struct(str(endian + "IIIII")),
+        obsolete=Struct(str(endian + "HHIIII")),
+        simple=Struct(str(endian + "I")),
+        option=Struct(str(endian + "HH")),
+    )
+
+
+_STRUCTS = {"<": _endian_structs("<"), ">": _endian_structs(">")}
+# pcapng block type -> struct of the fixed fields starting its body
+_BLOCK_STRUCTS = {
+    PCAPNG_INTERFACE_DESCRIPTION: "interface",
+    PCAPNG_ENHANCED_PACKET: "enhanced",
+    PCAPNG_OBSOLETE_PACKET: "obsolete",
+    PCAPNG_SIMPLE_PACKET: "simple",
+}
+
+
+class PcapReader(object):
+    """
+    Reader over a pcap or pcapng file (detected from its first bytes).
+
+    datagrams() yields (timestamp, src, dst, payload) for every UDP datagram from or to port (any port if None),
+    packets() decodes the payloads, batches() groups them for statistics. Frames skipped for any reason are counted
+    (non_udp, other_port, fragments, truncated, malformed), as are decoding errors by exception type (decode_errors).
+    """
+    def __init__(self, path, port=DEFAULT_PORT):
+        self.path = path
+        self.port = port
+        self.frames = 0
+        self.non_udp = 0
+        self.other_port = 0
+        self.fragments = 0
+        self.truncated = 0
+        self.malformed = 0
+        self.decode_errors = {}
+        with open(path, "rb") as capture:
+            try:
+                self._map = mmap.mmap(capture.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise PcapFormatError("empty file")
+        self._view = memoryview(self._map)
+        if len(self._view) < 4:
+            raise PcapFormatError("truncated file")
+        magic = bytes(self._view[:4])
+        if magic in (b"\xa1\xb2\xc3\xd4", b"\xa1\xb2\x3c\x4d"):
+            self.format, self._endian = "pcap", ">"
+        elif magic in (b"\xd4\xc3\xb2\xa1", b"\x4d\x3c\xb2\xa1"):
+            self.format, self._endian = "pcap", "<"
+        elif magic == b"\x0a\x0d\x0d\x0a":
+            self.format, self._endian = "pcapng", None
+        else:
+            raise PcapFormatError("not a pcap or pcapng file")
+
+    def close(self):
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # payloads still reference the mapping: it is unmapped with the last of them
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def captured_frames(self):
+        """
+        Yield (timestamp, link type, frame) for every captured frame
+        """
+        if self.format == "pcap":
+            return self._pcap_frames()
+        return self._pcapng_frames()
+
+    def _pcap_frames(self):
+        view = self._view
+        structs = _STRUCTS[self._endian]
+        header = structs["pcap_header"]
+        if len(view) < header.size:
+            raise PcapFormatError("truncated pcap header")
+        magic, _, _, _, _, _, link_type = header.unpack_from(view, 0)
+        divisor = 1e9 if magic == PCAP_MAGIC_NS else 1e6
+        unpack_record = structs["pcap_record"].unpack_from
+        record_size = structs["pcap_record"].size
+        offset, end = header.size, len(view)
+        while offset + record_size <= end:
+            seconds, fraction, captured, _ = unpack_record(view, offset)
+            start = offset + record_size
+            offset = start + captured
+            if offset > end:
+                self.truncated += 1
+                break
+            yield seconds + fraction / divisor, link_type, view[start:offset]
+
+    def _pcapng_frames(self):
+        view = self._view
+        end = len(view)
+        offset = 0
+        structs = None
+        # per interface of the current section: (link type, timestamp units per second)
+        interfaces = []
+        while offset + 12 <= end:
+            if bytes(view[offset:offset + 4]) == b"\x0a\x0d\x0d\x0a":
+                order = bytes(view[offset + 8:offset + 12])
+                if order == b"\x1a\x2b\x3c\x4d":
+                    structs = _STRUCTS[">"]
+                elif order == b"\x4d\x3c\x2b\x1a":
+                    structs = _STRUCTS["<"]
+                else:
+                    raise PcapFormatError("invalid pcapng byte order magic")
+                interfaces = []
+            elif structs is None:
+                raise PcapFormatError("pcapng file without section header")
+            block_type, block_length = structs["block"].unpack_from(view, offset)
+            if block_length < 12 or block_length % 4:
+                raise PcapFormatError("invalid pcapng block length {}".format(block_length))
+            body = offset + 8
+            next_offset = offset + block_length
+            if next_offset > end:
+                self.truncated += 1
+                break
+            body_end = next_offset - 4
+            fixed_part = _BLOCK_STRUCTS.get(block_type)
+            if fixed_part is not None and body + structs[fixed_part].size > body_end:
+                # block too short for its fixed fields
+                if block_type == PCAPNG_INTERFACE_DESCRIPTION:
+                    raise PcapFormatError("truncated pcapng interface description block")
+                self.malformed += 1
+                offset = next_offset
+                continue
+
+            if block_type == PCAPNG_INTERFACE_DESCRIPTION:
+                link_type, _, _ = structs["interface"].unpack_from(view, body)
+                interfaces.append((link_type, self._tsresol(view, body + 8, body_end, structs)))
+            elif block_type == PCAPNG_ENHANCED_PACKET:
+                interface, high, low, captured, _ = structs["enhanced"].unpack_from(view, body)
+                start = body + structs["enhanced"].size
+                if interface < len(interfaces) and start + captured <= body_end:
+                    link_type, resolution = interfaces[interface]
+                    yield ((high << 32) | low) / resolution, link_type, view[start:start + captured]
+                else:
+                    self.truncated += 1
+            elif block_type == PCAPNG_SIMPLE_PACKET:
+                original, = structs["simple"].unpack_from(view, body)
+                start = body + 4
+                if interfaces:
+                    # no timestamp in simple packet blocks
+                    yield None, interfaces[0][0], view[start:min(start + original, body_end)]
+            elif block_type == PCAPNG_OBSOLETE_PACKET:
+                interface, _, high, low, captured, _ = structs["obsolete"].unpack_from(view, body)
+                start = body + structs["obsolete"].size
+                if interface < len(interfaces) and start + captured <= body_end:
+                    link_type, resolution = interfaces[interface]
+                    yield ((high << 32) | low) / resolution, link_type, view[start:start + captured]
+            offset = next_offset
+
+    @staticmethod
+    def _tsresol(view, offset, end, structs):
+        unpack_option = structs["option"].unpack_from
+        while offset + 4 <= end:
+            code, length = unpack_option(view, offset)
+            if code == 0:
+                break
+            if code == PCAPNG_OPTION_TSRESOL and length >= 1:
+                value = six.indexbytes(view, offset + 4)
+                # most significant bit set: negative power of two, else negative power of ten
+                return float(2 ** (value & 0x7f) if value & 0x80 else 10 ** value)
+            offset += 4 + (length + 3) // 4 * 4
+        return 1e6
+
+    def datagrams(self):
+        """
+        Yield (timestamp, src, dst, payload) for the UDP datagrams from or to port, payload is a memoryview
+        """
+        port = self.port
+        extract = self._extract
+        for timestamp, link_type, frame in self.captured_frames():
+            self.frames += 1
+            udp = extract(link_type, frame)
+            if udp is None:
+                continue
+            src, dst, payload = udp
+            if port is not None and src[1] != port and dst[1] != port:
+                self.other_port += 1
+                continue
+            yield timestamp, src, dst, payload
+
+    def packets(self, lazy=False):
+        """
+        Yield (timestamp, src, dst, packet) for the datagrams from or to port that decode
+        """
+        errors = self.decode_errors
+        for timestamp, src, dst, payload in self.datagrams():
+            try:
+                packet = decode_packet(payload, lazy=lazy)
+            except DECODE_ERRORS as e:
+                name = type(e).__name__
+                errors[name] = errors.get(name, 0) + 1
+                continue
+            yield timestamp, src, dst, packet
+
+    def batches(self, size=4096, use_numpy=None):
+        """
+        Yield (timestamps, sources, destinations, DecodedBatch) for every size datagrams, decoded with decode_batch
+        (column-wise, with numpy when available). Rows of a DecodedBatch index the three lists.
+        """
+        timestamps, sources, destinations, payloads = [], [], [], []
+        for timestamp, src, dst, payload in self.datagrams():
+            timestamps.append(timestamp)
+            sources.append(src)
+            destinations.append(dst)
+            payloads.append(payload)
+            if len(payloads) == size:
+                yield timestamps, sources, destinations, decode_batch(payloads, use_numpy=use_numpy)
+                timestamps, sources, destinations, payloads = [], [], [], []
+        if payloads:
+            yield timestamps, sources, destinations, decode_batch(payloads, use_numpy=use_numpy)
+
+    def _extract(self, link_type, frame):
+        """
+        Return (src, dst, payload) if frame holds a complete UDP datagram, None otherwise
+        """
+        length = len(frame)
+        if link_type == LINKTYPE_ETHERNET:
+            offset = 14
+            if length < offset:
+                return self._truncated()
+            ethertype = _U16.unpack_from(frame, 12)[0]
+            while ethertype in ETHERTYPE_VLAN:
+                if length < offset + 4:
+                    return self._truncated()
+                ethertype = _U16.unpack_from(frame, offset + 2)[0]
+                offset += 4
+        elif link_type == LINKTYPE_LINUX_SLL:
+            if length < 16:
+                return self._truncated()
+            ethertype, offset = _U16.unpack_from(frame, 14)[0], 16
+        elif link_type == LINKTYPE_LINUX_SLL2:
+            if length < 20:
+                return self._truncated()
+            ethertype, offset = _U16.unpack_from(frame, 0)[0], 20
+        elif link_type == LINKTYPE_NULL:
+            if length < 4:
+                return self._truncated()
+            # address family in the byte order of the capturing host, IPv6 values vary between BSDs
+            family = six.indexbytes(frame, 0) or six.indexbytes(frame, 3)
+            ethertype, offset = (ETHERTYPE_IPV4 if family == 2 else ETHERTYPE_IPV6), 4
+        elif link_type in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+            if not length:
+                return self._truncated()
+            ethertype, offset = (ETHERTYPE_IPV4 if six.indexbytes(frame, 0) >> 4 == 4 else ETHERTYPE_IPV6), 0
+        else:
+            self.non_udp += 1
+            return None
+
+        if ethertype == ETHERTYPE_IPV4:
+            return self._ipv4(frame, offset)
+        if ethertype == ETHERTYPE_IPV6:
+            return self._ipv6(frame, offset)
+        self.non_udp += 1
+        return None
+
+    def _truncated(self):
+        self.truncated += 1
+        return None
+
+    def _ipv4(self, frame, offset):
+        if len(frame) < offset + 20:
+            return self._truncated()
+        header_length = (six.indexbytes(frame, offset) & 0x0f) * 4
+        if header_length < 20:
+            # IHL below 5 words: not a valid IPv4 header
+            self.malformed += 1
+            return None
+        if six.indexbytes(frame, offset + 9) != IPPROTO_UDP:
+            self.non_udp += 1
+            return None
+        # more fragments flag or fragment offset
+        if _IPV4_FLAGS.unpack_from(frame, offset + 6)[0] & 0x3fff:
+            self.fragments += 1
+            return None
+        src = socket.inet_ntoa(bytes(frame[offset + 12:offset + 16]))
+        dst = socket.inet_ntoa(bytes(frame[offset + 16:offset + 20]))
+        return self._udp(frame, offset + header_length, src, dst)
+
+    def _ipv6(self, frame, offset):
+        if len(frame) < offset + 40:
+            return self._truncated()
+        next_header = six.indexbytes(frame, offset + 6)
+        src = socket.inet_ntop(socket.AF_INET6, bytes(frame[offset + 8:offset + 24]))
+        dst = socket.inet_ntop(socket.AF_INET6, bytes(frame[offset + 24:offset + 40]))
+        offset += 40
+        while next_header in IPV6_EXTENSION_HEADERS:
+            if len(frame) < offset + 8:
+                return self._truncated()
+            next_header, extension_length = six.indexbytes(frame, offset), six.indexbytes(frame, offset + 1)
+            offset += (extension_length + 1) * 8
+        if next_header == 44:
+            self.fragments += 1
+            return None
+        if next_header != IPPROTO_UDP:
+            self.non_udp += 1
+            return None
+        return self._udp(frame, offset, src, dst)
+
+    def _udp(self, frame, offset, src, dst):
+        if len(frame) < offset + 8:
+            return self._truncated()
+        src_port, dst_port, length = _UDP_PORTS.unpack_from(frame, offset)
+        end = offset + length
+        if length < 8 or end > len(frame):
+            return self._truncated()
+        return (src, src_port), (dst, dst_port), frame[offset + 8:end]
+
+
+def read_packets(path, port=DEFAULT_PORT, lazy=False):
+    """
+    Yield (timestamp, src, dst, packet) for the RakNet packets from or to port found in a pcap / pcapng file
+    """
+    with PcapReader(path, port) as reader:
+        for item in reader.packets(lazy=lazy):
+            yield item
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="decode the RakNet packets of a pcap / pcapng file")
+    parser.add_argument("path")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="UDP port (default: %(default)s)")
+    parser.add_argument("--stats", action="store_true", help="only count packets by class (batch mode)")
+    args = parser.parse_args(argv)
+
+    with PcapReader(args.path, args.port) as reader:
+        if args.stats:
+            counts = {}
+            unknown = 0
+            for _, _, _, batch in reader.batches():
+                for packet_class, rows in batch.items():
+                    counts[packet_class.__name__] = counts.get(packet_class.__name__, 0) + len(rows)
+                unknown += len(batch.unknown)
+            for name, count in sorted(counts.items()):
+                print("{:<32} {}".format(name, count))
+            print("{:<32} {}".format("unknown / datagrams", unknown))
+        else:
+            for timestamp, src, dst, packet in reader.packets():
+                print("{} {}:{} -> {}:{} {!r}".format(timestamp, src[0], src[1], dst[0], dst[1], packet))
+        print("frames: {}, non UDP: {}, other ports: {}, fragments: {}, truncated: {}, malformed: {}, "
+              "decode errors: {}".format(reader.frames, reader.non_udp, reader.other_port, reader.fragments,
+                                         reader.truncated, reader.malformed, reader.decode_errors), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+Batched UDP I/O.
+
+On Linux, BatchSocket reads and writes up to batch_size datagrams per system call with recvmmsg/sendmmsg (through
+ctypes); elsewhere it falls back to recvfrom_into/sendto loops with the same interface.
+Received datagrams land in a preallocated ring of buffers and are returned as memoryview slices: they are only valid
+until the next call to recv_batch.
+"""
+from __future__ import unicode_literals
+
+import asyncio
+import collections
+import ctypes
+import errno
+import socket
+import struct
+import sys
+
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0x40)
+SOCKADDR_SIZE = 128  # sizeof(struct sockaddr_storage)
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_BUFFER_SIZE = 2048
+
+_SOCKADDR_IN = struct.Struct(str("=H"))
+_PORT = struct.Struct(str("!H"))
+_FLOW_SCOPE = struct.Struct(str("=I"))
+
+
+class iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(iovec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", msghdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.recvmmsg, libc.sendmmsg
+    except (OSError, AttributeError):  # pragma: no cover
+        return None
+    libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    libc.recvmmsg.restype = ctypes.c_int
+    libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int]
+    libc.sendmmsg.restype = ctypes.c_int
+    return libc
+
+
+_libc = _load_libc()
+HAS_MMSG = _libc is not None
+
+
+def decode_sockaddr(buffer, offset=0):
+    """
+    Convert a raw struct sockaddr_in / sockaddr_in6 to a socket address tuple
+    """
+    family = _SOCKADDR_IN.unpack_from(buffer, offset)[0]
+    port = _PORT.unpack_from(buffer, offset + 2)[0]
+    if family == socket.AF_INET:
+        return socket.inet_ntop(socket.AF_INET, bytes(buffer[offset + 4:offset + 8])), port
+    flowinfo = _FLOW_SCOPE.unpack_from(buffer, offset + 4)[0]
+    scope_id = _FLOW_SCOPE.unpack_from(buffer, offset + 24)[0]
+    return socket.inet_ntop(socket.AF_INET6, bytes(buffer[offset + 8:offset + 24])), port, flowinfo, scope_id
+
+
+def encode_sockaddr(addr, buffer, offset=0):
+    """
+    Write addr as a raw struct sockaddr_in / sockaddr_in6, return its length
+    """
+    if len(addr) == 2 and ":" not in addr[0]:
+        _SOCKADDR_IN.pack_into(buffer, offset, socket.AF_INET)
+        _PORT.pack_into(buffer, offset + 2, addr[1])
+        buffer[offset + 4:offset + 8] = socket.inet_pton(socket.AF_INET, addr[0])
+        return 16
+    _SOCKADDR_IN.pack_into(buffer, offset, socket.AF_INET6)
+    _PORT.pack_into(buffer, offset + 2, addr[1])
+    _FLOW_SCOPE.pack_into(buffer, offset + 4, addr[2] if len(addr) > 2 else 0)
+    buffer[offset + 8:offset + 24] = socket.inet_pton(socket.AF_INET6, addr[0])
+    _FLOW_SCOPE.pack_into(buffer, offset + 24, addr[3] if len(addr) > 3 else 0)
+    return 28
+
+
+class BatchSocket(object):
+    """
+    Non blocking UDP socket reading and writing datagrams in batches.
+
+    recv_batch() returns up to batch_size (memoryview, addr) pairs pointing into a preallocated ring of buffers,
+    send_batch() sends a list of (data, addr) pairs and returns how many were sent (the rest would block).
+    """
+    def __init__(self, sock, batch_size=DEFAULT_BATCH_SIZE, buffer_size=DEFAULT_BUFFER_SIZE, use_mmsg=None):
+        if use_mmsg is None:
+            use_mmsg = HAS_MMSG
+        if use_mmsg and not HAS_MMSG:
+            raise OSError("recvmmsg/sendmmsg are not available")
+        sock.setblocking(False)
+        self.sock = sock
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        self.use_mmsg = use_mmsg
+        self.buffer = bytearray(batch_size * buffer_size)
+        self.view = memoryview(self.buffer)
+        self.slots = [self.view[i * buffer_size:(i + 1) * buffer_size] for i in range(batch_size)]
+        if use_mmsg:
+            self._setup_mmsg()
+
+    def _setup_mmsg(self):
+        batch_size = self.batch_size
+        self._names = bytearray(batch_size * SOCKADDR_SIZE)
+        # the ctypes views pin both bytearrays (they can no longer be resized)
+        self._names_array = (ctypes.c_char * len(self._names)).from_buffer(self._names)
+        self._buffer_array = (ctypes.c_char * len(self.buffer)).from_buffer(self.buffer)
+        names_address = ctypes.addressof(self._names_array)
+        buffer_address = ctypes.addressof(self._buffer_array)
+        self._recv_iov = (iovec * batch_size)()
+        self._recv_headers = (mmsghdr * batch_size)()
+        self._send_iov = (iovec * batch_size)()
+        self._send_headers = (mmsghdr * batch_size)()
+        for i in range(batch_size):
+            self._recv_iov[i].iov_base = buffer_address + i * self.buffer_size
+            self._recv_iov[i].iov_len = self.buffer_size
+            for headers, iov in ((self._recv_headers, self._recv_iov), (self._send_headers, self._send_iov)):
+                header = headers[i].msg_hdr
+                header.msg_name = names_address + i * SOCKADDR_SIZE
+                header.msg_iov = ctypes.pointer(iov[i])
+                header.msg_iovlen = 1
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        self.sock.close()
+
+    def recv_batch(self):
+        if self.use_mmsg:
+            return self._recv_mmsg()
+        return self._recv_fallback()
+
+    def send_batch(self, messages):
+        if self.use_mmsg:
+            sent = 0
+            while sent < len(messages):
+                chunk = messages[sent:sent + self.batch_size]
+                count = self._send_mmsg(chunk)
+                sent += count
+                if count < len(chunk):
+                    break
+            return sent
+        return self._send_fallback(messages)
+
+    def _recv_mmsg(self):
+        headers = self._recv_headers
+        for i in range(self.batch_size):
+            headers[i].msg_hdr.msg_namelen = SOCKADDR_SIZE
+        count = _libc.recvmmsg(self.sock.fileno(), headers, self.batch_size, MSG_DONTWAIT, None)
+        if count < 0:
+            error = ctypes.get_errno()
+            if error in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return []
+            raise OSError(error, "recvmmsg: " + errno.errorcode.get(error, str(error)))
+        names = self._names
+        slots = self.slots
+        return [(slots[i][:headers[i].msg_len], decode_sockaddr(names, i * SOCKADDR_SIZE)) for i in range(count)]
+
+    def _send_mmsg(self, messages):
+        headers = self._send_headers
+        iov = self._send_iov
+        keep_alive = []
+        for i, (data, addr) in enumerate(messages):
+            if isinstance(data, bytes):
+                pointer = ctypes.c_char_p(data)
+                address = ctypes.cast(pointer, ctypes.c_void_p).value
+            else:
+                if isinstance(data, memoryview) and data.readonly:
+                    data = bytearray(data)
+                pointer = (ctypes.c_char * len(data)).from_buffer(data)
+                address = ctypes.addressof(pointer)
+            keep_alive.append(pointer)
+            iov[i].iov_base = address
+            iov[i].iov_len = len(data)
+            headers[i].msg_hdr.msg_namelen = encode_sockaddr(addr, self._names, i * SOCKADDR_SIZE)
+        count = _libc.sendmmsg(self.sock.fileno(), headers, len(messages), MSG_DONTWAIT)
+        del keep_alive
+        if count < 0:
+            error = ctypes.get_errno()
+            if error in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return 0
+            raise OSError(error, "sendmmsg: " + errno.errorcode.get(error, str(error)))
+        return count
+
+    def _recv_fallback(self):
+        received = []
+        recvfrom_into = self.sock.recvfrom_into
+        for slot in self.slots:
+            try:
+                size, addr = recvfrom_into(slot)
+            except (BlockingIOError, InterruptedError):
+                break
+            received.append((slot[:size], addr))
+        return received
+
+    def _send_fallback(self, messages):
+        sendto = self.sock.sendto
+        sent = 0
+        for data, addr in messages:
+            try:
+                sendto(data, addr)
+            except (BlockingIOError, InterruptedError):
+                break
+            sent += 1
+        return sent
+
+
+class BatchedDatagramTransport(asyncio.DatagramTransport):
+    """
+    asyncio datagram transport backed by a BatchSocket.
+
+    When the socket is readable, a whole batch is read and every datagram is passed to protocol.datagram_received as
+    a memoryview (valid until datagram_received returns). sendto() only queues the datagram, the queue is flushed
+    with one send_batch call per event loop iteration.
+    """
+    def __init__(self, loop, batch_socket, protocol):
+        super(BatchedDatagramTransport, self).__init__()
+        self._loop = loop
+        self._socket = batch_socket
+        self._protocol = protocol
+        self._queue = collections.deque()
+        self._flush_scheduled = False
+        self._writing = False
+        self._closing = False
+        self._extra = {"socket": batch_socket.sock, "sockname": batch_socket.sock.getsockname()}
+        loop.add_reader(batch_socket.fileno(), self._read_ready)
+        loop.call_soon(protocol.connection_made, self)
+
+    def get_extra_info(self, name, default=None):
+        return self._extra.get(name, default)
+
+    def is_closing(self):
+        return self._closing
+
+    def get_write_buffer_size(self):
+        return len(self._queue)
+
+    def sendto(self, data, addr=None):
+        if self._closing:
+            return
+        # like asyncio transports, queue an immutable copy: callers may reuse data (see PongTemplate)
+        self._queue.append((bytes(data), addr))
+        if not self._flush_scheduled and not self._writing:
+            self._flush_scheduled = True
+            self._loop.call_soon(self._flush)
+
+    def _read_ready(self):
+        try:
+            received = self._socket.recv_batch()
+        except OSError as exc:
+            self._protocol.error_received(exc)
+            return
+        datagram_received = self._protocol.datagram_received
+        for data, addr in received:
+            datagram_received(data, addr)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        queue = self._queue
+        while queue and self._socket.fileno() != -1:
+            messages = list(queue)
+            try:
+                sent = self._socket.send_batch(messages)
+            except OSError as exc:
+                queue.popleft()
+                self._protocol.error_received(exc)
+                continue
+            for _ in range(sent):
+                queue.popleft()
+            if sent < len(messages):
+                if not self._writing:
+                    self._writing = True
+                    self._loop.add_writer(self._socket.fileno(), self._write_ready)
+                return
+        if self._closing:
+            self._loop.call_soon(self._call_connection_lost)
+
+    def _write_ready(self):
+        self._writing = False
+        self._loop.remove_writer(self._socket.fileno())
+        self._flush()
+
+    def close(self):
+        if self._closing:
+            return
+        self._closing = True
+        self._loop.remove_reader(self._socket.fileno())
+        if not self._queue:
+            self._loop.call_soon(self._call_connection_lost)
+
+    def abort(self):
+        self._queue.clear()
+        self.close()
+
+    def _call_connection_lost(self):
+        if self._writing:
+            self._loop.remove_writer(self._socket.fileno())
+            self._writing = False
+        self._socket.close()
+        self._protocol.connection_lost(None)
+
+
+async def create_batched_endpoint(protocol_factory, local_addr=None, loop=None, batch_size=DEFAULT_BATCH_SIZE,
+                                  buffer_size=DEFAULT_BUFFER_SIZE, use_mmsg=None, sock=None):
+    """
+    Like loop.create_datagram_endpoint(protocol_factory, local_addr=local_addr) (or sock=sock for an already bound
+    socket) but reading and writing in batches, return (transport, protocol)
+    """
+    loop = loop or asyncio.get_event_loop()
+    if sock is None:
+        infos = await loop.getaddrinfo(local_addr[0], local_addr[1], type=socket.SOCK_DGRAM)
+        family, _, _, _, address = infos[0]
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            sock.bind(address)
+        except Exception:
+            sock.close()
+            raise
+    try:
+        batch_socket = BatchSocket(sock, batch_size=batch_size, buffer_size=buffer_size, use_mmsg=use_mmsg)
+    except Exception:
+        sock.close()
+        raise
+    protocol = protocol_factory()
+    transport = BatchedDatagramTransport(loop, batch_socket, protocol)
+    await asyncio.sleep(0)
+    return transport, protocol
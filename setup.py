@@ -9,5 +9,6 @@ setup(
     author_email="julien@lirochon.net",
     license="MIT",
     packages=["rakpy"],
-    install_requires=["six"]
+    install_requires=["six"],
+    extras_require={"numpy": ["numpy"]}
 )
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from rakpy.connection.ack import ReceiveTracker, InFlightTable, unwrap, SEQUENCE_MASK
+from rakpy.protocol import decode_packet, packets
+from rakpy.protocol.fields import Range
+
+
+def test_unwrap():
+    assert unwrap(0, 0) == 0
+    assert unwrap(5, 100) == 5
+    assert unwrap(SEQUENCE_MASK, 0) == -1
+    assert unwrap(2, SEQUENCE_MASK) == SEQUENCE_MASK + 3
+    assert unwrap(SEQUENCE_MASK, SEQUENCE_MASK + 3) == SEQUENCE_MASK
+
+
+def test_in_order():
+    tracker = ReceiveTracker()
+    for number in range(1000):
+        assert tracker.add(number)
+    assert tracker.pop_acks() == [Range(min_index=0, max_index=999)]
+    assert tracker.pop_naks() == []
+    assert tracker.pop_acks() == []
+
+
+def test_gaps_and_late_arrivals():
+    tracker = ReceiveTracker()
+    for number in (0, 1, 2, 6, 7, 10, 4):
+        assert tracker.add(number)
+    assert tracker.pop_acks() == [Range(0, 2), Range(4, 4), Range(6, 7), Range(10, 10)]
+    assert tracker.pop_naks() == [Range(3, 3), Range(5, 5), Range(8, 9)]
+
+    # late arrival of an already NAKed datagram
+    assert tracker.add(3)
+    assert tracker.pop_acks() == [Range(3, 3)]
+    assert tracker.pop_naks() == []
+
+
+def test_duplicates():
+    tracker = ReceiveTracker(window=16)
+    assert tracker.add(0)
+    assert not tracker.add(0)
+    for number in range(1, 40):
+        tracker.add(number)
+    assert not tracker.add(39)
+    # older than the window
+    assert not tracker.add(2)
+    assert tracker.duplicates == 3
+    assert tracker.pop_acks() == [Range(0, 39)]
+
+
+def test_wraparound():
+    tracker = ReceiveTracker()
+    tracker.highest = SEQUENCE_MASK - 3
+    for number in (SEQUENCE_MASK - 2, SEQUENCE_MASK - 1, SEQUENCE_MASK, 0, 1, 3):
+        assert tracker.add(number)
+    assert tracker.pop_acks() == [Range(SEQUENCE_MASK - 2, SEQUENCE_MASK), Range(0, 1), Range(3, 3)]
+    assert tracker.pop_naks() == [Range(2, 2)]
+
+
+def test_tick():
+    tracker = ReceiveTracker()
+    assert tracker.tick() == []
+    tracker.add(0)
+    tracker.add(2)
+    ack, nak = tracker.tick()
+    assert type(ack) == packets.Acknowledge
+    assert type(nak) == packets.Unacknowledge
+    assert decode_packet(bytes(ack.encode())).packet_ranges == [Range(0, 0), Range(2, 2)]
+    assert decode_packet(bytes(nak.encode())).packet_ranges == [Range(1, 1)]
+
+
+def test_in_flight_table():
+    table = InFlightTable()
+    for value in range(10):
+        assert table.push("datagram {}".format(value)) == value
+
+    assert table.get(3) == "datagram 3"
+    assert table.pop_ranges([Range(0, 2), Range(5, 5)]) == [
+        (0, "datagram 0"), (1, "datagram 1"), (2, "datagram 2"), (5, "datagram 5")]
+    assert len(table) == 6
+    assert table.oldest == 3
+
+    # already acknowledged, or never sent
+    assert table.pop_ranges([Range(0, 2), Range(100, 200)]) == []
+
+    # a huge range is clamped to what is in flight
+    assert [number for number, value in table.pop_ranges([Range(0, SEQUENCE_MASK - 1)])] == [3, 4, 6, 7, 8, 9]
+    assert len(table) == 0
+    assert table.oldest == table.next_number == 10
+
+
+def test_in_flight_table_overlapping_ranges():
+    table = InFlightTable()
+    for value in range(20000):
+        table.push(value)
+    # a sparse table: only every 100th datagram is still in flight
+    table.pop_ranges([Range(number, number + 98) for number in range(1, 20000, 100)])
+    assert len(table) == 200
+    calls = []
+
+    class Entries(dict):
+        def pop(self, *args):
+            calls.append(args[0])
+            return dict.pop(self, *args)
+
+    table._entries = Entries(table._entries)
+    popped = table.pop_ranges([Range(0, 19999)] * 200 + [Range(300, 300)])
+    assert [number for number, value in popped] == list(range(0, 20000, 100))
+    # each in flight datagram is looked up once, not once per range and per number of the span
+    assert len(calls) == 200
+    assert len(table) == 0
+
+
+def test_in_flight_table_wraparound():
+    table = InFlightTable()
+    table.oldest = table.next_number = SEQUENCE_MASK - 1
+    assert [table.push(value) for value in range(4)] == [SEQUENCE_MASK - 1, SEQUENCE_MASK, 0, 1]
+    assert table.pop_ranges([Range(SEQUENCE_MASK, SEQUENCE_MASK), Range(0, 0)]) == [(SEQUENCE_MASK, 1), (0, 2)]
+    assert sorted(table) == [(1, 3), (SEQUENCE_MASK - 1, 0)]
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+from rakpy.protocol import decode_packets, decode_batch, packets
+from rakpy.protocol.const import MAGIC
+from rakpy.protocol.exceptions import UnknownPacketException
+
+
+def make_buffers():
+    buffers = []
+    for i in range(10):
+        buffers.append(bytes(packets.UnconnectedPing(time=i, client_guid=-i).encode()))
+        buffers.append(bytes(packets.UnconnectedPong(ping_time=i, server_guid=i, server_name="s{}".format(i)).encode()))
+    buffers.append(b"\xff\x00")  # unknown
+    buffers.append(b"\x01" + b"\x00" * 8 + b"\x42" * len(MAGIC) + b"\x00" * 8)  # invalid magic
+    buffers.append(buffers[0] + b"\x00")  # remaining data
+    buffers.append(b"\x1c\x00")  # truncated
+    return buffers
+
+
+def test_decode_packets():
+    buffers = make_buffers()
+    with pytest.raises(UnknownPacketException):
+        decode_packets(buffers)
+
+    decoded = decode_packets(buffers, ignore_errors=True)
+    assert len(decoded) == len(buffers)
+    assert decoded[0].client_guid == 0
+    assert decoded[3].server_name == "s1"
+    assert decoded[-4:] == [None, None, None, None]
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_decode_batch(use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    buffers = make_buffers()
+    result = decode_batch(buffers, use_numpy=use_numpy)
+
+    assert set(result) == {packets.UnconnectedPing, packets.UnconnectedPong}
+    assert result.unknown == [20]
+
+    pings = result[packets.UnconnectedPing]
+    assert len(pings) == 10
+    assert list(pings.indexes) == list(range(0, 20, 2))
+    assert list(pings.columns["time"]) == list(range(10))
+    assert list(pings.columns["client_guid"]) == [-i for i in range(10)]
+    assert pings.rejected == [21, 22]
+    assert [packet.time for packet in pings.packets()] == list(range(10))
+
+    pongs = result[packets.UnconnectedPong]
+    assert list(pongs.indexes) == list(range(1, 20, 2))
+    assert pongs.columns["server_name"] == ["s{}".format(i) for i in range(10)]
+    assert pongs.rejected == [23]
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_decode_batch_without_fields(use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    data = bytes(packets.DisconnectionNotification().encode())
+    batch = decode_batch([data, data, data + b"\x00"], use_numpy=use_numpy)[packets.DisconnectionNotification]
+    assert len(batch) == 2
+    assert batch.rejected == [2]
+    assert [type(packet) for packet in batch.packets()] == [packets.DisconnectionNotification] * 2
+
+
+def test_decode_batch_numpy_columns():
+    numpy = pytest.importorskip("numpy")
+    buffers = [bytes(packets.UnconnectedPing(time=i, client_guid=i * 1000).encode()) for i in range(100)]
+    pings = decode_batch(buffers)[packets.UnconnectedPing]
+    assert isinstance(pings.columns["time"], numpy.ndarray)
+    assert pings.columns["time"].dtype == numpy.dtype("=u8")
+    assert pings.columns["client_guid"].sum() == sum(i * 1000 for i in range(100))
+    assert "__magic__" not in pings.columns
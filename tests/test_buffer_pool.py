@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+from rakpy.io import BufferPool
+from rakpy.protocol import packets
+
+
+def test_acquire_release():
+    pool = BufferPool(buffer_size=16, size=2)
+    assert len(pool) == 2
+    first = pool.acquire()
+    second = pool.acquire()
+    assert len(first) == len(second) == 16
+    assert first is not second
+    assert pool.misses == 0
+
+    # empty pool: allocated, counted as a miss
+    third = pool.acquire()
+    assert len(third) == 16
+    assert pool.misses == 1
+    assert pool.in_use == pool.high_water == 3
+
+    for buffer in (first, second, third):
+        pool.release(buffer)
+    # the extra buffer is dropped
+    assert len(pool) == 2
+    assert pool.in_use == 0
+    assert pool.high_water == 3
+
+    # buffers are reused
+    assert pool.acquire() in (first, second)
+
+
+def test_context_manager():
+    pool = BufferPool(buffer_size=64, size=1)
+    with pool.buffer() as buffer:
+        end = packets.ConnectedPong(ping_time=42).encode_into(buffer)
+        assert bytes(buffer[:end]) == bytes(packets.ConnectedPong(ping_time=42).encode())
+        assert pool.in_use == 1
+    assert pool.in_use == 0
+
+    with pytest.raises(ValueError):
+        with pool.buffer() as buffer:
+            raise ValueError()
+    assert pool.in_use == 0
+    assert len(pool) == 1
+    assert pool.acquire() is buffer
+
+
+def test_release_foreign_buffer():
+    pool = BufferPool(buffer_size=16, size=1)
+    pool.acquire()
+    pool.release(bytearray(8))
+    assert len(pool) == 0
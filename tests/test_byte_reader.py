@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+from rakpy.io import ByteReader, EndOfStreamException
+
+
+def test_read():
+    data = b"\x2a\x4a\xbc\x01\x02\x03\x01\x02\x03\xff\xff\xff\xff\xff\xff\xff\xfe\x00\x00\x00\x07"
+    reader = ByteReader(data)
+    assert reader.read_u8() == 0x2a
+    assert reader.read_u16() == 19132
+    assert reader.read_triad() == 0x010203
+    assert reader.read_triad_le() == 0x030201
+    assert reader.read_i64() == -2
+    assert reader.read_u32() == 7
+    assert reader.offset == len(data)
+    assert reader.remaining() == 0
+
+    with pytest.raises(EndOfStreamException):
+        reader.read_u8()
+
+
+def test_read_view():
+    data = bytearray(b"\x00\x01\x02\x03\x04\x05")
+    reader = ByteReader(data, offset=1)
+    view = reader.read_view(3)
+    assert type(view) == memoryview
+    assert view == b"\x01\x02\x03"
+    assert reader.offset == 4
+
+    # no copy
+    data[2] = 0x42
+    assert view[1] == 0x42
+
+    with pytest.raises(EndOfStreamException):
+        reader.read_view(3)
+    assert reader.offset == 4
+
+
+def test_end():
+    reader = ByteReader(b"\x00\x01\x02\x03", end=2)
+    assert reader.remaining() == 2
+    reader.skip(1)
+    with pytest.raises(EndOfStreamException):
+        reader.read_u16()
+    with pytest.raises(EndOfStreamException):
+        reader.skip(2)
+    assert reader.read_u8() == 1
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+from rakpy.protocol import packets
+from rakpy.server import ServerProtocol
+from rakpy.tools import capture
+from rakpy.tools.capture import (CaptureFormatError, CaptureReader, CaptureWriter, DecodeStats, NullTransport,
+                                 INCOMING, OUTGOING)
+
+PING = bytes(packets.UnconnectedPing(time=1, client_guid=2).encode())
+CLIENT = ("10.0.0.1", 54321)
+CLIENT6 = ("2001:db8::1", 54321, 0, 0)
+
+
+def write_capture(path):
+    with CaptureWriter(str(path)) as writer:
+        writer.record(PING, CLIENT, timestamp=100.0)
+        writer.record(b"\xff\xff", CLIENT6, timestamp=100.5)
+        writer.record(b"pong", CLIENT, OUTGOING, timestamp=100.6)
+        writer.record(PING, CLIENT6, timestamp=101.0)
+    return str(path)
+
+
+def test_write_read(tmpdir):
+    path = write_capture(tmpdir.join("capture.rak"))
+    with CaptureReader(path) as reader:
+        datagrams = [(datagram.timestamp, datagram.addr, datagram.direction, bytes(datagram.data))
+                     for datagram in reader]
+    assert datagrams == [
+        (100.0, CLIENT, INCOMING, PING),
+        (100.5, CLIENT6, INCOMING, b"\xff\xff"),
+        (100.6, CLIENT, OUTGOING, b"pong"),
+        (101.0, CLIENT6, INCOMING, PING),
+    ]
+    assert not reader.truncated
+
+    # appending keeps the records already written
+    with CaptureWriter(path) as writer:
+        writer.record(b"more", CLIENT, timestamp=102.0)
+    with CaptureReader(path) as reader:
+        assert [bytes(datagram.data) for datagram in reader][-2:] == [PING, b"more"]
+
+
+def test_data_are_views(tmpdir):
+    path = write_capture(tmpdir.join("capture.rak"))
+    reader = CaptureReader(path)
+    datagram = next(iter(reader))
+    assert isinstance(datagram.data, memoryview)
+    del datagram
+    reader.close()
+
+
+def test_truncated(tmpdir):
+    path = write_capture(tmpdir.join("capture.rak"))
+    with open(path, "rb") as capture:
+        data = capture.read()
+    with open(path, "wb") as capture:
+        capture.write(data[:-3])
+    with CaptureReader(path) as reader:
+        assert len(list(reader)) == 3
+        assert reader.truncated
+
+    # the incomplete record is dropped before appending
+    with CaptureWriter(path) as writer:
+        writer.record(b"more", CLIENT, timestamp=102.0)
+    with CaptureReader(path) as reader:
+        assert [bytes(datagram.data) for datagram in reader][-2:] == [b"pong", b"more"]
+        assert not reader.truncated
+
+
+def test_invalid_files(tmpdir):
+    path = tmpdir.join("junk")
+    path.write_binary(b"not a capture file at all")
+    with pytest.raises(CaptureFormatError):
+        CaptureReader(str(path))
+    with pytest.raises(CaptureFormatError):
+        CaptureWriter(str(path))
+    empty = tmpdir.join("empty")
+    empty.write_binary(b"")
+    with pytest.raises(CaptureFormatError):
+        CaptureReader(str(empty))
+
+
+def test_replay_decode(tmpdir):
+    path = write_capture(tmpdir.join("capture.rak"))
+    with CaptureWriter(path) as writer:
+        writer.record(b"", CLIENT, timestamp=102.0)
+    stats = DecodeStats()
+    with CaptureReader(path) as reader:
+        assert capture.replay(reader, stats.datagram_received) == 4
+    assert stats.packets == {"UnconnectedPing": 2}
+    assert stats.errors == {"UnknownPacketException": 1, "EndOfStreamException": 1}
+
+
+def test_replay_timing(tmpdir):
+    path = write_capture(tmpdir.join("capture.rak"))
+    now = [0.0]
+    sleeps = []
+
+    def sleep(delay):
+        sleeps.append(delay)
+        now[0] += delay
+
+    received = []
+    with CaptureReader(path) as reader:
+        capture.replay(reader, lambda data, addr: received.append(now[0]), speed=2.0, now=lambda: now[0],
+                       sleep=sleep)
+    assert received == [0.0, 0.25, 0.5]
+    assert sleeps == [0.25, 0.25]
+
+
+@pytest.mark.parametrize("speed", [0, -1.0, float("nan")])
+def test_replay_invalid_speed(tmpdir, speed):
+    path = write_capture(tmpdir.join("capture.rak"))
+    with CaptureReader(path) as reader:
+        with pytest.raises(ValueError):
+            capture.replay(reader, lambda data, addr: None, speed=speed)
+    with pytest.raises(SystemExit):
+        capture.main(["replay", path, "--speed", str(speed)])
+
+
+def test_record_and_replay_server(tmpdir):
+    path = str(tmpdir.join("capture.rak"))
+    with CaptureWriter(path, now=lambda: 1.0) as writer:
+        protocol = capture.recording_protocol(ServerProtocol, writer)(server_guid=42, server_name="MCPE")
+        protocol.connection_made(NullTransport())
+        protocol.datagram_received(PING, CLIENT)
+        protocol.datagram_received(b"\x00junk", CLIENT)
+    with CaptureReader(path) as reader:
+        assert [(datagram.direction, bytes(datagram.data)[:1]) for datagram in reader] == [
+            (INCOMING, b"\x01"), (OUTGOING, b"\x1c"), (INCOMING, b"\x00")]
+
+        server = ServerProtocol(server_guid=42, server_name="MCPE")
+        transport = NullTransport()
+        server.connection_made(transport)
+        assert capture.replay(reader, server.datagram_received) == 2
+    assert server.replies_sent == transport.datagrams_sent == 1
+
+
+def test_main(tmpdir, capsys):
+    path = write_capture(tmpdir.join("capture.rak"))
+    assert capture.main(["info", path]) == 0
+    assert "incoming: 3, outgoing: 1" in capsys.readouterr().out
+    assert capture.main(["replay", path, "--lazy"]) == 0
+    assert "replayed 3 datagrams" in capsys.readouterr().out
+    assert capture.main(["replay", path, "--server"]) == 0
+    assert "replies: 2" in capsys.readouterr().out
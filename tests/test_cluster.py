@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import socket
+import struct
+import time
+
+import pytest
+
+from rakpy.cluster import SERVER_NAME_OFFSET, VERSION_OFFSET, Cluster, SharedArea
+from rakpy.protocol import decode_packet, packets
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="SO_REUSEPORT is not available")
+
+
+def test_shared_area():
+    shared = SharedArea(workers=3)
+    assert shared.snapshot() == {"datagrams_received": 0, "replies_sent": 0, "decode_errors": 0, "offline_dropped": 0,
+                                 "sessions": 0}
+    shared.set(0, "datagrams_received", 5)
+    shared.set(2, "datagrams_received", 7)
+    shared.set(1, "sessions", 1)
+    assert shared.get(2, "datagrams_received") == 7
+    assert shared.total("datagrams_received") == 12
+    assert shared.snapshot()["sessions"] == 1
+
+    assert not shared.shutdown
+    shared.shutdown = True
+    assert shared.shutdown
+
+    shared.set_server_name("MCPE;héllo")
+    assert shared.get_server_name() == "MCPE;héllo"
+    assert shared.server_name_version == 2
+    shared.set_server_name("MCPE")
+    assert shared.get_server_name() == "MCPE"
+    with pytest.raises(ValueError):
+        shared.set_server_name("x" * 2000)
+    shared.close()
+
+
+def test_shared_area_writer_died():
+    shared = SharedArea(workers=1)
+    shared.set_server_name("MCPE")
+    assert shared.get_server_name() == "MCPE"
+    # a writer killed in the middle of set_server_name leaves an odd version
+    shared.map[VERSION_OFFSET:VERSION_OFFSET + 8] = struct.pack(str("=Q"), shared.server_name_version + 1)
+    shared.map[SERVER_NAME_OFFSET:SERVER_NAME_OFFSET + 4] = b"\xff\xffCP"
+    assert shared.get_server_name(retries=10) == "MCPE"
+    # nothing read consistently before: the last (torn) value read
+    shared._server_name = None
+    assert shared.get_server_name(retries=10) == "\ufffd\ufffdCP"
+    shared.close()
+
+
+def ping(address, clients=8, timeout=5.0):
+    """
+    Ping address from several client sockets (so they hash to different workers), return the pongs
+    """
+    pongs = []
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(clients)]
+    try:
+        for index, sock in enumerate(sockets):
+            sock.settimeout(timeout)
+            sock.sendto(packets.UnconnectedPing(time=index, client_guid=index).encode(), address)
+        for sock in sockets:
+            pongs.append(decode_packet(sock.recv(2048)))
+    finally:
+        for sock in sockets:
+            sock.close()
+    return pongs
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_cluster():
+    cluster = Cluster("127.0.0.1", 0, workers=2, server_guid=42, server_name="MCPE;cluster", stats_interval=0.02)
+    cluster.start()
+    try:
+        assert cluster.port != 0
+        assert len(cluster.pids) == 2
+
+        pongs = ping(cluster.address)
+        assert sorted(pong.ping_time for pong in pongs) == list(range(8))
+        assert set((pong.server_guid, pong.server_name) for pong in pongs) == {(42, "MCPE;cluster")}
+        assert wait_for(lambda: cluster.stats()["replies_sent"] == 8)
+        assert cluster.stats()["datagrams_received"] == 8
+
+        cluster.server_name = "MCPE;renamed"
+        time.sleep(0.2)
+        assert set(pong.server_name for pong in ping(cluster.address)) == {"MCPE;renamed"}
+    finally:
+        statuses = cluster.stop()
+    assert list(statuses.values()) == [0, 0]
+    assert cluster.pids == []
+    assert cluster.stats()["replies_sent"] == 16
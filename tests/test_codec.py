@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+from rakpy.io import EndOfStreamException
+from rakpy.protocol import packets
+from rakpy.protocol.codec import StructStep, FieldStep
+from rakpy.protocol.const import MAGIC
+
+
+def test_unconnected_ping_is_a_single_struct():
+    codec = packets.UnconnectedPing._meta.codec
+    assert len(codec.steps) == 1
+    step = codec.steps[0]
+    assert type(step) == StructStep
+    assert step.struct.format in ("!xQ16sq", b"!xQ16sq")
+    assert step.struct.size == 1 + 8 + len(MAGIC) + 8
+
+
+def test_unconnected_pong_falls_back_for_string():
+    codec = packets.UnconnectedPong._meta.codec
+    assert [type(step) for step in codec.steps] == [StructStep, FieldStep]
+    assert codec.steps[0].names == ("ping_time", "server_guid", "__magic__")
+    assert codec.steps[1].name == "server_name"
+
+
+def test_variable_length_first_field():
+    codec = packets.Acknowledge._meta.codec
+    assert [type(step) for step in codec.steps] == [StructStep, FieldStep]
+    assert codec.steps[0].names == ()
+    assert codec.steps[0].struct.size == 1
+
+
+def test_decode_unconnected_pong():
+    data = b"\x1c" + b"\x00" * 7 + b"\x2a" + b"\x00" * 7 + b"\x07" + MAGIC + b"\x00\x04MCPE"
+    packet = packets.UnconnectedPong(data)
+    assert packet.ping_time == 42
+    assert packet.server_guid == 7
+    assert packet.server_name == "MCPE"
+
+    # server_name is optional
+    packet = packets.UnconnectedPong(data[:-6])
+    assert packet.server_name is None
+
+
+def test_decode_open_connection_reply_1():
+    data = b"\x06" + MAGIC + b"\x00" * 7 + b"\x01" + b"\x01" + b"\x05\xd4"
+    packet = packets.OpenConnectionReply1(data)
+    assert packet.server_guid == 1
+    assert packet.use_security is True
+    assert packet.mtu_size == 1492
+
+
+def test_decode_invalid_magic():
+    data = b"\x01" + b"\x00" * 8 + b"\x42" * len(MAGIC) + b"\x00" * 8
+    with pytest.raises(ValueError):
+        packets.UnconnectedPing(data)
+
+
+def test_decode_truncated():
+    data = b"\x01" + b"\x00" * 8 + MAGIC + b"\x00" * 7
+    with pytest.raises(EndOfStreamException):
+        packets.UnconnectedPing(data)
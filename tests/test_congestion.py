@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import random
+
+import pytest
+
+from rakpy.connection.ack import ReceiveTracker
+from rakpy.connection.congestion import CongestionControl, RateLimit, SlidingWindow
+from rakpy.connection.reliability import RttEstimator, SendWindow
+from rakpy.connection.scheduler import OutgoingScheduler
+from rakpy.connection.timer import TimerWheel
+from rakpy.protocol import decode_packet, packets
+from rakpy.protocol.datagram import Datagram
+
+MTU_SIZE = 1492
+TICK = 0.01
+
+
+class Link(object):
+    """
+    Simulated one way link: a bottleneck of `rate` bytes per second with a `buffer` bytes drop tail queue,
+    `delay` seconds of propagation and random losses
+    """
+    def __init__(self, rng, rate=200000, buffer=20000, delay=0.05, loss=0.0):
+        self.rng = rng
+        self.rate = rate
+        self.buffer = buffer
+        self.delay = delay
+        self.loss = loss
+        self.busy_until = 0.0
+        self.in_transit = []
+        self.dropped = 0
+
+    def send(self, data, now):
+        data = bytes(data)
+        backlog = max(self.busy_until - now, 0.0) * self.rate
+        if backlog + len(data) > self.buffer or self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        self.busy_until = max(self.busy_until, now) + len(data) / float(self.rate)
+        self.in_transit.append((self.busy_until + self.delay, data))
+
+    def receive(self, now):
+        arrived = [data for deadline, data in self.in_transit if deadline <= now]
+        self.in_transit = [(deadline, data) for deadline, data in self.in_transit if deadline > now]
+        return arrived
+
+
+def simulate(congestion, messages=300, size=1000, loss=0.0, seed=1, limit=60.0):
+    """
+    Send messages reliably over a simulated link, return (time to deliver all of them, stats)
+    """
+    rng = random.Random(seed)
+    forward = Link(rng, loss=loss)
+    backward = Link(rng, loss=loss)
+    now = 0.0
+    window = SendWindow(rtt=RttEstimator(initial_rto=0.5), wheel=TimerWheel(now=now))
+    scheduler = OutgoingScheduler(window, lambda data: forward.send(data, now), MTU_SIZE, congestion)
+    tracker = ReceiveTracker()
+    delivered = set()
+    peak_in_flight = 0
+
+    for index in range(messages):
+        scheduler.queue(b"%05d" % index + b"x" * (size - 5), now=now)
+    while len(delivered) < messages and now < limit:
+        now += TICK
+        for data in forward.receive(now):
+            datagram = Datagram.decode(data)
+            if tracker.add(datagram.sequence_number):
+                delivered.update(bytes(frame.payload[:5]) for frame in datagram.frames)
+        for packet in tracker.tick():
+            backward.send(packet.encode(), now)
+        for data in backward.receive(now):
+            packet = decode_packet(data)
+            if isinstance(packet, packets.Acknowledge):
+                scheduler.on_acknowledge(packet, now)
+            else:
+                scheduler.on_unacknowledge(packet, now)
+        scheduler.tick(now)
+        peak_in_flight = max(peak_in_flight, window.bytes_in_flight)
+
+    assert len(delivered) == messages
+    return now, {"dropped": forward.dropped, "sent": scheduler.datagrams_sent, "peak_in_flight": peak_in_flight,
+                 "blocked": scheduler.blocked}
+
+
+def test_sliding_window_slow_start():
+    congestion = SlidingWindow(1000)
+    assert congestion.slow_start
+    assert congestion.can_send(0, 1400, 0.0)
+    assert not congestion.can_send(500, 1000, 0.0)
+    for _ in range(3):
+        congestion.on_ack(1000, 0.1, 0.0)
+    assert congestion.window == 4000
+    assert congestion.can_send(3000, 1000, 0.0)
+
+
+def test_sliding_window_aimd():
+    congestion = SlidingWindow(1000, initial_window=16000)
+    congestion.on_ack(1000, 0.1, 0.0)
+    congestion.on_nak(1.0)
+    assert congestion.window == congestion.ssthresh == 8500
+    assert not congestion.slow_start
+    # same congestion event (within one RTT)
+    congestion.on_nak(1.05)
+    assert congestion.window == 8500
+    congestion.on_ack(1000, 0.1, 1.1)
+    assert congestion.window == pytest.approx(8500 + 1000 * 1000 / 8500.0)
+    congestion.on_nak(1.2)
+    assert congestion.window == pytest.approx((8500 + 1000 * 1000 / 8500.0) / 2)
+    congestion.on_timeout(2.0)
+    assert congestion.window == 1000
+    assert congestion.slow_start
+
+
+def test_rate_limit():
+    congestion = RateLimit(10000, burst=2000, increase=100)
+    assert congestion.can_send(0, 1500, 0.0)
+    congestion.on_sent(1500, 0.0)
+    assert not congestion.can_send(0, 1500, 0.05)
+    assert congestion.can_send(0, 1500, 0.1)
+    congestion.on_ack(1500, 0.1, 0.1)
+    assert congestion.rate == 10100
+    congestion.on_nak(0.2)
+    assert congestion.rate == 5050
+    for _ in range(10):
+        congestion.on_timeout(0.3)
+    assert congestion.rate == congestion.min_rate
+
+
+@pytest.mark.parametrize("loss", [0.0, 0.05])
+def test_sliding_window_limits_losses(loss):
+    _, uncontrolled = simulate(CongestionControl(), loss=loss)
+    _, controlled = simulate(SlidingWindow(MTU_SIZE), loss=loss)
+    assert controlled["blocked"] > 0
+    assert controlled["peak_in_flight"] < uncontrolled["peak_in_flight"] / 2
+    assert controlled["dropped"] < uncontrolled["dropped"] / 2
+    assert controlled["sent"] < uncontrolled["sent"]
+
+
+def test_rate_limit_delivers():
+    elapsed, stats = simulate(RateLimit(100000), loss=0.05)
+    _, uncontrolled = simulate(CongestionControl(), loss=0.05)
+    assert stats["dropped"] < uncontrolled["dropped"]
+    # 300 KB at no more than ~200 KB/s
+    assert elapsed > 1.5
+
+
+def test_deterministic():
+    assert simulate(SlidingWindow(MTU_SIZE), loss=0.1) == simulate(SlidingWindow(MTU_SIZE), loss=0.1)
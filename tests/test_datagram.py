@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+from rakpy.io import EndOfStreamException
+from rakpy.protocol import decode_packet, packets
+from rakpy.protocol.const import reliability
+from rakpy.protocol.datagram import Datagram, Frame
+
+
+def test_decode():
+    data = bytearray(
+        b"\x84\x01\x00\x00"  # flags, sequence number 1
+        b"\x60\x00\x48\x02\x00\x00\x03\x00\x00\x00"  # RELIABLE_ORDERED, 72 bits, reliable 2, order 3, channel 0
+        b"\x00\x00\x00\x00\x00\x00\x00\x00\x2a"  # ConnectedPing(time=42)
+        b"\x00\x00\x08\x15"  # UNRELIABLE, 8 bits, DisconnectionNotification
+    )
+    datagram = decode_packet(data)
+    assert type(datagram) == Datagram
+    assert datagram.flags == 0x84
+    assert datagram.sequence_number == 1
+    assert len(datagram.frames) == 2
+
+    frame = datagram.frames[0]
+    assert frame.reliability == reliability.RELIABLE_ORDERED
+    assert frame.reliable_index == 2
+    assert frame.sequence_index is None
+    assert frame.order_index == 3
+    assert frame.order_channel == 0
+    assert not frame.has_split
+    packet = decode_packet(frame.payload)
+    assert type(packet) == packets.ConnectedPing
+    assert packet.time == 42
+
+    frame = datagram.frames[1]
+    assert frame.reliability == reliability.UNRELIABLE
+    assert frame.reliable_index is None
+    assert frame.order_index is None
+    assert type(decode_packet(frame.payload)) == packets.DisconnectionNotification
+
+    # payloads are views over the datagram buffer
+    assert type(frame.payload) == memoryview
+    data[-1] = 0x42
+    assert frame.payload == b"\x42"
+
+
+@pytest.mark.parametrize("frame", [
+    Frame(b"\x15", reliability=reliability.UNRELIABLE),
+    Frame(b"\x15", reliability=reliability.UNRELIABLE_SEQUENCED, sequence_index=7, order_index=1, order_channel=3),
+    Frame(b"\x15", reliability=reliability.RELIABLE, reliable_index=16777215),
+    Frame(b"\x15", reliability=reliability.RELIABLE_ORDERED, reliable_index=5, order_index=65536, order_channel=31),
+    Frame(b"\x15", reliability=reliability.RELIABLE_SEQUENCED, reliable_index=5, sequence_index=6, order_index=7,
+          order_channel=0),
+    Frame(b"\x00" * 1000, reliability=reliability.RELIABLE_ORDERED, reliable_index=5, order_index=9, order_channel=0,
+          split_count=3, split_id=12, split_index=2),
+])
+def test_encode_decode(frame):
+    datagram = Datagram(sequence_number=0x123456, frames=[frame, frame])
+    data = datagram.encode()
+    assert len(data) == datagram.encoded_size()
+
+    decoded = Datagram.decode(bytes(data))
+    assert decoded.sequence_number == 0x123456
+    assert len(decoded.frames) == 2
+    for decoded_frame in decoded.frames:
+        for name in Frame.__slots__:
+            assert getattr(decoded_frame, name) == getattr(frame, name)
+
+
+def test_decode_from_offset():
+    datagram = Datagram(sequence_number=3, frames=[Frame(b"\x15")])
+    buffer = bytearray(100)
+    end = datagram.encode_into(buffer, 10)
+    decoded, offset = Datagram.decode_from(memoryview(buffer), 10, end)
+    assert offset == end
+    assert decoded.sequence_number == 3
+    assert decoded.frames[0].payload == b"\x15"
+
+
+def test_decode_invalid():
+    # not a data datagram
+    with pytest.raises(ValueError):
+        Datagram.decode(b"\xc0\x00\x00\x00")
+
+    # truncated header
+    with pytest.raises(EndOfStreamException):
+        Datagram.decode(b"\x84\x00")
+
+    # truncated payload
+    with pytest.raises(EndOfStreamException):
+        Datagram.decode(b"\x84\x00\x00\x00\x00\x00\x10\x15")
@@ -2,6 +2,7 @@
 from __future__ import unicode_literals
 
 import datetime
+import pickle
 import pytest
 
 from rakpy.io import EndOfStreamException
@@ -340,11 +341,18 @@ def test_options_field(encoded, decoded):
     field = fields.OptionsField()
     assert field.encode(decoded) == encoded
     assert field.decode(encoded) == decoded
+    buffer = bytearray(b"\xff\xff")
+    assert field.encode_into(decoded, buffer, 1) == 2
+    assert buffer == b"\xff" + encoded
 
 
 address_field_data = [
     (Address(ip="127.0.0.1", port=19132, version=4), b"\x04\x7f\x00\x00\x01\x4a\xbc"),
-    (Address(ip="192.168.0.42", port=29132, version=4), b"\x04\xc0\xa8\x00\x2a\x71\xcc")
+    (Address(ip="192.168.0.42", port=29132, version=4), b"\x04\xc0\xa8\x00\x2a\x71\xcc"),
+    (Address(ip="::1", port=19132, version=6),
+        b"\x06\x17\x00\x4a\xbc\x00\x00\x00\x00" + b"\x00" * 15 + b"\x01\x00\x00\x00\x00"),
+    (Address(ip="fe80::1:2", port=29132, version=6, flowinfo=7, scope_id=2),
+        b"\x06\x17\x00\x71\xcc\x00\x00\x00\x07\xfe\x80" + b"\x00" * 10 + b"\x00\x01\x00\x02\x00\x00\x00\x02"),
 ]
 
 
@@ -352,7 +360,34 @@ address_field_data = [
 def test_address_field(encoded, decoded):
     field = fields.AddressField()
     assert field.encode(decoded) == encoded
+    assert fields.AddressField.encode(decoded) == encoded
     assert field.decode(encoded) == decoded
+    assert field.encoded_size(decoded) == len(encoded)
+    assert field.skip(b"\xaa" + encoded, 1) == 1 + len(encoded)
+
+
+def test_encode_on_class():
+    # encode is a classmethod, like decode, for the fields whose encoding does not depend on options
+    assert fields.RangeListField.encode([]) == b"\x00\x00"
+    assert fields.AddressField.encode(Address(ip="127.0.0.1", port=19132)) == b"\x04\x7f\x00\x00\x01\x4a\xbc"
+    assert fields.UnsignedShortField.encode(1) == b"\x00\x01"
+
+
+@pytest.mark.parametrize("encoded", [b"\x05\x7f\x00\x00\x01\x4a\xbc", b"\x06\x17\x00\x4a\xbc"])
+def test_address_field_invalid(encoded):
+    with pytest.raises((ValueError, EndOfStreamException)):
+        fields.AddressField.decode(encoded)
+
+
+@pytest.mark.parametrize("address", [
+    Address(ip="::1", port=1, version=4),
+    Address(ip="1.2.3", port=1, version=4),
+    Address(ip="1.2.3.4", port=1, version=6),
+    Address(ip="1.2.3.4", port=1, version=5),
+])
+def test_address_field_encode_invalid(address):
+    with pytest.raises(ValueError):
+        fields.AddressField().encode(address)
 
 
 range_list_field_data = [
@@ -362,6 +397,7 @@ range_list_field_data = [
     ([Range(min_index=5373952, max_index=5373952), Range(min_index=7471104, max_index=7536640)],
         b"\x00\x02\x01\x52\x00\x00\x00\x72\x00\x00\x73\x00\x00"),
     ([Range(min_index=9568256, max_index=9568256)], b"\x00\x01\x01\x92\x00\x00"),
+    ([Range(min_index=1, max_index=2)], b"\x00\x01\x00\x00\x00\x01\x00\x00\x02"),
 ]
 
 
@@ -369,6 +405,7 @@ range_list_field_data = [
 def test_range_list_field(encoded, decoded):
     field = fields.RangeListField()
     assert field.encode(decoded) == encoded
+    assert fields.RangeListField.encode(decoded) == encoded
     assert field.decode(encoded) == decoded
 
 
@@ -409,3 +446,101 @@ def test_date_time_field():
     decoded = datetime.datetime(year=2016, month=1, day=1, microsecond=1)
     assert field.encode(decoded) == b"\x00\x05\x28\x39\x9d\x3f\xbc\x01"
     assert field.decode(b"\x00\x05\x28\x39\x9d\x3f\xbc\x01") == decoded
+
+
+@pytest.mark.parametrize("field,value", [
+    (fields.ByteField(), -42),
+    (fields.TriadField(), 16777215),
+    (fields.UnsignedShortField(), 19132),
+    (fields.LongLongField(), -1450258689827747),
+    (fields.FloatField(), 300),
+    (fields.BoolField(), True),
+    (fields.StringField(), "ボールト"),
+    (fields.OptionsField(), dict(has_split=True, reliability=0x03)),
+    (fields.AddressField(), Address(ip="192.168.0.42", port=29132, version=4)),
+    (fields.AddressField(), Address(ip="2001:db8::42", port=29132, version=6, flowinfo=1, scope_id=3)),
+    (fields.RangeListField(), [Range(min_index=i * 10, max_index=i * 10 + (i % 2) * 5) for i in range(1000)]),
+    (fields.PaddingField(offset=18), 1492),
+    (MagicField(), None),
+])
+def test_encode_into(field, value):
+    expected = field.encode(value)
+    assert field.encoded_size(value) == len(expected)
+
+    # encode at some offset of a larger, dirty buffer
+    buffer = bytearray(b"\xaa" * (len(expected) + 10))
+    assert field.encode_into(value, buffer, 3) == 3 + len(expected)
+    assert buffer[:3] == b"\xaa\xaa\xaa"
+    assert buffer[3:3 + len(expected)] == expected
+    assert buffer[3 + len(expected):] == b"\xaa" * 7
+
+    # memoryview
+    buffer = bytearray(len(expected))
+    assert field.encode_into(value, memoryview(buffer), 0) == len(expected)
+    assert buffer == expected
+
+
+@pytest.mark.parametrize("field,value", [
+    (fields.UnsignedShortField(), 19132),
+    (fields.StringField(), "Hello !"),
+    (fields.AddressField(), Address(ip="127.0.0.1", port=19132, version=4)),
+    (fields.AddressField(), Address(ip="2001:db8::42", port=29132, version=6, flowinfo=1, scope_id=3)),
+    (fields.RangeListField(), [Range(min_index=0, max_index=0)]),
+    (fields.PaddingField(), 10),
+])
+def test_encode_into_buffer_too_small(field, value):
+    buffer = bytearray(field.encoded_size(value) - 1)
+    with pytest.raises(EndOfStreamException):
+        field.encode_into(value, buffer, 0)
+
+
+@pytest.mark.parametrize("field,value", [
+    (fields.ByteField(), -42),
+    (fields.TriadField(), 16777215),
+    (fields.LongLongField(), -1450258689827747),
+    (fields.DoubleField(), 300.5),
+    (fields.BoolField(), True),
+    (fields.StringField(), "ボールト"),
+    (fields.OptionsField(), dict(has_split=True, reliability=0x03)),
+    (fields.AddressField(), Address(ip="192.168.0.42", port=29132, version=4)),
+    (fields.AddressField(), Address(ip="2001:db8::42", port=29132, version=6, flowinfo=1, scope_id=3)),
+    (fields.RangeListField(), [Range(min_index=1, max_index=1), Range(min_index=3, max_index=600)]),
+    (MagicField(), b""),
+])
+def test_decode_from(field, value):
+    encoded = field.encode(value)
+    buffer = memoryview(b"\xaa\xaa" + encoded + b"\xbb")
+    assert field.decode_from(buffer, 2) == (value, 2 + len(encoded))
+
+    # truncated
+    with pytest.raises(EndOfStreamException):
+        field.decode_from(buffer[:-2], 2)
+
+
+def test_compact_address():
+    address = fields.CompactAddress("192.168.0.42", 29132)
+    assert address.ip == "192.168.0.42"
+    assert address.port == 29132
+    assert address.ip_int == 0xc0a8002a
+    assert address.version == 4
+    assert str(address) == "192.168.0.42:29132"
+    assert address == fields.CompactAddress(0xc0a8002a, 29132)
+    assert address != fields.CompactAddress("192.168.0.42", 29133)
+    assert hash(address) == hash(fields.CompactAddress.from_address(Address(ip="192.168.0.42", port=29132)))
+    assert address.to_address() == Address(ip="192.168.0.42", port=29132, version=4)
+    assert {address: 1}[fields.CompactAddress("192.168.0.42", 29132)] == 1
+    assert pickle.loads(pickle.dumps(address)) == address
+    with pytest.raises(ValueError):
+        fields.CompactAddress("1.2.3.4", 65536)
+    with pytest.raises(AttributeError):
+        address.extra = 1
+
+
+def test_compact_address_field():
+    data = b"\x04\xc0\xa8\x00\x2a\x71\xcc"
+    address = fields.CompactAddressField.decode(data)
+    assert address == fields.CompactAddress("192.168.0.42", 29132)
+    assert bytes(fields.AddressField().encode(address)) == data
+    assert bytes(fields.CompactAddressField().encode(address)) == data
+    with pytest.raises(ValueError):
+        fields.CompactAddressField.decode(b"\x06" + data[1:])
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+from rakpy.io import EndOfStreamException
+from rakpy.protocol import decode_packet, packets
+from rakpy.protocol.const import MAGIC
+from rakpy.protocol.exceptions import RemainingDataException
+from rakpy.protocol.fields import Address, Range
+
+NEW_INCOMING_CONNECTION = packets.NewIncomingConnection(ping_time=1, pong_time=2, **dict(
+    [("address", Address(ip="127.0.0.1", port=19132))] +
+    [("system_address_{}".format(i), Address(ip="10.0.0.{}".format(i), port=i)) for i in range(10)]
+))
+
+
+@pytest.mark.parametrize("packet", [
+    NEW_INCOMING_CONNECTION,
+    packets.UnconnectedPong(ping_time=1, server_guid=2, server_name="MCPE;lazy"),
+    packets.OpenConnectionRequest2(server_address=Address(ip="1.2.3.4", port=5), mtu_size=1492, client_guid=42),
+    packets.OpenConnectionRequest2(server_address=Address(ip="fe80::1", port=5, version=6, scope_id=3), mtu_size=1492,
+                                   client_guid=42),
+    packets.Acknowledge(packet_ranges=[Range(1, 5), Range(7, 7)]),
+    packets.ConnectedPong(ping_time=42),
+])
+def test_lazy_decode(packet):
+    data = bytes(packet.encode())
+    lazy = decode_packet(data, lazy=True)
+    assert type(lazy) == type(packet)
+    for name in reversed(packet._meta.structure):
+        if name != "__magic__":
+            assert getattr(lazy, name) == getattr(packet, name)
+    lazy.validate()
+    assert lazy.encode() == packet.encode()
+
+
+def test_fields_are_decoded_on_access():
+    lazy = packets.NewIncomingConnection.decode_lazy(bytes(NEW_INCOMING_CONNECTION.encode()))
+    assert not lazy._is_set("ping_time")
+    assert lazy.ping_time == 1
+    # cached in its slot
+    assert [name for name in lazy._meta.fields if lazy._is_set(name)] == ["ping_time"]
+
+
+def test_offsets_after_variable_field():
+    pong = packets.UnconnectedPong(ping_time=1, server_guid=2, server_name="MCPE")
+    layout = packets.UnconnectedPong._meta.lazy
+    assert layout.offsets == [1, 9, 33, None]
+    assert layout.size is None
+
+    ack = packets.Acknowledge.decode_lazy(bytes(packets.Acknowledge(packet_ranges=[Range(1, 2)]).encode()))
+    assert ack.packet_ranges == [Range(1, 2)]
+    assert ack._lazy_offsets[-1] == 1 + 2 + 7
+    assert pong.server_name == "MCPE"
+
+
+def test_header_validation():
+    data = bytes(packets.OpenConnectionRequest2(server_address=Address(ip="1.2.3.4", port=5), mtu_size=1492,
+                                                client_guid=42).encode())
+    with pytest.raises(ValueError):
+        packets.OpenConnectionRequest1.decode_lazy(data)
+    with pytest.raises(ValueError):
+        packets.OpenConnectionRequest2.decode_lazy(data[:1] + b"\x00" * len(MAGIC) + data[1 + len(MAGIC):])
+    # fixed length packets are checked up front
+    reply = bytes(packets.OpenConnectionReply1(server_guid=1, use_security=False, mtu_size=1492).encode())
+    with pytest.raises(EndOfStreamException):
+        packets.OpenConnectionReply1.decode_lazy(reply[:-1])
+    with pytest.raises(RemainingDataException):
+        packets.OpenConnectionReply1.decode_lazy(reply + b"\x00")
+    # addresses may be IPv4 or IPv6: the length is only known once located
+    with pytest.raises(EndOfStreamException):
+        packets.OpenConnectionRequest2.decode_lazy(data[:-1]).validate()
+    with pytest.raises(RemainingDataException):
+        packets.OpenConnectionRequest2.decode_lazy(data + b"\x00").validate()
+
+
+def test_validation_on_demand():
+    data = bytes(packets.UnconnectedPong(ping_time=1, server_guid=2, server_name="MCPE").encode())
+    lazy = packets.UnconnectedPong.decode_lazy(data + b"junk")
+    assert lazy.ping_time == 1
+    with pytest.raises(RemainingDataException):
+        lazy.validate()
+
+    lazy = packets.UnconnectedPong.decode_lazy(data[:-1])
+    assert lazy.server_guid == 2
+    with pytest.raises(EndOfStreamException):
+        lazy.server_name
+
+
+def test_assigned_values_win():
+    lazy = packets.ConnectedPong.decode_lazy(bytes(packets.ConnectedPong(ping_time=42).encode()))
+    lazy.ping_time = 7
+    lazy.validate()
+    assert lazy.ping_time == 7
+    assert packets.ConnectedPong(lazy.encode()).ping_time == 7
+
+
+def test_eager_packets_are_unaffected():
+    packet = packets.ConnectedPong(ping_time=42)
+    assert packet.ping_time == 42
+    with pytest.raises(AttributeError):
+        packets.ConnectedPong.__new__(packets.ConnectedPong).ping_time
+    with pytest.raises(AttributeError):
+        packet.unknown_field
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+from rakpy import metrics
+from rakpy.connection.reliability import RttEstimator, SendWindow
+from rakpy.connection.timer import TimerWheel
+from rakpy.protocol import Packet, PacketRegistry, decode_packet, packets
+from rakpy.protocol.datagram import Datagram
+from rakpy.protocol.exceptions import RemainingDataException, UnknownPacketException
+from rakpy.protocol.fields import Range
+from rakpy.server import ServerProtocol
+
+CLIENT = ("10.0.0.1", 54321)
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append((bytes(data), addr))
+
+
+@pytest.fixture
+def enabled():
+    metrics.REGISTRY.reset()
+    metrics.enable()
+    yield metrics.REGISTRY
+    metrics.disable()
+    metrics.REGISTRY.reset()
+
+
+def test_histogram_buckets():
+    histogram = metrics.Histogram(max_value=1 << 20)
+    for value in range(1 << 12):
+        index = histogram.index(value)
+        low, high = histogram.bucket_range(index)
+        assert low <= value <= high
+        # within 1/16 of the value
+        assert high - low <= max(low // 16, 0)
+    assert histogram.bucket_range(histogram.index(1000) + 1)[0] == histogram.bucket_range(histogram.index(1000))[1] + 1
+
+
+def test_histogram_percentiles():
+    histogram = metrics.Histogram()
+    assert histogram.percentile(50) is None
+    for value in range(1, 1001):
+        histogram.record(value * 1000)
+    assert histogram.count == 1000
+    assert histogram.min == 1000
+    assert histogram.max == 1000000
+    assert histogram.percentile(50) == pytest.approx(500000, rel=1 / 16.0)
+    assert histogram.percentile(99) == pytest.approx(990000, rel=1 / 16.0)
+    assert histogram.percentile(100) == 1000000
+
+    # out of range values go to the last bucket
+    histogram.record(1 << 40)
+    assert histogram.counts[-1] == 1
+    assert histogram.max == 1 << 40
+
+    buckets = histogram.cumulative_buckets()
+    assert [bound for bound, count in buckets[:4]] == [1, 3, 7, 15]
+    counts = [count for bound, count in buckets]
+    assert counts == sorted(counts)
+    assert counts[-1] == 1000
+
+    other = metrics.Histogram()
+    other.record(1)
+    histogram.merge(other)
+    assert histogram.count == 1002
+    assert histogram.min == 1
+
+
+def test_disabled_by_default():
+    assert not metrics.is_enabled()
+    original = Packet.__dict__["_init_from_buffer"]
+    metrics.enable()
+    try:
+        assert metrics.is_enabled()
+        assert Packet.__dict__["_init_from_buffer"] is not original
+    finally:
+        metrics.disable()
+    assert Packet.__dict__["_init_from_buffer"] is original
+    assert "__missing__" not in PacketRegistry.__dict__
+
+
+def test_decode_metrics(enabled):
+    ping = bytes(packets.UnconnectedPing(time=1, client_guid=2).encode())
+    decode_packet(ping)
+    decode_packet(ping, lazy=True)
+    packets.ConnectedPong(bytes(packets.ConnectedPong(ping_time=1).encode()))
+    decode_packet(bytes(Datagram(frames=[]).encode()))
+    with pytest.raises(UnknownPacketException):
+        decode_packet(b"\x42")
+    with pytest.raises(RemainingDataException):
+        decode_packet(ping + b"\x00")
+
+    assert metrics.PACKETS_DECODED.snapshot() == {"UnconnectedPing": 2, "ConnectedPong": 1, "Datagram": 1}
+    assert metrics.DECODE_FAILURES.snapshot() == {"UnknownPacketException": 1, "RemainingDataException": 1}
+    latency = enabled.snapshot()["rakpy_decode_seconds"]
+    assert latency["UnconnectedPing"]["count"] == 2
+    assert latency["UnconnectedPing"]["min"] > 0
+
+
+def test_server_metrics(enabled):
+    protocol = ServerProtocol(server_guid=42, server_name="MCPE")
+    transport = FakeTransport()
+    protocol.connection_made(transport)
+    ping = bytes(packets.UnconnectedPing(time=1, client_guid=2).encode())
+    protocol.datagram_received(ping, CLIENT)
+    protocol.datagram_received(b"\xff", CLIENT)
+    [(pong, addr)] = transport.sent
+    assert metrics.DATAGRAMS_RECEIVED.get() == 2
+    assert metrics.BYTES_RECEIVED.get() == len(ping) + 1
+    assert metrics.DATAGRAMS_SENT.get() == 1
+    assert metrics.BYTES_SENT.get() == len(pong)
+
+
+def test_resend_metrics(enabled):
+    window = SendWindow(rtt=RttEstimator(initial_rto=0.5), wheel=TimerWheel(now=0.0))
+    for _ in range(3):
+        window.send([window.make_frame(b"data")], now=0.0)
+    window.on_nak([Range(0, 0)])
+    window.tick(now=1.0)
+    assert metrics.FRAMES_RESENT.snapshot() == {"nak": 1, "timeout": 2}
+
+
+def test_export_prometheus(enabled):
+    decode_packet(bytes(packets.ConnectedPing(time=1).encode()))
+    metrics.DECODE_FAILURES.inc(label='say "hi"')
+    text = metrics.export_prometheus()
+    lines = text.splitlines()
+    assert "# TYPE rakpy_packets_decoded_total counter" in lines
+    assert 'rakpy_packets_decoded_total{packet="ConnectedPing"} 1' in lines
+    assert 'rakpy_decode_failures_total{exception="say \\"hi\\""} 1' in lines
+    assert "rakpy_bytes_sent_total" not in [line.split(" ")[0] for line in lines]
+    assert "# TYPE rakpy_decode_seconds histogram" in lines
+    assert 'rakpy_decode_seconds_bucket{packet="ConnectedPing",le="+Inf"} 1' in lines
+    assert 'rakpy_decode_seconds_count{packet="ConnectedPing"} 1' in lines
+    assert 'rakpy_decode_seconds_bucket{packet="ConnectedPing",le="1e-09"} 0' in lines
+    assert text.endswith("\n")
+
+
+def test_export_prometheus_bucket_edges():
+    registry = metrics.Registry()
+    histogram = registry.histogram("size_bytes", "Sizes")
+    # le is inclusive: a value on a bucket edge is counted in that bucket
+    for value in (7, 8):
+        histogram.record(value)
+    lines = metrics.export_prometheus(registry).splitlines()
+    assert 'size_bytes_bucket{le="3.0"} 0' in lines
+    assert 'size_bytes_bucket{le="7.0"} 1' in lines
+    assert 'size_bytes_bucket{le="15.0"} 2' in lines
+
+
+def test_registry():
+    registry = metrics.Registry()
+    counter = registry.counter("requests_total", "Requests")
+    assert registry.counter("requests_total", "Requests") is counter
+    with pytest.raises(ValueError):
+        registry.histogram("requests_total", "Requests")
+    counter.inc(3)
+    registry.histogram("size_bytes", "Sizes").record(10)
+    assert registry.snapshot()["requests_total"] == {None: 3}
+    assert registry.snapshot()["size_bytes"][None]["max"] == 10
+    assert metrics.export_prometheus(registry).splitlines()[2] == "requests_total 3"
+    registry.reset()
+    assert registry.snapshot() == {"requests_total": {}, "size_bytes": {}}
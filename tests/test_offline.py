@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+from rakpy.protocol import decode_packet, packets
+from rakpy.protocol.const import MAGIC
+from rakpy.protocol.fields import Address
+from rakpy.protocol.offline import OfflineFilter
+
+OFFLINE_PACKETS = [
+    packets.UnconnectedPing(time=1, client_guid=2),
+    packets.UnconnectedPingOpenConnections(time=1, client_guid=2),
+    packets.OpenConnectionRequest1(protocol=10, mtu_size=1492),
+    packets.OpenConnectionRequest1(protocol=10, mtu_size=576),
+    packets.OpenConnectionRequest2(server_address=Address(ip="1.2.3.4", port=5), mtu_size=1492, client_guid=42),
+    packets.OpenConnectionRequest2(server_address=Address(ip="::1", port=5, version=6), mtu_size=1492, client_guid=42),
+    packets.UnconnectedPong(ping_time=1, server_guid=2, server_name=""),
+    packets.UnconnectedPong(ping_time=1, server_guid=2, server_name="MCPE;" * 100),
+]
+
+
+@pytest.mark.parametrize("packet", OFFLINE_PACKETS)
+def test_valid_packets_pass(packet):
+    offline_filter = OfflineFilter()
+    data = bytes(packet.encode())
+    assert offline_filter.accept(data)
+    assert offline_filter.accept(memoryview(data))
+    assert offline_filter.accepted == 2
+    assert offline_filter.dropped == 0
+    decode_packet(data)
+
+
+@pytest.mark.parametrize("packet", OFFLINE_PACKETS)
+def test_drop_reasons(packet):
+    offline_filter = OfflineFilter()
+    data = bytearray(packet.encode())
+    magic_offset = bytes(data).index(MAGIC)
+
+    assert not offline_filter.accept(data[:magic_offset + len(MAGIC)])
+    assert not offline_filter.accept(data + b"\x00" * 1500)
+    data[magic_offset + 3] ^= 0xff
+    assert not offline_filter.accept(data)
+    data[0] = 0x42
+    assert not offline_filter.accept(data)
+    assert offline_filter.drops() == dict(unknown_id=1, too_short=1, too_long=1, bad_magic=1)
+    assert offline_filter.dropped == 4
+    assert offline_filter.accepted == 0
+
+
+def test_ids():
+    offline_filter = OfflineFilter([packets.UnconnectedPing._meta.id, packets.ConnectedPing._meta.id])
+    assert offline_filter.accept(bytes(packets.UnconnectedPing(time=1, client_guid=2).encode()))
+    # only offline messages are filtered
+    assert not offline_filter.accept(bytes(packets.ConnectedPing(time=1).encode()))
+    pong = packets.UnconnectedPong(ping_time=1, server_guid=2, server_name="")
+    assert not offline_filter.accept(bytes(pong.encode()))
+    assert not offline_filter.accept(b"")
+    assert offline_filter.drops() == dict(unknown_id=2, too_short=1, too_long=0, bad_magic=0)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from rakpy.connection.ordering import OrderingBuffers, OrderingChannel
+from rakpy.protocol.const import reliability
+from rakpy.protocol.datagram import Frame
+
+
+def ordered(order_index, channel=0, payload=None):
+    payload = payload if payload is not None else b"o%d" % order_index
+    return Frame(payload, reliability.RELIABLE_ORDERED, reliable_index=0, order_index=order_index,
+                 order_channel=channel)
+
+
+def sequenced(order_index, sequence_index, channel=0, kind=reliability.UNRELIABLE_SEQUENCED):
+    return Frame(b"s%d.%d" % (order_index, sequence_index), kind, reliable_index=0, order_index=order_index,
+                 sequence_index=sequence_index, order_channel=channel)
+
+
+def test_in_order():
+    buffers = OrderingBuffers()
+    for index in range(5):
+        assert buffers.receive(ordered(index)) == [b"o%d" % index]
+    assert buffers.pending == 0
+
+
+def test_out_of_order():
+    buffers = OrderingBuffers()
+    assert buffers.receive(ordered(2)) == []
+    assert buffers.receive(ordered(1)) == []
+    assert buffers.pending == 2
+    assert buffers.receive(ordered(0)) == [b"o0", b"o1", b"o2"]
+    assert buffers.receive(ordered(4)) == []
+    assert buffers.receive(ordered(3)) == [b"o3", b"o4"]
+    assert buffers.pending == 0
+
+
+def test_held_payloads_are_copied():
+    buffer = bytearray(b"late")
+    buffers = OrderingBuffers()
+    assert buffers.receive(ordered(1, payload=memoryview(buffer))) == []
+    buffer[:] = b"XXXX"
+    assert buffers.receive(ordered(0)) == [b"o0", b"late"]
+
+
+def test_channels_are_independent():
+    buffers = OrderingBuffers()
+    assert buffers.receive(ordered(1, channel=0)) == []
+    assert buffers.receive(ordered(0, channel=31)) == [b"o0"]
+    assert buffers.receive(ordered(0, channel=0)) == [b"o0", b"o1"]
+    assert buffers.channels[1] is None
+
+
+def test_duplicates_and_stale():
+    buffers = OrderingBuffers()
+    assert buffers.receive(ordered(0)) == [b"o0"]
+    assert buffers.receive(ordered(0)) == []
+    assert buffers.receive(ordered(2)) == []
+    assert buffers.receive(ordered(2)) == []
+    assert buffers.stale == 2
+    assert buffers.pending == 1
+
+
+def test_hole_limit():
+    buffers = OrderingBuffers(window=8)
+    assert buffers.receive(ordered(7)) == []
+    assert buffers.receive(ordered(8)) == []
+    assert buffers.receive(ordered(100000)) == []
+    assert buffers.rejected == 2
+    assert buffers.pending == 1
+    assert buffers.receive(ordered(0)) == [b"o0"]
+    # the window moved with the expected index
+    assert buffers.receive(ordered(8)) == []
+    assert buffers.pending == 2
+
+
+def test_sequenced():
+    buffers = OrderingBuffers()
+    assert buffers.receive(sequenced(0, 0)) == [b"s0.0"]
+    assert buffers.receive(sequenced(0, 2)) == [b"s0.2"]
+    # older than the highest delivered sequence index
+    assert buffers.receive(sequenced(0, 1)) == []
+    assert buffers.receive(sequenced(0, 3, kind=reliability.RELIABLE_SEQUENCED)) == [b"s0.3"]
+    assert buffers.stale == 1
+
+    # an ordered frame starts a new sequence
+    assert buffers.receive(ordered(0)) == [b"o0"]
+    assert buffers.receive(sequenced(0, 5)) == []
+    assert buffers.receive(sequenced(1, 0)) == [b"s1.0"]
+
+
+def test_unordered_and_invalid():
+    buffers = OrderingBuffers()
+    assert buffers.receive(Frame(b"u", reliability.UNRELIABLE)) == [b"u"]
+    assert buffers.receive(Frame(b"r", reliability.RELIABLE, reliable_index=0)) == [b"r"]
+    assert buffers.receive(ordered(0, channel=32)) == []
+    assert buffers.invalid == 1
+
+
+def test_wraparound():
+    channel = OrderingChannel(window=16)
+    channel.expected = 0xfffffe
+    assert channel.add_ordered(0, b"c") == []
+    assert channel.add_ordered(0xffffff, b"b") == []
+    assert channel.add_ordered(0xfffffe, b"a") == [b"a", b"b", b"c"]
+    assert channel.expected == 0x1000001
@@ -4,9 +4,11 @@ from __future__ import unicode_literals
 import pytest
 import six
 
+from rakpy.io import EndOfStreamException
 from rakpy.protocol import decode_packet
 from rakpy.protocol.exceptions import UnknownPacketException, RemainingDataException
 from rakpy.protocol import packets
+from rakpy.protocol.fields import Address, Range
 
 
 def test_packet_id():
@@ -57,6 +59,24 @@ def test_decode_invalid_packet():
         decode_packet(b"\xff\x00\x00\x00\x00")
 
 
+@pytest.mark.parametrize("buffer_type", [bytes, bytearray, memoryview, lambda data: memoryview(bytearray(data))])
+@pytest.mark.parametrize("lazy", [False, True])
+def test_decode_buffer_types(buffer_type, lazy):
+    for packet in (packets.UnconnectedPong(ping_time=1, server_guid=2, server_name="MCPE;héllo"),
+                   packets.OpenConnectionRequest2(server_address=Address(ip="1.2.3.4", port=5), mtu_size=1492,
+                                                  client_guid=42)):
+        decoded = decode_packet(buffer_type(bytes(packet.encode())), lazy=lazy)
+        assert type(decoded) == type(packet)
+        for name in packet._meta.fields:
+            assert getattr(decoded, name) == getattr(packet, name)
+
+
+def test_decode_empty_packet():
+    for lazy in (False, True):
+        with pytest.raises(EndOfStreamException):
+            decode_packet(b"", lazy=lazy)
+
+
 def test_decode_packed_with_remaining_data():
     data = (
         b"\x01\x00\x00\x00\x00\x00\x02\xf3\x47\x00\xff\xff\x00\xfe\xfe\xfe\xfe"
@@ -70,3 +90,115 @@ def test_decode_disconnection_notification():
     packet = decode_packet(b"\x15")
     assert packet.id == 0x15
     assert type(packet) == packets.DisconnectionNotification
+
+
+def test_init_from_values():
+    packet = packets.UnconnectedPong(ping_time=193351, server_guid=1450258689827742)
+    assert packet.ping_time == 193351
+    assert packet.server_guid == 1450258689827742
+    assert packet.server_name is None
+
+    with pytest.raises(TypeError):
+        packets.UnconnectedPong(ping_time=193351, foo=42)
+
+
+def test_encode_unconnected_ping():
+    data = (
+        b"\x01\x00\x00\x00\x00\x00\x02\xf3\x47\x00\xff\xff\x00\xfe\xfe\xfe\xfe"
+        b"\xfd\xfd\xfd\xfd\x12\x34\x56\x78\x00\x05\x27\x00\xaa\x0a\x23\xa3"
+    )
+    packet = packets.UnconnectedPing(time=193351, client_guid=1450258689827747)
+    encoded = packet.encode()
+    assert type(encoded) == bytearray
+    assert encoded == data
+
+
+def test_encode_unconnected_pong():
+    packet = packets.UnconnectedPong(ping_time=193351, server_guid=1450258689827742, server_name="MCPE;Hello")
+    encoded = packet.encode()
+    assert encoded[0:1] == b"\x1c"
+    assert encoded[-12:] == b"\x00\x0aMCPE;Hello"
+    decoded = decode_packet(bytes(encoded))
+    assert decoded.ping_time == 193351
+    assert decoded.server_guid == 1450258689827742
+    assert decoded.server_name == "MCPE;Hello"
+
+    # optional string is omitted
+    packet = packets.UnconnectedPong(ping_time=1, server_guid=2)
+    assert decode_packet(bytes(packet.encode())).server_name is None
+
+
+@pytest.mark.parametrize("packet", [
+    packets.Acknowledge(packet_ranges=[Range(min_index=1, max_index=1), Range(min_index=3, max_index=600)]),
+    packets.ConnectionRequest(client_guid=42, time=1234, use_security=False),
+    packets.DisconnectionNotification(),
+    packets.NewIncomingConnection(ping_time=1, pong_time=2, **dict(
+        [("address", Address(ip="127.0.0.1", port=19132))] +
+        [("system_address_{}".format(i), Address(ip="10.0.0.{}".format(i), port=i)) for i in range(10)]
+    )),
+    packets.OpenConnectionReply1(server_guid=42, use_security=False, mtu_size=1492),
+    packets.OpenConnectionReply2(server_guid=42, address=Address(ip="1.2.3.4", port=5), mtu_size=1492,
+                                 use_security=True),
+    packets.OpenConnectionRequest1(protocol=7, mtu_size=1492),
+    packets.OpenConnectionRequest2(server_address=Address(ip="1.2.3.4", port=5), mtu_size=1492, client_guid=42),
+    packets.ConnectedPong(ping_time=42),
+])
+def test_encode_decode(packet):
+    decoded = decode_packet(bytes(packet.encode()))
+    assert type(decoded) == type(packet)
+    for name in packet._meta.fields:
+        assert getattr(decoded, name) == getattr(packet, name)
+
+
+def test_class_names():
+    # field names must not leak into the class name (Python 2 list comprehensions)
+    for name in ("UnconnectedPong", "OpenConnectionReply2", "DisconnectionNotification"):
+        assert getattr(packets, name).__name__ == name
+    pong = packets.UnconnectedPong(ping_time=1, server_guid=2, server_name="MCPE")
+    assert repr(pong).startswith("UnconnectedPong(")
+
+
+def test_encode_overflow():
+    with pytest.raises(OverflowError):
+        packets.OpenConnectionReply1(server_guid=42, use_security=False, mtu_size=65536).encode()
+    # same range as fields.LongLongField().encode, although struct would pack it
+    with pytest.raises(OverflowError):
+        packets.UnconnectedPing(time=1, client_guid=-2 ** 63).encode()
+    with pytest.raises(TypeError, match="mtu_size"):
+        packets.OpenConnectionReply1(server_guid=42, use_security=False).encode()
+
+
+def test_encode_into():
+    ping = packets.UnconnectedPing(time=193351, client_guid=1450258689827747)
+    pong = packets.UnconnectedPong(ping_time=193351, server_guid=1450258689827742, server_name="MCPE")
+
+    buffer = bytearray(1500)
+    offset = ping.encode_into(buffer)
+    assert offset == ping.encoded_size()
+    end = pong.encode_into(memoryview(buffer), offset)
+    assert end == offset + pong.encoded_size()
+    assert buffer[:offset] == ping.encode()
+    assert buffer[offset:end] == pong.encode()
+
+    # buffer too small
+    with pytest.raises(EndOfStreamException):
+        ping.encode_into(bytearray(10))
+
+
+def test_decode_from():
+    ping = packets.UnconnectedPing(time=193351, client_guid=1450258689827747)
+    buffer = bytearray(100)
+    end = ping.encode_into(buffer, 10)
+
+    packet, offset = packets.UnconnectedPing.decode_from(memoryview(buffer), 10)
+    assert offset == end
+    assert packet.time == 193351
+    assert packet.client_guid == 1450258689827747
+
+
+def test_packets_have_slots():
+    packet = packets.UnconnectedPing(time=1, client_guid=2)
+    assert not hasattr(packet, "__dict__")
+    assert packets.UnconnectedPing.__slots__ == ("time", "client_guid")
+    with pytest.raises(AttributeError):
+        packet.not_a_field = 1
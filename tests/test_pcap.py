@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import socket
+import struct
+
+import pytest
+
+from rakpy.protocol import packets
+from rakpy.tools import pcap
+from rakpy.tools.pcap import PcapFormatError, PcapReader
+
+PING = bytes(packets.UnconnectedPing(time=1, client_guid=2).encode())
+PONG = bytes(packets.UnconnectedPong(ping_time=1, server_guid=3, server_name="MCPE").encode())
+
+
+def udp(payload, src_port=54321, dst_port=19132):
+    return struct.pack("!HHHH", src_port, dst_port, 8 + len(payload), 0) + payload
+
+
+def ipv4(payload, src="10.0.0.1", dst="10.0.0.2", protocol=17, flags=0):
+    header = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(payload), 0, flags, 64, protocol, 0,
+                         socket.inet_aton(src), socket.inet_aton(dst))
+    return header + payload
+
+
+def ipv6(payload, src="2001:db8::1", dst="2001:db8::2", next_header=17, extension=False):
+    if extension:
+        # hop-by-hop options header, 8 bytes
+        payload = struct.pack("!BB6x", next_header, 0) + payload
+        next_header = 0
+    return struct.pack("!IHBB16s16s", 6 << 28, len(payload), next_header, 64, socket.inet_pton(socket.AF_INET6, src),
+                       socket.inet_pton(socket.AF_INET6, dst)) + payload
+
+
+def ethernet(payload, ethertype=0x0800, vlan=False):
+    header = b"\x00" * 12
+    if vlan:
+        header += struct.pack("!HH", 0x8100, 42)
+    return header + struct.pack("!H", ethertype) + payload
+
+
+FRAMES = [
+    (pcap.LINKTYPE_ETHERNET, ethernet(ipv4(udp(PING)))),
+    (pcap.LINKTYPE_ETHERNET, ethernet(ipv4(udp(PONG, 19132, 54321), "10.0.0.2", "10.0.0.1"), vlan=True)),
+    (pcap.LINKTYPE_ETHERNET, ethernet(ipv6(udp(PING), extension=True), 0x86dd)),
+    # another port, TCP, a fragment, ARP, a garbage payload, an empty payload
+    (pcap.LINKTYPE_ETHERNET, ethernet(ipv4(udp(PING, 1, 2)))),
+    (pcap.LINKTYPE_ETHERNET, ethernet(ipv4(b"\x00" * 20, protocol=6))),
+    (pcap.LINKTYPE_ETHERNET, ethernet(ipv4(udp(PING), flags=0x2000))),
+    (pcap.LINKTYPE_ETHERNET, ethernet(b"\x00" * 28, 0x0806)),
+    (pcap.LINKTYPE_ETHERNET, ethernet(ipv4(udp(b"\x42junk")))),
+    (pcap.LINKTYPE_ETHERNET, ethernet(ipv4(udp(b"")))),
+]
+EXPECTED = [
+    (("10.0.0.1", 54321), ("10.0.0.2", 19132), packets.UnconnectedPing),
+    (("10.0.0.2", 19132), ("10.0.0.1", 54321), packets.UnconnectedPong),
+    (("2001:db8::1", 54321), ("2001:db8::2", 19132), packets.UnconnectedPing),
+]
+
+
+def write_pcap(path, frames, endian="<", nanoseconds=False):
+    link_type = frames[0][0]
+    magic = 0xa1b23c4d if nanoseconds else 0xa1b2c3d4
+    data = struct.pack(endian + "IHHiIII", magic, 2, 4, 0, 0, 65535, link_type)
+    for index, (_, frame) in enumerate(frames):
+        fraction = index * (1000000 if nanoseconds else 1000)
+        data += struct.pack(endian + "IIII", 100 + index, fraction, len(frame), len(frame)) + frame
+    path.write_binary(data)
+    return str(path)
+
+
+def pcapng_block(block_type, body, endian):
+    padded = body + b"\x00" * (-len(body) % 4)
+    length = 12 + len(padded)
+    return struct.pack(endian + "II", block_type, length) + padded + struct.pack(endian + "I", length)
+
+
+def write_pcapng(path, frames, endian="<", tsresol=None):
+    section = struct.pack(endian + "IHHq", 0x1a2b3c4d, 1, 0, -1)
+    data = pcapng_block(0x0a0d0d0a, section, endian)
+    options = b""
+    if tsresol is not None:
+        options = struct.pack(endian + "HH", 9, 1) + struct.pack("B", tsresol) + b"\x00" * 3
+        options += struct.pack(endian + "HH", 0, 0)
+    data += pcapng_block(1, struct.pack(endian + "HHI", frames[0][0], 0, 65535) + options, endian)
+    units = 10 ** (tsresol or 6)
+    for index, (_, frame) in enumerate(frames):
+        timestamp = (100 + index) * units + index * units // 1000
+        body = struct.pack(endian + "IIIII", 0, timestamp >> 32, timestamp & 0xffffffff, len(frame), len(frame))
+        data += pcapng_block(6, body + frame, endian)
+    # a simple packet block (no timestamp)
+    data += pcapng_block(3, struct.pack(endian + "I", len(frames[0][1])) + frames[0][1], endian)
+    path.write_binary(data)
+    return str(path)
+
+
+def check(reader, timestamps=True):
+    decoded = list(reader.packets())
+    assert [(src, dst, type(packet)) for _, src, dst, packet in decoded[:3]] == EXPECTED
+    if timestamps:
+        assert [timestamp for timestamp, _, _, _ in decoded[:3]] == pytest.approx([100.0, 101.001, 102.002])
+    assert reader.other_port == 1
+    assert reader.non_udp == 2
+    assert reader.fragments == 1
+    assert reader.truncated == 0
+    assert reader.decode_errors == {"UnknownPacketException": 1, "EndOfStreamException": 1}
+    return decoded
+
+
+@pytest.mark.parametrize("endian", ["<", ">"])
+@pytest.mark.parametrize("nanoseconds", [False, True])
+def test_pcap(tmpdir, endian, nanoseconds):
+    path = write_pcap(tmpdir.join("capture.pcap"), FRAMES, endian, nanoseconds)
+    with PcapReader(path) as reader:
+        assert reader.format == "pcap"
+        assert len(check(reader)) == 3
+        assert reader.frames == len(FRAMES)
+
+
+@pytest.mark.parametrize("endian", ["<", ">"])
+@pytest.mark.parametrize("tsresol", [None, 9])
+def test_pcapng(tmpdir, endian, tsresol):
+    path = write_pcapng(tmpdir.join("capture.pcapng"), FRAMES, endian, tsresol)
+    with PcapReader(path) as reader:
+        assert reader.format == "pcapng"
+        decoded = check(reader)
+        # the simple packet block
+        assert len(decoded) == 4
+        assert decoded[3][0] is None
+        assert type(decoded[3][3]) == packets.UnconnectedPing
+
+
+@pytest.mark.parametrize("link_type,frame", [
+    (pcap.LINKTYPE_RAW, ipv4(udp(PING))),
+    (pcap.LINKTYPE_IPV6, ipv6(udp(PING))),
+    (pcap.LINKTYPE_NULL, struct.pack("<I", 2) + ipv4(udp(PING))),
+    (pcap.LINKTYPE_LINUX_SLL, b"\x00" * 14 + struct.pack("!H", 0x0800) + ipv4(udp(PING))),
+    (pcap.LINKTYPE_LINUX_SLL2, struct.pack("!H", 0x86dd) + b"\x00" * 18 + ipv6(udp(PING))),
+])
+def test_link_types(tmpdir, link_type, frame):
+    path = write_pcap(tmpdir.join("capture.pcap"), [(link_type, frame)])
+    [(timestamp, src, dst, packet)] = list(pcap.read_packets(path))
+    assert src[1] == 54321
+    assert dst[1] == 19132
+    assert packet.client_guid == 2
+
+
+def test_any_port_and_truncated(tmpdir):
+    path = write_pcap(tmpdir.join("capture.pcap"), FRAMES)
+    with open(path, "rb") as capture:
+        data = capture.read()
+    tmpdir.join("cut.pcap").write_binary(data[:-3])
+    with PcapReader(str(tmpdir.join("cut.pcap")), port=None) as reader:
+        payloads = [bytes(payload) for _, _, _, payload in reader.datagrams()]
+        assert payloads == [PING, PONG, PING, PING, b"\x42junk"]
+        assert reader.truncated == 1
+
+
+def test_batches(tmpdir):
+    path = write_pcap(tmpdir.join("capture.pcap"), FRAMES * 3)
+    with PcapReader(path) as reader:
+        batches = list(reader.batches(size=4, use_numpy=False))
+    assert [len(timestamps) for timestamps, _, _, _ in batches] == [4, 4, 4, 3]
+    counts = {}
+    for timestamps, sources, destinations, batch in batches:
+        for packet_class, rows in batch.items():
+            counts[packet_class] = counts.get(packet_class, 0) + len(rows)
+            for index in rows.indexes:
+                assert destinations[index][1] == 19132 or sources[index][1] == 19132
+    assert counts == {packets.UnconnectedPing: 6, packets.UnconnectedPong: 3}
+    assert sum(len(batch.unknown) for _, _, _, batch in batches) == 6
+
+
+def test_malformed_ipv4_header(tmpdir):
+    # IHL of 4 words, below the 20 bytes minimum
+    frame = bytearray(ethernet(ipv4(udp(PING))))
+    frame[14] = 0x44
+    path = write_pcap(tmpdir.join("capture.pcap"), [(pcap.LINKTYPE_ETHERNET, bytes(frame)),
+                                                      (pcap.LINKTYPE_ETHERNET, ethernet(ipv4(udp(PING))))])
+    with PcapReader(path) as reader:
+        assert len(list(reader.packets())) == 1
+        assert reader.malformed == 1
+
+
+@pytest.mark.parametrize("endian", ["<", ">"])
+def test_pcapng_short_blocks(tmpdir, endian):
+    section = pcapng_block(0x0a0d0d0a, struct.pack(endian + "IHHq", 0x1a2b3c4d, 1, 0, -1), endian)
+    interface = pcapng_block(1, struct.pack(endian + "HHI", pcap.LINKTYPE_ETHERNET, 0, 65535), endian)
+    frame = ethernet(ipv4(udp(PING)))
+    packet = pcapng_block(6, struct.pack(endian + "IIIII", 0, 0, 100, len(frame), len(frame)) + frame, endian)
+    # enhanced, obsolete and simple packet blocks too short for their fixed fields
+    short = [pcapng_block(block_type, b"\x00" * 4, endian) for block_type in (6, 2)]
+    short.append(pcapng_block(3, b"", endian))
+    path = tmpdir.join("capture.pcapng")
+    path.write_binary(section + interface + b"".join(short) + packet)
+    with PcapReader(str(path)) as reader:
+        assert len(list(reader.packets())) == 1
+        assert reader.malformed == 3
+        assert reader.truncated == 0
+
+    path.write_binary(section + pcapng_block(1, b"\x00" * 4, endian) + packet)
+    with PcapReader(str(path)) as reader:
+        with pytest.raises(PcapFormatError):
+            list(reader.packets())
+
+
+def test_invalid_files(tmpdir):
+    for name, data in (("empty", b""), ("junk", b"not a capture"), ("short", b"\xd4\xc3")):
+        tmpdir.join(name).write_binary(data)
+        with pytest.raises(PcapFormatError):
+            PcapReader(str(tmpdir.join(name)))
+
+
+def test_main(tmpdir, capsys):
+    path = write_pcap(tmpdir.join("capture.pcap"), FRAMES)
+    assert pcap.main([path]) == 0
+    out, err = capsys.readouterr()
+    assert "UnconnectedPong" in out
+    assert "fragments: 1" in err
+    assert pcap.main([path, "--stats"]) == 0
+    out, err = capsys.readouterr()
+    assert "UnconnectedPing                  2" in out
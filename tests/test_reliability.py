@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import pytest
+
+from rakpy.connection.reliability import RttEstimator, SendWindow
+from rakpy.connection.timer import TimerWheel
+from rakpy.protocol.const import reliability
+from rakpy.protocol.fields import Range
+
+
+def make_window(**options):
+    return SendWindow(rtt=RttEstimator(**options), wheel=TimerWheel(now=0.0))
+
+
+def test_rtt_estimator():
+    rtt = RttEstimator(initial_rto=1.0, min_rto=0.1, max_rto=10.0)
+    assert rtt.rto == 1.0
+    rtt.update(0.2)
+    assert rtt.srtt == 0.2
+    assert rtt.rttvar == 0.1
+    assert rtt.rto == pytest.approx(0.6)
+    for _ in range(100):
+        rtt.update(0.05)
+    assert rtt.srtt == pytest.approx(0.05, abs=1e-5)
+    assert rtt.rto == 0.1
+    rtt.backoff()
+    assert rtt.rto == 0.2
+    for _ in range(10):
+        rtt.backoff()
+    assert rtt.rto == 10.0
+
+
+def test_make_frame_indexes():
+    window = make_window()
+    unreliable = window.make_frame(b"a", reliability.UNRELIABLE)
+    assert unreliable.reliable_index is None and unreliable.order_index is None
+
+    first = window.make_frame(b"b", reliability.RELIABLE_ORDERED, channel=3)
+    second = window.make_frame(b"c", reliability.RELIABLE_ORDERED, channel=3)
+    other = window.make_frame(b"d", reliability.RELIABLE_ORDERED, channel=4)
+    assert (first.reliable_index, first.order_index, first.order_channel) == (0, 0, 3)
+    assert (second.reliable_index, second.order_index) == (1, 1)
+    assert (other.reliable_index, other.order_index, other.order_channel) == (2, 0, 4)
+
+    sequenced = [window.make_frame(b"e", reliability.UNRELIABLE_SEQUENCED, channel=3) for _ in range(2)]
+    assert [(frame.order_index, frame.sequence_index) for frame in sequenced] == [(2, 0), (2, 1)]
+    assert sequenced[0].reliable_index is None
+    third = window.make_frame(b"f", reliability.RELIABLE_ORDERED, channel=3)
+    assert third.order_index == 2
+    assert window.make_frame(b"g", reliability.RELIABLE_SEQUENCED, channel=3).sequence_index == 0
+
+
+def test_ack():
+    window = make_window()
+    frames = [window.make_frame(b"payload") for _ in range(3)]
+    datagrams = [window.send([frame], now=0.0) for frame in frames]
+    assert [datagram.sequence_number for datagram in datagrams] == [0, 1, 2]
+    assert len(window) == 3
+    assert window.bytes_in_flight == sum(datagram.encoded_size() for datagram in datagrams)
+
+    acked = window.on_ack([Range(0, 1)], now=0.2)
+    assert [sent.number for sent in acked] == [0, 1]
+    assert window.rtt.srtt == pytest.approx(0.2)
+    assert len(window) == 1
+    # ACKed datagrams are not retransmitted
+    assert window.tick(now=5.0) == [frames[2]]
+    assert window.bytes_in_flight == 0
+    assert window.timeouts == 1
+
+
+def test_nak():
+    window = make_window()
+    reliable = window.make_frame(b"reliable")
+    unreliable = window.make_frame(b"unreliable", reliability.UNRELIABLE)
+    window.send([reliable, unreliable], now=0.0)
+    window.send([window.make_frame(b"other")], now=0.0)
+
+    assert window.on_nak([Range(0, 0)]) == [reliable]
+    assert window.naked == 1 and window.retransmitted == 1
+    # the retransmission uses a new sequence number, the reliable index is kept
+    datagram = window.send([reliable], now=0.1)
+    assert datagram.sequence_number == 2
+    assert datagram.frames[0].reliable_index == 0
+    assert window.on_nak([Range(0, 0)]) == []
+
+
+def test_rto():
+    window = make_window(initial_rto=0.5)
+    frame = window.make_frame(b"payload")
+    window.send([frame], now=0.0)
+    assert window.tick(now=0.4) == []
+    assert window.tick(now=0.5) == [frame]
+    assert window.rtt.rto == 1.0
+    window.send([frame], now=0.5)
+    assert window.tick(now=1.4) == []
+    assert window.tick(now=1.5) == [frame]
+
+
+def test_many_in_flight():
+    window = make_window(initial_rto=1.0)
+    for index in range(10000):
+        window.send([window.make_frame(b"x")], now=index * 0.0001)
+    assert window.tick(now=0.5) == []
+    window.on_ack([Range(0, 4999)], now=0.9)
+    assert len(window.tick(now=5.0)) == 5000
+    assert len(window) == 0
+
+
+def test_sequence_wraparound():
+    window = make_window()
+    window.in_flight.oldest = window.in_flight.next_number = 0xfffffe
+    datagrams = [window.send([window.make_frame(b"x")], now=0.0) for _ in range(4)]
+    assert [datagram.sequence_number for datagram in datagrams] == [0xfffffe, 0xffffff, 0, 1]
+    assert len(window.on_ack([Range(0xffffff, 0xffffff), Range(0, 0)], now=0.1)) == 2
+    assert [frame.reliable_index for frame in window.tick(now=5.0)] == [0, 3]
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from rakpy.connection.reliability import RttEstimator, SendWindow
+from rakpy.connection.scheduler import OutgoingScheduler, UDP_HEADER_LENGTH
+from rakpy.connection.split import SplitAssembler
+from rakpy.connection.timer import TimerWheel
+from rakpy.io import BufferPool
+from rakpy.protocol.const import priority, reliability
+from rakpy.protocol.datagram import Datagram
+from rakpy.protocol.fields import Range
+
+MTU_SIZE = 576
+
+
+def make_scheduler(mtu_size=MTU_SIZE, pool=None):
+    sent = []
+    window = SendWindow(rtt=RttEstimator(initial_rto=0.5), wheel=TimerWheel(now=0.0))
+    scheduler = OutgoingScheduler(window, lambda data: sent.append(Datagram.decode(bytes(data))), mtu_size,
+                                  pool=pool)
+    return scheduler, sent
+
+
+def payloads(datagrams):
+    return [bytes(frame.payload) for datagram in datagrams for frame in datagram.frames]
+
+
+def test_pooled_buffers():
+    pool = BufferPool(buffer_size=MTU_SIZE, size=2)
+    scheduler, sent = make_scheduler(pool=pool)
+    for index in range(100):
+        scheduler.queue(b"message %02d" % index, now=0.0)
+    scheduler.tick(now=0.01)
+    assert payloads(sent) == [b"message %02d" % index for index in range(100)]
+    # one buffer reused for every datagram
+    assert pool.high_water == 1
+    assert pool.misses == 0
+    assert pool.in_use == 0
+
+
+def test_immediate():
+    scheduler, sent = make_scheduler()
+    scheduler.queue(b"later", priority=priority.HIGH_PRIORITY, now=0.0)
+    assert sent == []
+    scheduler.queue(b"now", priority=priority.IMMEDIATE_PRIORITY, now=0.0)
+    assert payloads(sent) == [b"now"]
+    assert len(scheduler) == 1
+    scheduler.tick(now=0.01)
+    assert payloads(sent) == [b"now", b"later"]
+
+
+def test_coalescing():
+    scheduler, sent = make_scheduler()
+    for index in range(100):
+        scheduler.queue(b"message %02d" % index, now=0.0)
+    scheduler.tick(now=0.01)
+    assert payloads(sent) == [b"message %02d" % index for index in range(100)]
+    capacity = MTU_SIZE - UDP_HEADER_LENGTH
+    assert all(datagram.encoded_size() <= capacity for datagram in sent)
+    # 16 bytes frames, 34 per datagram
+    assert len(sent) == 3
+    assert scheduler.datagrams_sent == 3
+    assert scheduler.bytes_packed == sum(datagram.encoded_size() for datagram in sent)
+    assert scheduler.bytes_capacity == 3 * capacity
+    assert 0.9 < scheduler.fill_ratio < 1.0
+    assert [datagram.sequence_number for datagram in sent] == [0, 1, 2]
+
+
+def test_split():
+    scheduler, sent = make_scheduler()
+    message = bytes(bytearray(range(256))) * 10
+    scheduler.queue(message, reliability.RELIABLE_ORDERED, now=0.0)
+    scheduler.tick(now=0.01)
+    frames = [frame for datagram in sent for frame in datagram.frames]
+    assert len(frames) == 5
+    assert all(datagram.encoded_size() <= MTU_SIZE - UDP_HEADER_LENGTH for datagram in sent)
+    assert set((frame.split_id, frame.split_count, frame.order_index) for frame in frames) == {(0, 5, 0)}
+    assert [frame.reliable_index for frame in frames] == [0, 1, 2, 3, 4]
+
+    assembler = SplitAssembler(MTU_SIZE)
+    results = [assembler.add(frame, now=0.0) for frame in frames]
+    assert bytes(results[-1]) == message
+
+
+def test_unreliable_split_is_reliable():
+    scheduler, _ = make_scheduler()
+    scheduler.queue(b"x" * 2000, reliability.UNRELIABLE, now=0.0)
+    assert set(frame.reliability for frame in scheduler.queues[priority.MEDIUM_PRIORITY]) == {reliability.RELIABLE}
+
+
+def test_priority_weights():
+    scheduler, sent = make_scheduler()
+    # one frame per datagram
+    size = scheduler.max_payload
+    for level in (priority.HIGH_PRIORITY, priority.MEDIUM_PRIORITY, priority.LOW_PRIORITY):
+        for index in range(8):
+            scheduler.queue(bytes(bytearray([level])) * size, priority=level, now=0.0)
+    scheduler.tick(now=0.01)
+    order = [bytearray(payload)[0] for payload in payloads(sent)]
+    assert order[:7] == [1, 2, 3, 1, 1, 2, 1]
+    assert order[:14].count(1) == 8
+    assert sorted(order) == [1] * 8 + [2] * 8 + [3] * 8
+
+
+def test_retransmits_go_first():
+    scheduler, sent = make_scheduler()
+    scheduler.queue(b"lost", now=0.0)
+    scheduler.tick(now=0.01)
+    scheduler.queue(b"new", now=0.02)
+    scheduler.resend(scheduler.window.on_nak([Range(0, 0)]))
+    scheduler.tick(now=0.03)
+    assert payloads(sent[1:]) == [b"lost", b"new"]
+    assert sent[1].sequence_number == 1
+
+
+def test_retransmission_timeout():
+    scheduler, sent = make_scheduler()
+    scheduler.queue(b"reliable", now=0.0)
+    scheduler.queue(b"unreliable", reliability.UNRELIABLE, now=0.0)
+    scheduler.tick(now=0.01)
+    scheduler.tick(now=0.5)
+    assert len(sent) == 1
+    scheduler.tick(now=0.52)
+    assert payloads(sent[1:]) == [b"reliable"]
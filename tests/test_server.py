@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import asyncio
+
+import pytest
+
+from rakpy import server
+from rakpy.protocol import decode_packet, packets
+from rakpy.protocol.fields import Address, CompactAddress
+from rakpy.server import ServerProtocol, create_server
+
+CLIENT = ("10.0.0.1", 54321)
+OTHER_CLIENT = ("10.0.0.2", 54321)
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append((bytes(data), addr))
+
+
+def make_protocol(**options):
+    protocol = ServerProtocol(server_guid=42, server_name="MCPE;rakpy", **options)
+    protocol.connection_made(FakeTransport())
+    return protocol
+
+
+def open_connection(protocol, addr=CLIENT, client_guid=99, request_1=True):
+    if request_1:
+        protocol.datagram_received(packets.OpenConnectionRequest1(protocol=7, mtu_size=1492).encode(), addr)
+    request = packets.OpenConnectionRequest2(server_address=Address(ip="10.0.0.2", port=19132), mtu_size=1200,
+                                             client_guid=client_guid)
+    protocol.datagram_received(request.encode(), addr)
+    return [reply for reply, _ in replies(protocol) if type(reply) == packets.OpenConnectionReply2]
+
+
+def replies(protocol):
+    sent, protocol.transport.sent = protocol.transport.sent, []
+    return [(decode_packet(data), addr) for data, addr in sent]
+
+
+def test_unconnected_ping():
+    protocol = make_protocol()
+    protocol.datagram_received(packets.UnconnectedPing(time=1234, client_guid=7).encode(), CLIENT)
+    [(pong, addr)] = replies(protocol)
+    assert addr == CLIENT
+    assert type(pong) == packets.UnconnectedPong
+    assert pong.ping_time == 1234
+    assert pong.server_guid == 42
+    assert pong.server_name == "MCPE;rakpy"
+
+    # answered while there are free connection slots
+    protocol.datagram_received(packets.UnconnectedPingOpenConnections(time=1, client_guid=7).encode(), CLIENT)
+    [(pong, addr)] = replies(protocol)
+    assert pong.ping_time == 1
+
+    protocol = make_protocol(max_connections=0)
+    protocol.datagram_received(packets.UnconnectedPingOpenConnections(time=1, client_guid=7).encode(), CLIENT)
+    assert replies(protocol) == []
+
+
+def test_pong_template():
+    protocol = make_protocol()
+    for time in (1, 2 ** 64 - 1, 3):
+        protocol.datagram_received(packets.UnconnectedPing(time=time, client_guid=7).encode(), CLIENT)
+        [(data, addr)] = protocol.transport.sent
+        protocol.transport.sent = []
+        assert data == bytes(packets.UnconnectedPong(ping_time=time, server_guid=42, server_name="MCPE;rakpy").encode())
+    template = protocol._pong
+
+    # the MOTD (and player count) changed
+    protocol.server_name = "MCPE;rakpy;1 player"
+    protocol.datagram_received(packets.UnconnectedPing(time=4, client_guid=7).encode(), CLIENT)
+    [(pong, addr)] = replies(protocol)
+    assert pong.ping_time == 4
+    assert pong.server_name == "MCPE;rakpy;1 player"
+    assert protocol._pong is not template
+
+    protocol.server_guid = 43
+    protocol.datagram_received(packets.UnconnectedPing(time=5, client_guid=7).encode(), CLIENT)
+    [(pong, addr)] = replies(protocol)
+    assert pong.server_guid == 43
+
+
+def test_open_connection():
+    protocol = make_protocol(max_mtu_size=1400, max_connections=1)
+
+    protocol.datagram_received(packets.OpenConnectionRequest1(protocol=7, mtu_size=1492).encode(), CLIENT)
+    [(reply, addr)] = replies(protocol)
+    assert type(reply) == packets.OpenConnectionReply1
+    assert reply.server_guid == 42
+    assert reply.mtu_size == 1400
+
+    request = packets.OpenConnectionRequest2(server_address=Address(ip="10.0.0.2", port=19132), mtu_size=1200,
+                                             client_guid=99)
+    protocol.datagram_received(request.encode(), CLIENT)
+    [(reply, addr)] = replies(protocol)
+    assert type(reply) == packets.OpenConnectionReply2
+    assert reply.address == Address(ip="10.0.0.1", port=54321)
+    assert reply.mtu_size == 1200
+
+    session = protocol.sessions[CompactAddress("10.0.0.1", 54321)]
+    assert session.client_guid == 99
+    assert session.mtu_size == 1200
+
+    # no free connection slot left
+    protocol.datagram_received(packets.UnconnectedPingOpenConnections(time=1, client_guid=7).encode(), CLIENT)
+    assert replies(protocol) == []
+
+
+def test_handshake_requires_request_1(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(server, "clock", lambda: now[0])
+    protocol = make_protocol(handshake_timeout=5.0)
+
+    # spoofed OpenConnectionRequest2, without OpenConnectionRequest1
+    assert open_connection(protocol, request_1=False) == []
+    assert protocol.sessions == {}
+
+    # OpenConnectionRequest1 too old
+    protocol.datagram_received(packets.OpenConnectionRequest1(protocol=7, mtu_size=1492).encode(), CLIENT)
+    now[0] += 6
+    assert open_connection(protocol, request_1=False) == []
+    assert protocol.sessions == {}
+
+    assert len(open_connection(protocol)) == 1
+    # retransmitted request, answered again
+    assert len(open_connection(protocol, request_1=False)) == 1
+    # another client guid needs a new handshake
+    assert open_connection(protocol, client_guid=100, request_1=False) == []
+    assert len(open_connection(protocol, client_guid=100)) == 1
+    assert protocol.sessions[CompactAddress(*CLIENT)].client_guid == 100
+
+
+def test_pending_handshakes_limit(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(server, "clock", lambda: now[0])
+    protocol = make_protocol(max_pending=1, handshake_timeout=5.0)
+    request = packets.OpenConnectionRequest1(protocol=7, mtu_size=1492).encode()
+
+    protocol.datagram_received(request, CLIENT)
+    protocol.datagram_received(request, OTHER_CLIENT)
+    assert len(replies(protocol)) == 1
+    assert open_connection(protocol, OTHER_CLIENT, request_1=False) == []
+
+    # stale handshakes are expired to make room
+    now[0] += 6
+    assert len(open_connection(protocol, OTHER_CLIENT)) == 1
+
+
+def test_session_limit_and_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(server, "clock", lambda: now[0])
+    protocol = make_protocol(max_connections=1, session_timeout=10.0)
+
+    assert len(open_connection(protocol)) == 1
+    # table full
+    assert open_connection(protocol, OTHER_CLIENT) == []
+    assert list(protocol.sessions) == [CompactAddress(*CLIENT)]
+
+    # traffic keeps the session alive
+    now[0] += 8
+    protocol.datagram_received(b"\x84\x00\x00\x00", CLIENT)
+    now[0] += 8
+    assert protocol.expire() == 0
+    assert open_connection(protocol, OTHER_CLIENT) == []
+
+    # idle sessions are expired when the table is full
+    now[0] += 11
+    assert len(open_connection(protocol, OTHER_CLIENT)) == 1
+    assert list(protocol.sessions) == [CompactAddress(*OTHER_CLIENT)]
+
+    now[0] += 11
+    assert protocol.expire() == 1
+    assert protocol.sessions == {}
+
+
+def test_session_datagrams():
+    received = []
+
+    class Protocol(ServerProtocol):
+        def session_datagram_received(self, session, data):
+            received.append((session.client_guid, data))
+
+    protocol = Protocol()
+    protocol.connection_made(FakeTransport())
+    datagram = b"\x84\x00\x00\x00\x00\x00\x08\x15"
+
+    # unknown session
+    protocol.datagram_received(datagram, CLIENT)
+    assert received == []
+
+    open_connection(protocol)
+    protocol.datagram_received(datagram, CLIENT)
+    assert received == [(99, datagram)]
+
+
+def test_session_ack_nak():
+    received = []
+
+    class Protocol(ServerProtocol):
+        def session_datagram_received(self, session, data):
+            received.append(data)
+
+    protocol = Protocol()
+    protocol.connection_made(FakeTransport())
+    datagram, ack, nak = b"\x84\x00\x00\x00", b"\xc0\x00\x01\x01\x00\x00\x00", b"\xa0\x00\x01\x01\x00\x00\x00"
+
+    # unknown session: ignored, not counted as offline junk
+    for data in (datagram, ack, nak):
+        protocol.datagram_received(data, CLIENT)
+    assert received == []
+
+    open_connection(protocol)
+    for data in (datagram, ack, nak):
+        protocol.datagram_received(data, CLIENT)
+    assert received == [datagram, ack, nak]
+    assert protocol.offline_filter.dropped == 0
+
+
+def test_garbage():
+    protocol = make_protocol()
+    for data in (b"", b"\x01", b"\x01" + b"\x00" * 40, b"\x05\x00", b"\x7f\xff"):
+        protocol.datagram_received(data, CLIENT)
+    assert replies(protocol) == []
+    # junk is dropped by the offline filter, before decoding
+    assert protocol.decode_errors == 0
+    assert protocol.offline_filter.drops() == dict(unknown_id=1, too_short=2, too_long=1, bad_magic=0)
+
+    request = bytearray(packets.OpenConnectionRequest2(server_address=Address(ip="10.0.0.2", port=19132),
+                                                       mtu_size=1200, client_guid=99).encode())
+    request[1] ^= 0xff
+    protocol.datagram_received(bytes(request), CLIENT)
+    assert protocol.offline_filter.bad_magic == 1
+    # passes the filter, but the address version is invalid
+    request[1] ^= 0xff
+    request[17] = 5
+    protocol.datagram_received(bytes(request), CLIENT)
+    assert protocol.decode_errors == 1
+    assert replies(protocol) == []
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_loopback(batched):
+    async def run():
+        loop = asyncio.get_event_loop()
+        transport, protocol = await create_server("127.0.0.1", 0, server_guid=42, server_name="loopback",
+                                                  batched=batched)
+        received = loop.create_future()
+
+        class Client(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                received.set_result(decode_packet(data))
+
+        client, _ = await loop.create_datagram_endpoint(Client, remote_addr=transport.get_extra_info("sockname"))
+        try:
+            client.sendto(packets.UnconnectedPing(time=1234, client_guid=7).encode())
+            return await asyncio.wait_for(received, 5)
+        finally:
+            client.close()
+            transport.close()
+
+    pong = asyncio.run(run())
+    assert pong.ping_time == 1234
+    assert pong.server_name == "loopback"
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import itertools
+
+import pytest
+
+from rakpy.connection.split import SplitAssembler, SplitBudget
+from rakpy.protocol.const.reliability import RELIABLE_ORDERED
+from rakpy.protocol.datagram import Frame
+
+
+def split(payload, split_id, fragment_length):
+    fragments = [payload[i:i + fragment_length] for i in range(0, len(payload), fragment_length)]
+    return [Frame(fragment, reliability=RELIABLE_ORDERED, reliable_index=i, order_index=0, order_channel=0,
+                  split_count=len(fragments), split_id=split_id, split_index=i)
+            for i, fragment in enumerate(fragments)]
+
+
+@pytest.mark.parametrize("order", list(itertools.permutations(range(4))))
+def test_reassemble_any_order(order):
+    payload = bytes(bytearray(range(256))) * 3 + b"tail"
+    frames = split(payload, 7, 200)
+    assert len(frames) == 4
+
+    assembler = SplitAssembler(mtu=200)
+    results = [assembler.add(frames[i], now=0) for i in order]
+    assert results[:3] == [None, None, None]
+    assert type(results[3]) == memoryview
+    assert results[3] == payload
+    assert len(assembler) == 0
+    assert assembler.budget.splits == 0
+    assert assembler.budget.bytes == 0
+    assert assembler.completed == 1
+
+
+def test_single_fragment():
+    assembler = SplitAssembler(mtu=100)
+    assert assembler.add(split(b"hello", 1, 100)[0]) == b"hello"
+
+
+def test_interleaved_splits():
+    assembler = SplitAssembler(mtu=10)
+    a, b = split(b"a" * 25, 1, 10), split(b"b" * 15, 2, 10)
+    assert assembler.add(a[0]) is None
+    assert assembler.add(b[1]) is None
+    assert assembler.add(a[2]) is None
+    assert assembler.add(b[0]) == b"b" * 15
+    assert assembler.add(a[1]) == b"a" * 25
+
+
+def test_reject_invalid_fragments():
+    assembler = SplitAssembler(mtu=10)
+    frames = split(b"x" * 25, 1, 10)
+
+    # duplicate
+    assembler.add(frames[0])
+    assert assembler.add(frames[0]) is None
+    assert assembler.rejected == 1
+
+    # index out of range
+    frames[1].split_index = 3
+    assert assembler.add(frames[1]) is None
+    assert assembler.rejected == 2
+
+    # fragment larger than the MTU
+    assert assembler.add(split(b"x" * 20, 2, 20)[0]) is None
+    assert assembler.rejected == 3
+
+    # inconsistent fragment length drops the whole split
+    frames = split(b"y" * 25, 3, 10)
+    assembler.add(frames[0])
+    frames[1].payload = b"y" * 9
+    assert assembler.add(frames[1]) is None
+    assert 3 not in assembler.pending
+    assert assembler.rejected == 4
+
+
+def test_limits():
+    budget = SplitBudget(max_splits=3, max_bytes=1000)
+    first = SplitAssembler(mtu=100, budget=budget, max_splits=2, max_split_count=5)
+    second = SplitAssembler(mtu=100, budget=budget)
+
+    # too many fragments
+    assert first.add(split(b"x" * 600, 1, 100)[0]) is None
+    assert first.rejected == 1
+
+    # per connection limit
+    first.add(split(b"x" * 200, 1, 100)[0])
+    first.add(split(b"x" * 200, 2, 100)[0])
+    assert first.add(split(b"x" * 200, 3, 100)[0]) is None
+    assert len(first) == 2
+    assert first.rejected == 2
+
+    # global limit (bytes)
+    assert second.add(split(b"x" * 700, 1, 100)[0]) is None
+    assert second.rejected == 1
+    # global limit (count)
+    second.add(split(b"x" * 200, 2, 100)[0])
+    assert second.add(split(b"x" * 200, 3, 100)[0]) is None
+    assert second.rejected == 2
+    assert budget.splits == 3
+
+    first.clear()
+    assert budget.splits == 1
+    assert budget.bytes == 200
+
+
+def test_expire():
+    assembler = SplitAssembler(mtu=10, timeout=5)
+    assembler.add(split(b"x" * 25, 1, 10)[0], now=100)
+    assembler.add(split(b"x" * 25, 2, 10)[0], now=103)
+    assert assembler.expire(now=104) == 0
+    assert assembler.expire(now=105) == 1
+    assert list(assembler.pending) == [2]
+    assert assembler.expire(now=110) == 1
+    assert assembler.expired == 2
+    assert assembler.budget.splits == 0
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from rakpy.connection.timer import TimerWheel
+
+
+def test_expiry_order():
+    wheel = TimerWheel(resolution=0.01, slots=8)
+    wheel.schedule("c", 0.05)
+    wheel.schedule("a", 0.011)
+    wheel.schedule("b", 0.03)
+    assert len(wheel) == 3
+    assert wheel.advance(0.005) == []
+    assert wheel.advance(0.02) == ["a"]
+    assert wheel.advance(1.0) == ["b", "c"]
+    assert len(wheel) == 0
+
+
+def test_never_early():
+    wheel = TimerWheel(resolution=0.01, slots=8)
+    wheel.schedule("a", 0.015)
+    assert wheel.advance(0.014) == []
+    assert wheel.advance(0.02) == ["a"]
+
+
+def test_cancel_and_reschedule():
+    wheel = TimerWheel(resolution=0.01, slots=8)
+    wheel.schedule("a", 0.02)
+    wheel.schedule("b", 0.02)
+    assert wheel.cancel("a")
+    assert not wheel.cancel("a")
+    wheel.schedule("b", 0.5)
+    assert "b" in wheel and "a" not in wheel
+    assert wheel.advance(0.1) == []
+    assert wheel.advance(0.5) == ["b"]
+
+
+def test_beyond_one_turn():
+    wheel = TimerWheel(resolution=0.01, slots=4)
+    # same bucket, different turns
+    wheel.schedule("near", 0.01)
+    wheel.schedule("far", 0.05)
+    assert wheel.advance(0.01) == ["near"]
+    assert wheel.advance(0.04) == []
+    assert wheel.advance(0.05) == ["far"]
+
+
+def test_past_deadline():
+    wheel = TimerWheel(resolution=0.01, slots=8, now=1.0)
+    wheel.schedule("late", 0.5)
+    assert wheel.advance(1.0) == []
+    assert wheel.advance(1.01) == ["late"]
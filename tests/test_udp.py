@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import asyncio
+import socket
+import time
+
+import pytest
+
+from rakpy.protocol import decode_packet, packets
+from rakpy.udp import HAS_MMSG, BatchSocket, create_batched_endpoint, decode_sockaddr, encode_sockaddr
+
+BACKENDS = [False, pytest.param(True, marks=pytest.mark.skipif(not HAS_MMSG, reason="recvmmsg is not available"))]
+
+
+def bound_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+def receive_all(batch_socket, count, timeout=5.0):
+    received = []
+    deadline = time.time() + timeout
+    while len(received) < count and time.time() < deadline:
+        received.extend((bytes(data), addr) for data, addr in batch_socket.recv_batch())
+    return received
+
+
+@pytest.mark.parametrize("address, length", [
+    (("127.0.0.1", 19132), 16),
+    (("::1", 19133, 0, 0), 28),
+    (("fe80::1", 1, 5, 2), 28),
+])
+def test_sockaddr(address, length):
+    buffer = bytearray(128)
+    assert encode_sockaddr(address, buffer) == length
+    assert decode_sockaddr(buffer) == address
+
+
+@pytest.mark.parametrize("use_mmsg", BACKENDS)
+def test_recv_batch(use_mmsg):
+    server = BatchSocket(bound_socket(), batch_size=4, buffer_size=64, use_mmsg=use_mmsg)
+    client = bound_socket()
+    try:
+        assert server.recv_batch() == []
+        for i in range(6):
+            client.sendto(b"datagram %d" % i, server.sock.getsockname())
+        received = receive_all(server, 6)
+        assert [data for data, _ in received] == [b"datagram %d" % i for i in range(6)]
+        assert set(addr for _, addr in received) == {client.getsockname()}
+    finally:
+        server.close()
+        client.close()
+
+
+@pytest.mark.parametrize("use_mmsg", BACKENDS)
+def test_recv_batch_views(use_mmsg):
+    server = BatchSocket(bound_socket(), batch_size=2, buffer_size=64, use_mmsg=use_mmsg)
+    client = bound_socket()
+    try:
+        ping = packets.UnconnectedPing(time=1234, client_guid=7).encode()
+        client.sendto(ping, server.sock.getsockname())
+        received = []
+        while not received:
+            received = server.recv_batch()
+        [(data, addr)] = received
+        assert isinstance(data, memoryview)
+        assert data.obj is server.buffer
+        assert decode_packet(data).time == 1234
+    finally:
+        server.close()
+        client.close()
+
+
+@pytest.mark.parametrize("use_mmsg", BACKENDS)
+def test_send_batch(use_mmsg):
+    sender = BatchSocket(bound_socket(), batch_size=4, use_mmsg=use_mmsg)
+    receiver = BatchSocket(bound_socket(), batch_size=16)
+    try:
+        address = receiver.sock.getsockname()
+        messages = [(b"bytes", address), (bytearray(b"bytearray"), address), (memoryview(b"view"), address)] * 3
+        assert sender.send_batch(messages) == 9
+        received = receive_all(receiver, 9)
+        assert [data for data, _ in received] == [b"bytes", b"bytearray", b"view"] * 3
+    finally:
+        sender.close()
+        receiver.close()
+
+
+@pytest.mark.parametrize("use_mmsg", BACKENDS)
+def test_batched_endpoint(use_mmsg):
+    class Echo(asyncio.DatagramProtocol):
+        def connection_made(self, transport):
+            self.transport = transport
+
+        def datagram_received(self, data, addr):
+            self.transport.sendto(bytes(data).upper(), addr)
+
+    async def run():
+        loop = asyncio.get_event_loop()
+        transport, _ = await create_batched_endpoint(Echo, ("127.0.0.1", 0), use_mmsg=use_mmsg)
+        queue = asyncio.Queue()
+
+        class Client(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                queue.put_nowait(data)
+
+        client, _ = await loop.create_datagram_endpoint(Client, remote_addr=transport.get_extra_info("sockname"))
+        try:
+            for i in range(20):
+                client.sendto(b"hello %d" % i)
+            return sorted([await asyncio.wait_for(queue.get(), 5) for _ in range(20)])
+        finally:
+            client.close()
+            transport.close()
+
+    assert asyncio.run(run()) == sorted(b"HELLO %d" % i for i in range(20))